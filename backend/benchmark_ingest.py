@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-event cost of POST /api/events/ingest.
+
+Runs the ingest endpoint against a throwaway SQLite database and reports, per
+ingested event, how many SQL statements (by type) and commits it took. Every
+event matches a categorization rule so the rules engine is exercised too.
+
+Usage:
+    cd backend
+    python benchmark_ingest.py [number_of_events]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import database
+
+# Point the app at a temporary database before main is imported
+_tmp_dir = tempfile.mkdtemp(prefix="ownspend-bench-")
+database.engine = create_engine(
+    f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}", connect_args={"check_same_thread": False}
+)
+database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+
+import models
+import schemas
+import main
+
+API_KEY = "benchmark-device-key"
+
+
+def seed():
+    """Create a user, device, category and rule."""
+    db = database.SessionLocal()
+    try:
+        user = models.User(email="bench@ownspend.local", password_hash="")
+        db.add(user)
+        db.flush()
+        db.add(models.Device(user_id=user.id, device_name="Benchmark", api_key=API_KEY, is_active=True))
+        db.add(models.Category(name="Food & Dining"))
+        db.add(models.Rule(
+            user_id=user.id, match_type="TEXT_CONTAINS", match_value="zomato",
+            action_type="SET_CATEGORY_BY_NAME", action_value="Food & Dining", priority=10, is_active=True
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(count: int):
+    """Ingest count events one request at a time and print per-event costs."""
+    statements = Counter()
+    commits = Counter()
+    
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[statement.split(None, 1)[0].upper()] += 1
+    
+    @event.listens_for(database.engine, "commit")
+    def count_commit(conn):
+        commits["COMMIT"] += 1
+    
+    base_time = datetime(2025, 12, 1, 10, 0)
+    
+    start = time.perf_counter()
+    for index in range(count):
+        ingest = schemas.RawEventCreate(
+            source_type="SMS",
+            source_sender="VM-KOTAKB",
+            raw_text=f"Sent Rs.{100 + index}.00 from Kotak Bank AC X1415 to zomato@okicici via UPI Ref no {index}",
+            device_timestamp=base_time + timedelta(minutes=index)
+        )
+        
+        db = database.SessionLocal()
+        try:
+            device = main.authenticate_device(api_key=API_KEY, db=db)
+            main.ingest_event(event=ingest, device=device, db=db)
+        finally:
+            db.close()
+    elapsed = time.perf_counter() - start
+    
+    print(f"📊 Ingest benchmark: {count} events in {elapsed:.2f}s ({count / elapsed:.0f} events/sec)")
+    print("-" * 50)
+    total = sum(statements.values())
+    print(f"   Statements per event: {total / count:.2f}")
+    for kind, value in sorted(statements.items()):
+        print(f"      {kind:<8} {value / count:.2f}")
+    print(f"   Commits per event:    {commits['COMMIT'] / count:.2f}")
+
+
+if __name__ == "__main__":
+    seed()
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Benchmark parser throughput on a synthetic multi-bank message corpus.
+
+The corpus generator fills the message templates documented on the
+TransactionParser methods (Kotak, UCO, HDFC, ICICI, SBI, Axis, GPay, PhonePe,
+Paytm and generic banks) with random amounts, masks, dates, references,
+UPI ids and merchants, and mixes in noise (OTPs, promotions, bill
+reminders, balance alerts, personal messages). Reports, per parser and end
+to end through parse_event (pre-filter, routing, template cache):
+messages/sec, p50/p99 per-message latency, and allocations per message.
+
+With --save-baseline the throughput numbers are written to a baseline file;
+later runs compare against it and exit with status 1 if any throughput
+drops by more than the threshold. Baselines are machine specific.
+
+Usage:
+    cd backend
+    python benchmark_parsers.py [--count N] [--save-baseline] [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+from parser import EventText, TransactionParser, parse_event_safely
+from parser_engine import PARSERS
+from sender_router import get_sender_router
+from template_cache import get_template_cache
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_parsers_baseline.json')
+
+# Largest drop in messages/sec, as a fraction of the baseline, before the run fails
+REGRESSION_THRESHOLD = 0.2
+
+# Messages per parser traced for allocations (tracemalloc is slow)
+ALLOCATION_SAMPLE_SIZE = 1000
+
+# Records per TransactionParser.parse_many call
+PARSE_MANY_BATCH_SIZE = 500
+
+# parser name -> (senders, templates). Placeholders: {amount} (may have
+# thousands separators), {plain_amount}, {mask}, {vpa}, {merchant}, {name},
+# {date}, {ref}, {direction}
+BANK_TEMPLATES: Dict[str, Tuple[List[str], List[str]]] = {
+    'kotak': (['VM-KOTAKB', 'AD-KOTAKB', 'JD-KOTAKB-S'], [
+        "Sent Rs.{plain_amount} from Kotak Bank AC X{mask} to {vpa} via UPI Ref no {ref}",
+        "Rs {plain_amount} debited from a/c X{mask} on {date} to {vpa}. UPI Ref {ref}. Not you? Call 18602662666",
+        "Received Rs.{plain_amount} in your Kotak Bank AC X{mask} from {vpa} on {date}. UPI Ref:{ref}",
+    ]),
+    'uco': (['VM-UCOBNK', 'AD-UCOBNK'], [
+        "UCO-UPI/{direction}/{ref}/{vpa}/UCO BANK/XX{mask}/{plain_amount}",
+    ]),
+    'hdfc': (['VM-HDFCBK', 'AD-HDFCBK-S', 'JD-HDFCBK'], [
+        "Rs.{amount} debited from HDFC Bank A/c XX{mask} on {date}. Info: UPI/{vpa}. Avl bal: Rs.{amount}",
+        "HDFC Bank: Rs {amount} credited to A/c XX{mask} on {date} by UPI Ref No {ref}.",
+        "You've done a UPI txn of Rs.{amount} from HDFC A/c XX{mask} to {vpa}. Ref {ref}",
+        "Alert: INR {amount} debited from A/c XX{mask} on {date} by ATM-WDL. Avl Bal: INR {amount}",
+    ]),
+    'icici': (['VM-ICICIB', 'AD-ICICIT'], [
+        "ICICI Bank Acct XX{mask} debited for Rs {amount} on {date}; {vpa} credited. UPI:{ref}",
+        "ICICI Bank Acct XX{mask} credited with Rs {amount} on {date}. IMPS Ref No:{ref}.",
+        "Rs.{amount} sent from ICICI Bank Acc XX{mask} to {vpa}. UPI Ref:{ref}",
+        "Dear Customer, your ICICI Bank Credit Card XX{mask} has been used for Rs.{amount} at {merchant} on {date}",
+    ]),
+    'sbi': (['VM-SBIINB', 'AD-SBIUPI', 'JD-ATMSBI'], [
+        "Your a/c no. XXXXXXXX{mask} is debited for Rs.{amount} on {date} by transfer to VPA {vpa} (UPI Ref No {ref})",
+        "Your a/c XX{mask} credited by Rs.{amount} on {date} by transfer from VPA {vpa} (UPI Ref No {ref})",
+        "SBI UPI: A/c X{mask} debited Rs.{amount} on {date} Ref {ref} credited to VPA {vpa}",
+        "ATM-SBI: Rs.{plain_amount} withdrawn from A/c XX{mask} on {date}. Avl bal: Rs.{amount}",
+    ]),
+    'axis': (['VM-AXISBK', 'AD-AXISBK'], [
+        "Rs.{amount} debited from A/c no. XX{mask} on {date}. Info- UPI/{vpa}/UPI. Avl Bal- Rs.{amount}",
+        "Your Axis Bank A/c XX{mask} is credited with Rs.{amount} on {date}. Info: UPI/{vpa}.",
+        "INR {amount} spent on Axis Bank Credit Card XX{mask} at {merchant} on {date}. Avl Limit: INR {amount}",
+        "Rs {amount} transferred from Axis Bank A/c XX{mask} to {vpa}. UPI Ref: {ref}",
+    ]),
+    'gpay': (['com.google.android.apps.nbu.paisa.user', 'Google Pay'], [
+        "You paid ₹{plain_amount} to {merchant}",
+        "₹{plain_amount} received from {name}",
+        "Sent ₹{plain_amount} to {name}",
+    ]),
+    'phonepe': (['com.phonepe.app', 'PhonePe'], [
+        "Paid ₹{amount} to {vpa} from HDFC XX{mask}",
+        "Received ₹{amount} from {vpa} to HDFC XX{mask}",
+        "Payment of ₹{amount} to {merchant} successful",
+    ]),
+    'paytm': (['net.one97.paytm', 'Paytm'], [
+        "You paid Rs.{amount} to {vpa}",
+        "Rs.{amount} received from {vpa}",
+        "Paid Rs.{amount} at {merchant} using Paytm",
+    ]),
+    'generic': (['VM-CANBNK', 'AD-PNBSMS', 'JD-IDFCFB', 'BZ-YESBNK'], [
+        "Rs.{amount} debited from your account XX{mask} via UPI. Ref: {ref}",
+        "INR {amount} credited to your A/c XX{mask} by NEFT on {date}.",
+        "Rs.{amount} spent on Card XX{mask} at {merchant} on {date}",
+    ]),
+}
+
+NOISE_SENDERS = ['VM-HDFCBK', 'AD-SBIINB', 'VM-AMAZON', 'JD-SWIGGY', 'AD-AIRTEL', '+919876543210', 'Google Messages']
+
+NOISE_TEMPLATES = [
+    "{ref} is your OTP for txn of Rs.{amount} at {merchant} on card XX{mask}. Valid for 10 mins. Do not share it with anyone.",
+    "Dear Customer, your credit card bill of Rs.{amount} is due on {date}. Minimum amount due Rs.{plain_amount}. Pay now to avoid charges.",
+    "Get upto 20% cashback on {merchant}! Offer valid till {date}. T&C apply. Click https://bit.ly/x{mask}",
+    "Avl Bal in A/c XX{mask} is Rs.{amount} as on {date}.",
+    "Congratulations! You are eligible for a pre-approved personal loan of Rs.{amount}. Apply now: https://x.co/{mask}",
+    "Your order #{ref} from {merchant} has been shipped and will be delivered by {date}.",
+    "Rs.{amount} will be debited from your a/c XX{mask} on {date} towards your SIP mandate.",
+    "Hey {name}, are we still on for dinner tonight?",
+]
+
+VPAS = ['john@upi', 'zomato@hdfcbank', 'swiggy@axisbank', 'amazonpay@icici', 'uber.india@paytm',
+        'netflix@paytm', 'rent.owner@okaxis', 'priya.s@oksbi', 'bigbasket@ybl', 'irctc@sbi']
+MERCHANTS = ['AMAZON', 'FLIPKART', 'SWIGGY', 'BIG BAZAAR', 'IRCTC', 'UBER INDIA', 'ZOMATO', 'MYNTRA']
+NAMES = ['Rahul Sharma', 'Priya', 'Amit Kumar', 'Sneha', 'Ravi']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    """Fill a template with random field values."""
+    rupees = rng.choice([rng.randint(1, 999), rng.randint(1000, 99999)])
+    paise = rng.choice([0, rng.randint(1, 99)])
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(23, 26)
+    return template.format(
+        amount=rng.choice([f"{rupees:,}.{paise:02d}", f"{rupees}.{paise:02d}", str(rupees)]),
+        plain_amount=rng.choice([f"{rupees}.{paise:02d}", str(rupees)]),
+        mask=f"{rng.randint(0, 9999):04d}",
+        vpa=rng.choice(VPAS),
+        merchant=rng.choice(MERCHANTS),
+        name=rng.choice(NAMES),
+        date=rng.choice([
+            f"{day:02d}-{month:02d}-{year}", f"{day:02d}-{MONTHS[month - 1]}-{year}", f"{day:02d}{MONTHS[month - 1]}{year}"
+        ]),
+        ref=str(rng.randint(10 ** 11, 10 ** 12 - 1)),
+        direction=rng.choice(['CR', 'DR']),
+    )
+
+
+def generate_corpus(count: int, noise_ratio: float = 0.3, seed: int = 42) -> List[Tuple[Optional[str], EventText]]:
+    """
+    count (expected parser name, message) pairs: transactions spread evenly
+    over the banks and apps, and noise_ratio of non-transactions (expected
+    parser None). The same seed always gives the same corpus.
+    """
+    rng = random.Random(seed)
+    parser_names = list(BANK_TEMPLATES)
+    corpus = []
+    for _ in range(count):
+        if rng.random() < noise_ratio:
+            corpus.append((None, EventText(rng.choice(NOISE_SENDERS), _fill(rng.choice(NOISE_TEMPLATES), rng))))
+            continue
+        
+        parser_name = rng.choice(parser_names)
+        senders, templates = BANK_TEMPLATES[parser_name]
+        corpus.append((parser_name, EventText(rng.choice(senders), _fill(rng.choice(templates), rng))))
+    return corpus
+
+
+def measure(function: Callable[[Any], Any], inputs: List[Any], rounds: int = 3,
+            setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Throughput, latency percentiles and allocations of function over inputs.
+    Timings come from the fastest of rounds passes (setup runs before each).
+    """
+    perf_counter_ns = time.perf_counter_ns
+    elapsed, latencies = None, []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        
+        round_latencies = []
+        start = time.perf_counter()
+        for item in inputs:
+            call_start = perf_counter_ns()
+            function(item)
+            round_latencies.append(perf_counter_ns() - call_start)
+        round_elapsed = time.perf_counter() - start
+        
+        if elapsed is None or round_elapsed < elapsed:
+            elapsed, latencies = round_elapsed, round_latencies
+    latencies.sort()
+    
+    # Allocations on a sample: blocks and bytes still allocated at each
+    # message's peak (temporaries included), and blocks left behind afterwards
+    sample = inputs[:ALLOCATION_SAMPLE_SIZE]
+    peak_bytes = 0
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for item in sample:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        function(item)
+        peak_bytes += tracemalloc.get_traced_memory()[1] - current
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+    
+    return {
+        "messages": len(inputs),
+        "messages_per_second": round(len(inputs) / elapsed, 1),
+        "p50_us": round(latencies[len(latencies) // 2] / 1000, 2),
+        "p99_us": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1000, 2),
+        "peak_bytes_per_message": round(peak_bytes / len(sample)) if sample else 0,
+        "retained_blocks_per_message": round(retained_blocks / len(sample), 2) if sample else 0,
+    }
+
+
+def run(count: int, rounds: int = 3) -> Dict[str, Dict[str, Any]]:
+    """Benchmark every parser on its own messages, then parse_event on the mixed corpus."""
+    corpus = generate_corpus(count)
+    results = {}
+    
+    for parser_name, parser in PARSERS.items():
+        texts = [event.raw_text for expected, event in corpus if expected == parser_name]
+        results[parser_name] = measure(parser.parse, texts, rounds)
+    
+    # End to end from a cold template cache, as after a restart
+    events = [event for _, event in corpus]
+    results["parse_event"] = measure(parse_event_safely, events, rounds, setup=get_template_cache().clear)
+    
+    # The same in batches; latencies and allocations are per message (batch / size)
+    batches = [events[start:start + PARSE_MANY_BATCH_SIZE] for start in range(0, len(events), PARSE_MANY_BATCH_SIZE)]
+    batch_result = measure(TransactionParser.parse_many, batches, rounds, setup=get_template_cache().clear)
+    results["parse_many"] = {
+        "messages": len(events),
+        "messages_per_second": round(batch_result["messages_per_second"] * len(events) / len(batches), 1),
+        **{
+            field: round(batch_result[field] / PARSE_MANY_BATCH_SIZE, 2)
+            for field in ("p50_us", "p99_us", "peak_bytes_per_message", "retained_blocks_per_message")
+        }
+    }
+    
+    # Check that the corpus exercises what it claims: transactions route to
+    # their parser and parse, noise does not
+    router = get_sender_router()
+    misrouted = unparsed = noise_parsed = 0
+    for expected, event in corpus:
+        parsed_data = parse_event_safely(event).parsed_data
+        is_transaction = bool(parsed_data) and 'amount' in parsed_data and 'direction' in parsed_data
+        if expected is None:
+            noise_parsed += is_transaction
+            continue
+        misrouted += router.preview(event.source_sender, event.raw_text.lower()) != expected
+        unparsed += not is_transaction
+    results["parse_event"].update(misrouted=misrouted, unparsed=unparsed, noise_parsed=noise_parsed)
+    return results
+
+
+def report(results: Dict[str, Dict[str, Any]]):
+    """Print a results table."""
+    print(f"{'parser':<12} {'msgs':>7} {'msgs/sec':>11} {'p50 us':>8} {'p99 us':>8} {'peak B/msg':>11} {'kept blk/msg':>13}")
+    print("-" * 76)
+    for name, result in results.items():
+        print(f"{name:<12} {result['messages']:>7} {result['messages_per_second']:>11,.0f} {result['p50_us']:>8.2f} "
+              f"{result['p99_us']:>8.2f} {result['peak_bytes_per_message']:>11} {result['retained_blocks_per_message']:>13.2f}")
+    print(f"   Template cache: {get_template_cache().stats()}")
+    corpus_checks = results['parse_event']
+    print(f"   Transactions misrouted: {corpus_checks['misrouted']}, not parsed: {corpus_checks['unparsed']}; "
+          f"noise parsed as transactions: {corpus_checks['noise_parsed']}")
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, float],
+                     threshold: float) -> List[str]:
+    """Names whose messages/sec fell more than threshold below the baseline."""
+    regressions = []
+    for name, baseline_rate in baseline.items():
+        result = results.get(name)
+        if result and result["messages_per_second"] < baseline_rate * (1 - threshold):
+            regressions.append(f"{name}: {result['messages_per_second']:,.0f} msgs/sec (baseline {baseline_rate:,.0f})")
+    return regressions
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Benchmark parser throughput on a synthetic corpus.")
+    arguments.add_argument("--count", type=int, default=50000, help="messages in the corpus")
+    arguments.add_argument("--rounds", type=int, default=3, help="timed passes per benchmark (fastest is kept)")
+    arguments.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    arguments.add_argument("--save-baseline", action="store_true", help="store this run's throughput as the baseline")
+    arguments.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                           help="allowed throughput drop as a fraction of the baseline")
+    options = arguments.parse_args()
+    
+    print(f"📊 Parser benchmark: {options.count} messages\n" + "=" * 76)
+    results = run(options.count, options.rounds)
+    report(results)
+    
+    throughput = {name: result["messages_per_second"] for name, result in results.items()}
+    if options.save_baseline:
+        with open(options.baseline, "w") as baseline_file:
+            json.dump(throughput, baseline_file, indent=2)
+        print(f"✅ Baseline saved to {options.baseline}")
+    elif os.path.exists(options.baseline):
+        with open(options.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), options.threshold)
+        if regressions:
+            print(f"❌ Throughput regressed more than {options.threshold:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ No throughput regression beyond {options.threshold:.0%} of the baseline")
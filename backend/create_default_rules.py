@@ -4,6 +4,7 @@ Create default categorization rules for common Indian merchants and services.
 Run this once to populate the rules engine.
 """
 
+import time
 import requests
 
 BASE_URL = "http://localhost:8000"
@@ -275,13 +276,23 @@ def reapply_rules():
     print("\n🔄 Re-applying rules to existing transactions...")
     try:
         response = requests.post(f"{BASE_URL}/api/rules/reapply")
-        if response.status_code == 200:
-            result = response.json()
+        if response.status_code != 200:
+            print(f"❌ Failed to re-apply rules: {response.text}")
+            return
+        
+        # The reapply runs as a background job; poll until it finishes
+        job = response.json()
+        while job["status"] == "running":
+            time.sleep(1)
+            job = requests.get(f"{BASE_URL}/api/rules/reapply/{job['job_id']}").json()
+            print(f"   ... {job['processed']}/{job['total'] or '?'} transactions")
+        
+        if job["status"] == "completed":
             print(f"✅ Rules re-applied!")
-            print(f"   - Transactions processed: {result.get('transactions_processed', 'N/A')}")
-            print(f"   - Transactions updated: {result.get('transactions_updated', 'N/A')}")
+            print(f"   - Transactions processed: {job['processed']}")
+            print(f"   - Transactions updated: {job['updated']}")
         else:
-            print(f"❌ Failed to re-apply rules: {response.text}")
+            print(f"❌ Failed to re-apply rules: {job['error']}")
     except Exception as e:
         print(f"❌ Error re-applying rules: {str(e)}")
 
@@ -0,0 +1,164 @@
+"""
+In-process filter of known transaction dedupe hashes.
+
+A Bloom filter over every dedupe hash answers "definitely new" without
+touching the database, and an LRU of recent hashes -> transaction ids answers
+"duplicate of X" for the common case of a message being delivered twice.
+Only Bloom-positive keys that miss the LRU need a lookup; the unique index on
+transactions.dedupe_hash stays the source of truth.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+import models
+
+# Streamed rows per fetch while warming
+WARM_FETCH_SIZE = 5000
+
+_UINT64_MASK = (1 << 64) - 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit integer hashes."""
+    
+    def __init__(self, capacity: int, error_rate: float):
+        """Size the filter for capacity items at the given false positive rate."""
+        self.capacity = max(1, capacity)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+    
+    def _positions(self, value: int):
+        """Bit positions for a hash, by double hashing its two 32-bit halves."""
+        value &= _UINT64_MASK
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, value: int):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, value: int) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class DedupeFilter:
+    """Bloom filter plus LRU of recent dedupe hashes, shared by all ingest paths."""
+    
+    def __init__(self, capacity: Optional[int] = None, error_rate: Optional[float] = None,
+                 recent_size: Optional[int] = None):
+        """
+        Initialize the filter. Unset options are read from environment variables:
+        DEDUPE_FILTER_CAPACITY, DEDUPE_FILTER_ERROR_RATE and DEDUPE_RECENT_KEYS.
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.capacity = capacity or int(os.getenv('DEDUPE_FILTER_CAPACITY', '100000'))
+        self.error_rate = error_rate or float(os.getenv('DEDUPE_FILTER_ERROR_RATE', '0.01'))
+        self.recent_size = recent_size or int(os.getenv('DEDUPE_RECENT_KEYS', '10000'))
+        
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        # dedupe_hash -> transaction id, most recent last
+        self._recent: OrderedDict = OrderedDict()
+        self._warm = False
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.definitely_new = 0
+        self.recent_hits = 0
+        self.lookups = 0
+    
+    def ensure_warm(self, db: Session):
+        """Load the filter from the table on first use, or regrow it once it is over capacity."""
+        if self._warm and self._bloom.count <= self._bloom.capacity:
+            return
+        self.warm(db)
+    
+    def warm(self, db: Session):
+        """Rebuild the filter from every transaction, keeping the newest ones in the LRU."""
+        total = db.query(models.Transaction.id).count()
+        bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+        recent = OrderedDict()
+        
+        rows = db.query(models.Transaction.id, models.Transaction.dedupe_hash).filter(
+            models.Transaction.dedupe_hash.isnot(None)
+        ).order_by(models.Transaction.ingested_at.asc()).yield_per(WARM_FETCH_SIZE)
+        
+        for transaction_id, dedupe_hash in rows:
+            bloom.add(dedupe_hash)
+            recent[dedupe_hash] = transaction_id
+            if len(recent) > self.recent_size:
+                recent.popitem(last=False)
+        
+        with self._lock:
+            self._bloom = bloom
+            self._recent = recent
+            self._warm = True
+    
+    def recent_transaction_id(self, dedupe_hash: int) -> Optional[str]:
+        """Transaction id for a recently seen hash, if it is still in the LRU."""
+        with self._lock:
+            transaction_id = self._recent.get(dedupe_hash)
+            if transaction_id is not None:
+                self._recent.move_to_end(dedupe_hash)
+                self.recent_hits += 1
+            return transaction_id
+    
+    def might_contain(self, dedupe_hash: int) -> bool:
+        """False means the hash has definitely never been stored (by this process's view)."""
+        with self._lock:
+            if dedupe_hash in self._bloom:
+                self.lookups += 1
+                return True
+            self.definitely_new += 1
+            return False
+    
+    def add(self, dedupe_hash: int, transaction_id: str):
+        """Record a stored transaction."""
+        with self._lock:
+            if dedupe_hash not in self._bloom:
+                self._bloom.add(dedupe_hash)
+            self._recent[dedupe_hash] = transaction_id
+            self._recent.move_to_end(dedupe_hash)
+            if len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+    
+    def forget(self, dedupe_hash: int):
+        """Drop a hash from the LRU (e.g. its transaction no longer exists)."""
+        with self._lock:
+            self._recent.pop(dedupe_hash, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Filter size and hit counters."""
+        with self._lock:
+            return {
+                "warm": self._warm,
+                "keys": self._bloom.count,
+                "capacity": self._bloom.capacity,
+                "bloom_bytes": len(self._bloom._bits),
+                "recent_keys": len(self._recent),
+                "definitely_new": self.definitely_new,
+                "recent_hits": self.recent_hits,
+                "lookups": self.lookups
+            }
+
+
+# Singleton instance
+_dedupe_filter = None
+
+def get_dedupe_filter() -> DedupeFilter:
+    """Get or create DedupeFilter instance."""
+    global _dedupe_filter
+    if _dedupe_filter is None:
+        _dedupe_filter = DedupeFilter()
+    return _dedupe_filter
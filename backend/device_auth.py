@@ -0,0 +1,187 @@
+"""
+Device API-key authentication cache.
+
+Active API keys are cached in-process for a short TTL so the ingest auth path
+usually runs no query at all. last_seen_at updates are buffered in memory and
+written in bulk by a background flusher instead of committing on every request.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, NamedTuple
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import models
+
+
+class AuthenticatedDevice(NamedTuple):
+    """Snapshot of an active device, safe to share across sessions and threads."""
+    id: int
+    user_id: int
+    device_name: Optional[str]
+
+
+class DeviceAuthCache:
+    """TTL cache of active device API keys with coalesced last_seen_at writes."""
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, flush_interval_seconds: Optional[float] = None,
+                 max_pending: int = 100):
+        """
+        Initialize the cache. Unset options are read from environment variables:
+        DEVICE_AUTH_CACHE_TTL and DEVICE_LAST_SEEN_FLUSH_INTERVAL (seconds).
+        Buffered last_seen_at updates are flushed early once max_pending
+        devices are waiting.
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv('DEVICE_AUTH_CACHE_TTL', '60'))
+        self.flush_interval_seconds = flush_interval_seconds if flush_interval_seconds is not None \
+            else float(os.getenv('DEVICE_LAST_SEEN_FLUSH_INTERVAL', '30'))
+        self.max_pending = max_pending
+        
+        # api_key -> (device, expires_at)
+        self._devices: Dict[str, tuple] = {}
+        # device_id -> last_seen_at waiting to be written
+        self._last_seen: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+    
+    def authenticate(self, db: Session, api_key: str) -> Optional[AuthenticatedDevice]:
+        """Return the active device for an API key, or None if invalid or inactive."""
+        now = time.monotonic()
+        
+        with self._lock:
+            cached = self._devices.get(api_key)
+            if cached and cached[1] > now:
+                self.hits += 1
+                device = cached[0]
+            else:
+                device = None
+        
+        if device is None:
+            row = db.query(models.Device).filter(
+                models.Device.api_key == api_key,
+                models.Device.is_active == True
+            ).first()
+            
+            if not row:
+                return None
+            
+            device = AuthenticatedDevice(id=row.id, user_id=row.user_id, device_name=row.device_name)
+            with self._lock:
+                self.misses += 1
+                self._devices[api_key] = (device, now + self.ttl_seconds)
+        
+        self.touch(device.id)
+        return device
+    
+    def invalidate(self, api_key: Optional[str] = None, device_id: Optional[int] = None):
+        """Drop cached entries for an API key and/or device (e.g. when deactivated)."""
+        with self._lock:
+            if api_key is not None:
+                self._devices.pop(api_key, None)
+            if device_id is not None:
+                for key in [key for key, (device, _) in self._devices.items() if device.id == device_id]:
+                    del self._devices[key]
+    
+    def clear(self):
+        """Drop every cached API key."""
+        with self._lock:
+            self._devices.clear()
+    
+    def touch(self, device_id: int):
+        """Buffer a last_seen_at update for a device."""
+        with self._lock:
+            self._last_seen[device_id] = datetime.now()
+            flush_now = len(self._last_seen) >= self.max_pending
+        
+        if flush_now:
+            self.flush_last_seen()
+    
+    def flush_last_seen(self) -> int:
+        """Write all buffered last_seen_at values in one bulk UPDATE. Returns rows written."""
+        with self._lock:
+            pending = self._last_seen
+            self._last_seen = {}
+        
+        if not pending:
+            return 0
+        
+        devices_table = models.Device.__table__
+        statement = update(devices_table).where(
+            devices_table.c.id == bindparam('b_device_id')
+        ).values(last_seen_at=bindparam('b_last_seen_at'))
+        
+        db = SessionLocal()
+        try:
+            db.execute(statement, [
+                {"b_device_id": device_id, "b_last_seen_at": last_seen_at}
+                for device_id, last_seen_at in pending.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Device last_seen flush error: {e}")
+            # Put the values back so the next flush retries them
+            with self._lock:
+                for device_id, last_seen_at in pending.items():
+                    self._last_seen.setdefault(device_id, last_seen_at)
+            return 0
+        finally:
+            db.close()
+        
+        return len(pending)
+    
+    def start(self):
+        """Start the background last_seen_at flusher."""
+        if self._flusher is not None:
+            return
+        
+        self._stop_event.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="device-last-seen-flusher", daemon=True)
+        self._flusher.start()
+    
+    def stop(self):
+        """Stop the flusher and write any buffered updates."""
+        self._stop_event.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        self.flush_last_seen()
+    
+    def stats(self) -> Dict[str, int]:
+        """Cache hit/miss counters."""
+        with self._lock:
+            return {
+                "cached_keys": len(self._devices),
+                "pending_last_seen": len(self._last_seen),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+    
+    def _flush_loop(self):
+        """Flush buffered last_seen_at values every flush interval."""
+        while not self._stop_event.wait(self.flush_interval_seconds):
+            self.flush_last_seen()
+
+
+# Singleton instance
+_device_auth_cache = None
+
+def get_device_auth_cache() -> DeviceAuthCache:
+    """Get or create DeviceAuthCache instance."""
+    global _device_auth_cache
+    if _device_auth_cache is None:
+        _device_auth_cache = DeviceAuthCache()
+    return _device_auth_cache
@@ -0,0 +1,230 @@
+"""
+Background worker pool for asynchronous event ingestion.
+
+In async mode the ingest endpoints only store the raw event as PENDING and
+hand its id to this pool. Worker threads drain the queue in batches and run
+them through the parser pipeline, so parsing, rules and Google Sheets sync no
+longer add to ingest latency.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import models
+
+
+class IngestWorkerPool:
+    """Drain PENDING raw events on a pool of in-process worker threads."""
+    
+    def __init__(self, enabled: Optional[bool] = None, num_workers: Optional[int] = None,
+                 batch_size: Optional[int] = None):
+        """
+        Initialize the pool. Unset options are read from environment variables:
+        ASYNC_INGEST, INGEST_WORKERS and INGEST_BATCH_SIZE.
+        """
+        config = self._get_config_from_env()
+        self.enabled = config['enabled'] if enabled is None else enabled
+        self.num_workers = num_workers or config['num_workers']
+        self.batch_size = batch_size or config['batch_size']
+        
+        # Queue of (raw_event_id, enqueued_at) tuples
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        
+        # Counters
+        self._processed = 0
+        self._parsed = 0
+        self._failed = 0
+        self._in_progress = 0
+        self._last_lag_seconds = 0.0
+    
+    def _get_config_from_env(self) -> Dict[str, Any]:
+        """Get pool configuration from environment variables."""
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        return {
+            'enabled': os.getenv('ASYNC_INGEST', 'false').lower() in ('1', 'true', 'yes'),
+            'num_workers': int(os.getenv('INGEST_WORKERS', '2')),
+            'batch_size': int(os.getenv('INGEST_BATCH_SIZE', '50'))
+        }
+    
+    def start(self):
+        """Recover unfinished PENDING events and start the worker threads."""
+        if self._running:
+            return
+        
+        self._running = True
+        self.recover_pending()
+        
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"ingest-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the worker threads after their current batch.
+        Events still queued stay PENDING and are recovered on next start.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def submit(self, raw_event_ids: List[int]):
+        """Queue committed raw events for background processing."""
+        now = time.monotonic()
+        with self._condition:
+            for raw_event_id in raw_event_ids:
+                self._queue.append((raw_event_id, now))
+            self._condition.notify(len(raw_event_ids))
+    
+    def recover_pending(self) -> int:
+        """Queue every PENDING raw event left over from a previous run."""
+        db = SessionLocal()
+        try:
+            pending_ids = [
+                row.id for row in db.query(models.RawEvent.id).filter(
+                    models.RawEvent.parsed_status == "PENDING"
+                ).order_by(models.RawEvent.id.asc())
+            ]
+        finally:
+            db.close()
+        
+        # Skip ids that are already queued
+        with self._condition:
+            queued = {raw_event_id for raw_event_id, _ in self._queue}
+        pending_ids = [raw_event_id for raw_event_id in pending_ids if raw_event_id not in queued]
+        
+        if pending_ids:
+            self.submit(pending_ids)
+        return len(pending_ids)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, lag and counters, for sizing the pool."""
+        now = time.monotonic()
+        with self._condition:
+            queue_depth = len(self._queue)
+            oldest_age = now - self._queue[0][1] if self._queue else 0.0
+            in_progress = self._in_progress
+        
+        return {
+            "enabled": self.enabled,
+            "running": self._running,
+            "workers": self.num_workers,
+            "batch_size": self.batch_size,
+            "queue_depth": queue_depth,
+            "in_progress": in_progress,
+            "oldest_queued_seconds": round(oldest_age, 3),
+            "last_lag_seconds": round(self._last_lag_seconds, 3),
+            "processed": self._processed,
+            "parsed": self._parsed,
+            "failed": self._failed
+        }
+    
+    def _next_batch(self) -> List[tuple]:
+        """Block until work is available, then take up to batch_size items."""
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait(timeout=1.0)
+            
+            if not self._running:
+                return []
+            
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            self._in_progress += len(batch)
+            return batch
+    
+    def _worker_loop(self):
+        """Process queued raw events until the pool is stopped."""
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            
+            db = SessionLocal()
+            try:
+                self._process_batch(db, batch)
+            except Exception as e:
+                print(f"Ingest worker error: {e}")
+            finally:
+                db.close()
+                with self._condition:
+                    self._in_progress -= len(batch)
+    
+    def _process_batch(self, db: Session, batch: List[tuple]):
+        """
+        Run one batch of PENDING raw events through the parser pipeline.
+        The batch is committed once; if that fails, events are retried one by one.
+        """
+        from parser import process_raw_event, process_raw_events, sync_transactions_to_sheets
+        
+        enqueued_at = dict(batch)
+        raw_events = db.query(models.RawEvent).filter(
+            models.RawEvent.id.in_(list(enqueued_at)),
+            models.RawEvent.parsed_status == "PENDING"
+        ).order_by(models.RawEvent.id.asc()).all()
+        raw_event_ids = [raw_event.id for raw_event in raw_events]
+        
+        parsed = failed = 0
+        try:
+            transactions, new_transactions = process_raw_events(db, raw_events)
+            db.commit()
+            parsed = sum(1 for transaction in transactions if transaction)
+            failed = len(transactions) - parsed
+            sync_transactions_to_sheets(db, new_transactions)
+        except Exception as e:
+            print(f"Ingest worker batch error, retrying events one by one: {e}")
+            db.rollback()
+            
+            for raw_event_id in raw_event_ids:
+                raw_event = db.query(models.RawEvent).filter(models.RawEvent.id == raw_event_id).first()
+                try:
+                    if process_raw_event(db, raw_event):
+                        parsed += 1
+                    else:
+                        failed += 1
+                except Exception as e:
+                    db.rollback()
+                    raw_event = db.query(models.RawEvent).filter(models.RawEvent.id == raw_event_id).first()
+                    if raw_event:
+                        raw_event.parsed_status = "FAILED"
+                        raw_event.error_message = str(e)
+                        db.commit()
+                    failed += 1
+        
+        with self._condition:
+            self._processed += parsed + failed
+            self._parsed += parsed
+            self._failed += failed
+            if raw_events:
+                self._last_lag_seconds = time.monotonic() - min(enqueued_at.values())
+
+
+# Singleton instance
+_ingest_worker_pool = None
+
+def get_ingest_worker_pool() -> IngestWorkerPool:
+    """Get or create IngestWorkerPool instance."""
+    global _ingest_worker_pool
+    if _ingest_worker_pool is None:
+        _ingest_worker_pool = IngestWorkerPool()
+    return _ingest_worker_pool
@@ -1,18 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, Header
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+import math
+import zlib
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple, Iterator
 
-from database import engine, Base, get_db
+from database import engine, Base, get_db, SessionLocal
 import models, schemas
-from parser import process_raw_event
+from migrations import upgrade_schema
+from parser import (
+    process_raw_events, sync_transactions_to_sheets,
+    generate_content_hash, IN_CLAUSE_CHUNK_SIZE
+)
+from ingest_worker import get_ingest_worker_pool
+from device_auth import get_device_auth_cache, AuthenticatedDevice
+from dedupe_filter import get_dedupe_filter
+from sender_router import get_sender_router
+from template_cache import get_template_cache
+from sms_prefilter import get_sms_prefilter
+from rule_index import get_rule_index_cache, bump_rules_generation, bump_target_generations, EVALUATION_MODES
+from rate_limit import get_ingest_rate_limiter
+import reparse
+import rules_reapply
+from stream_ingest import iter_ndjson_lines, decode_event_line, get_import_registry, STREAM_CHUNK_SIZE
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI(title="OwnSpend API", version="1.0")
 
+# Maximum number of events accepted by a single batch ingest request
+MAX_INGEST_BATCH_SIZE = 1000
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +46,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_background_workers():
+    """Warm the dedupe filter and sender routes, start the last_seen_at flusher, and the parse workers when async ingest is enabled."""
+    db = SessionLocal()
+    try:
+        get_dedupe_filter().warm(db)
+        get_sender_router().load(db)
+    finally:
+        db.close()
+    
+    get_device_auth_cache().start()
+    
+    ingest_worker_pool = get_ingest_worker_pool()
+    if ingest_worker_pool.enabled:
+        ingest_worker_pool.start()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    """Stop the background workers and flush buffered device updates."""
+    get_ingest_worker_pool().stop()
+    get_device_auth_cache().stop()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to OwnSpend API", "version": "1.0"}
@@ -31,58 +77,225 @@ def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 # Device authentication helper
-def authenticate_device(api_key: str = Header(...), db: Session = Depends(get_db)) -> models.Device:
-    """Authenticate device using API key."""
-    device = db.query(models.Device).filter(
-        models.Device.api_key == api_key,
-        models.Device.is_active == True
-    ).first()
+def authenticate_device(api_key: str = Header(...), db: Session = Depends(get_db)) -> AuthenticatedDevice:
+    """
+    Authenticate device using API key.
+    Active keys are cached and last_seen_at is written in bulk in the background.
+    """
+    device = get_device_auth_cache().authenticate(db, api_key)
     
     if not device:
         raise HTTPException(status_code=401, detail="Invalid or inactive device API key")
     
-    # Update last seen
-    device.last_seen_at = datetime.now()
+    return device
+
+def admit_ingest(device: AuthenticatedDevice = Depends(authenticate_device)) -> Iterator[AuthenticatedDevice]:
+    """
+    Admission control for ingest endpoints: a per-device token bucket and a
+    global in-flight cap. Over the limit, respond 429 with Retry-After.
+    """
+    rate_limiter = get_ingest_rate_limiter()
+    admitted, retry_after = rate_limiter.acquire(device.id)
+    
+    if not admitted:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many ingest requests, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+    
+    try:
+        yield device
+    finally:
+        rate_limiter.release()
+
+def _store_raw_events(
+    db: Session,
+    device: AuthenticatedDevice,
+    events: List[schemas.RawEventCreate]
+) -> List[Tuple[models.RawEvent, bool]]:
+    """
+    Store incoming events as PENDING raw events (flushed, not committed).
+    
+    Each event is fingerprinted first: replays of an already stored event -
+    including repeats within the same request - are not stored again.
+    Returns (raw_event, is_replay) for each event, in order.
+    """
+    content_hashes = [
+        generate_content_hash(device.id, event.source_sender, event.raw_text, event.device_timestamp)
+        for event in events
+    ]
+    
+    for attempt in range(2):
+        known = {}
+        unique_hashes = list(set(content_hashes))
+        for start in range(0, len(unique_hashes), IN_CLAUSE_CHUNK_SIZE):
+            chunk = unique_hashes[start:start + IN_CLAUSE_CHUNK_SIZE]
+            for existing in db.query(models.RawEvent).filter(models.RawEvent.content_hash.in_(chunk)).all():
+                known[existing.content_hash] = existing
+        
+        stored = []
+        new_raw_events = []
+        for event, content_hash in zip(events, content_hashes):
+            if content_hash in known:
+                stored.append((known[content_hash], True))
+                continue
+            
+            raw_event = models.RawEvent(
+                user_id=device.user_id,
+                device_id=device.id,
+                source_type=event.source_type,
+                source_sender=event.source_sender,
+                raw_text=event.raw_text,
+                received_at=event.device_timestamp,
+                parsed_status="PENDING",
+                content_hash=content_hash
+            )
+            known[content_hash] = raw_event
+            new_raw_events.append(raw_event)
+            stored.append((raw_event, False))
+        
+        db.add_all(new_raw_events)
+        try:
+            db.flush()
+            return stored
+        except IntegrityError:
+            # A concurrent request stored the same event first; look it up again
+            db.rollback()
+            if attempt:
+                raise
+    
+    return stored
+
+def _replayed_event_result(raw_event: models.RawEvent) -> dict:
+    """Result for an event that was already ingested: the original outcome."""
+    return {
+        "status": "success",
+        "raw_event_id": raw_event.id,
+        "transaction_id": raw_event.related_transaction_id,
+        "parsed": None if raw_event.parsed_status == "PENDING" else raw_event.parsed_status == "PARSED",
+        "duplicate": True
+    }
+
+def _ingest_batch(
+    db: Session,
+    device: AuthenticatedDevice,
+    events: List[schemas.RawEventCreate]
+) -> Tuple[str, List[dict]]:
+    """
+    Store, parse and deduplicate events in a single unit of work.
+    
+    Returns the overall status ("success", "accepted" in async mode, or
+    "error" if the pipeline failed and the events were kept as FAILED) and
+    a result per event, in order.
+    """
+    stored = _store_raw_events(db, device, events)
+    raw_events = [raw_event for raw_event, is_replay in stored if not is_replay]
+    
+    # Async mode: persist and acknowledge, background workers parse them
+    ingest_worker_pool = get_ingest_worker_pool()
+    if ingest_worker_pool.enabled:
+        results = [
+            _replayed_event_result(raw_event) if is_replay else
+            {"status": "accepted", "raw_event_id": raw_event.id, "transaction_id": None, "parsed": None}
+            for raw_event, is_replay in stored
+        ]
+        raw_event_ids = [raw_event.id for raw_event in raw_events]
+        db.commit()
+        ingest_worker_pool.submit(raw_event_ids)
+        return "accepted", results
+    
+    try:
+        transactions, new_transactions = process_raw_events(db, raw_events)
+    except Exception as e:
+        # Keep the raw events, marked as failed
+        db.rollback()
+        stored = _store_raw_events(db, device, events)
+        for raw_event, is_replay in stored:
+            if not is_replay:
+                raw_event.parsed_status = "FAILED"
+                raw_event.error_message = str(e)
+        results = [
+            {"status": "error", "raw_event_id": raw_event.id, "parsed": False, "error": str(e)}
+            for raw_event, _ in stored
+        ]
+        db.commit()
+        return "error", results
+    
+    transaction_by_event = {id(raw_event): transaction for raw_event, transaction in zip(raw_events, transactions)}
+    
+    # Build results before commit expires the ORM objects
+    results = []
+    for raw_event, is_replay in stored:
+        if is_replay:
+            results.append(_replayed_event_result(raw_event))
+            continue
+        
+        transaction = transaction_by_event.get(id(raw_event))
+        result = {
+            "status": "success",
+            "raw_event_id": raw_event.id,
+            "transaction_id": transaction.id if transaction else None,
+            "parsed": transaction is not None
+        }
+        if raw_event.parsed_status == "FAILED":
+            result["error"] = raw_event.error_message
+        elif raw_event.parsed_status == "SKIPPED":
+            result["skipped"] = True
+        results.append(result)
+    
     db.commit()
     
-    return device
+    sync_transactions_to_sheets(db, new_transactions)
+    
+    return "success", results
 
 @app.post("/api/events/ingest")
 def ingest_event(
     event: schemas.RawEventCreate,
-    device: models.Device = Depends(authenticate_device),
+    device: AuthenticatedDevice = Depends(admit_ingest),
     db: Session = Depends(get_db)
 ):
     """Receive raw events from Android app."""
     
-    # Create raw event
-    raw_event = models.RawEvent(
-        user_id=device.user_id,
-        device_id=device.id,
-        source_type=event.source_type,
-        source_sender=event.source_sender,
-        raw_text=event.raw_text,
-        received_at=event.device_timestamp,
-        parsed_status="PENDING"
-    )
+    # Create raw event (replays return the original result)
+    raw_event, is_replay = _store_raw_events(db, device, [event])[0]
+    if is_replay:
+        return _replayed_event_result(raw_event)
     
-    db.add(raw_event)
-    db.commit()
-    db.refresh(raw_event)
+    # Async mode: persist and acknowledge, a background worker parses it
+    ingest_worker_pool = get_ingest_worker_pool()
+    if ingest_worker_pool.enabled:
+        raw_event_id = raw_event.id
+        db.commit()
+        ingest_worker_pool.submit([raw_event_id])
+        
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "raw_event_id": raw_event_id,
+            "transaction_id": None,
+            "parsed": None
+        })
     
-    # Process the event (parse and create transaction)
+    # Process the event (parse and create transaction) in the same unit of work
     try:
-        transaction = process_raw_event(db, raw_event)
+        transactions, new_transactions = process_raw_events(db, [raw_event])
+        transaction = transactions[0]
         
-        return {
+        result = {
             "status": "success",
             "raw_event_id": raw_event.id,
             "transaction_id": transaction.id if transaction else None,
             "parsed": transaction is not None
         }
+        db.commit()
     except Exception as e:
-        raw_event.parsed_status = "FAILED"
-        raw_event.error_message = str(e)
+        # Keep the raw event, marked as failed
+        db.rollback()
+        raw_event, is_replay = _store_raw_events(db, device, [event])[0]
+        if not is_replay:
+            raw_event.parsed_status = "FAILED"
+            raw_event.error_message = str(e)
         db.commit()
         
         return {
@@ -90,6 +303,134 @@ def ingest_event(
             "raw_event_id": raw_event.id,
             "error": str(e)
         }
+    
+    sync_transactions_to_sheets(db, new_transactions)
+    
+    return result
+
+@app.post("/api/events/ingest/batch")
+def ingest_events_batch(
+    batch: schemas.RawEventBatchCreate,
+    device: AuthenticatedDevice = Depends(admit_ingest),
+    db: Session = Depends(get_db)
+):
+    """
+    Receive many raw events from the Android app in one request.
+    
+    All events are stored, parsed and deduplicated in a single transaction.
+    Results are returned per event, in the order they were sent.
+    """
+    if len(batch.events) > MAX_INGEST_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.events)} events (max {MAX_INGEST_BATCH_SIZE})"
+        )
+    
+    status, results = _ingest_batch(db, device, batch.events)
+    response = {
+        "status": status,
+        "total_events": len(results),
+        "results": results
+    }
+    
+    # Async mode: persisted and acknowledged, background workers parse them
+    if status == "accepted":
+        return JSONResponse(status_code=202, content=response)
+    
+    response["parsed"] = sum(1 for result in results if result.get("parsed"))
+    return response
+
+def _ingest_stream_chunk(
+    db: Session,
+    device: AuthenticatedDevice,
+    import_id: str,
+    chunk: List[Tuple[int, schemas.RawEventCreate]]
+):
+    """Ingest one chunk of a streaming import and record its progress."""
+    registry = get_import_registry()
+    status, results = _ingest_batch(db, device, [event for _, event in chunk])
+    
+    parsed = failed = duplicates = queued = 0
+    for (line_number, _), result in zip(chunk, results):
+        if result.get("duplicate"):
+            duplicates += 1
+        elif result["status"] == "accepted":
+            queued += 1
+        elif result.get("parsed"):
+            parsed += 1
+        else:
+            failed += 1
+            registry.add_error(import_id, line_number, result.get("error"))
+    
+    registry.update(import_id, events=len(chunk), parsed=parsed, failed=failed,
+                    duplicates=duplicates, queued=queued, chunks=1)
+    
+    # Keep the session's identity map from growing with the upload
+    db.expunge_all()
+
+@app.post("/api/events/ingest/stream")
+async def ingest_events_stream(
+    request: Request,
+    import_id: Optional[str] = None,
+    device: AuthenticatedDevice = Depends(admit_ingest),
+    db: Session = Depends(get_db)
+):
+    """
+    Import a large backlog of events (e.g. the whole SMS inbox on first install).
+    
+    The body is newline-delimited JSON with one event per line, in the same
+    shape as /api/events/ingest; send it with Content-Encoding: gzip to
+    compress it. Events are parsed while the body is still arriving and
+    ingested in chunks of STREAM_CHUNK_SIZE, each in its own unit of work.
+    Pass an import_id to poll GET /api/events/ingest/stream/{import_id}
+    for progress while the upload runs.
+    """
+    registry = get_import_registry()
+    if import_id and registry.is_running(import_id):
+        raise HTTPException(status_code=409, detail=f"Import {import_id} is already running")
+    import_id = registry.start(device.id, import_id)
+    
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    chunk = []
+    try:
+        async for line_number, line in iter_ndjson_lines(request.stream(), gzipped):
+            registry.update(import_id, lines=1)
+            
+            try:
+                if line is None:
+                    raise ValueError("Line too long")
+                event = schemas.RawEventCreate(**decode_event_line(line))
+            except ValueError as e:
+                registry.update(import_id, invalid=1)
+                registry.add_error(import_id, line_number, str(e))
+                continue
+            
+            chunk.append((line_number, event))
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                await run_in_threadpool(_ingest_stream_chunk, db, device, import_id, chunk)
+                chunk = []
+        
+        if chunk:
+            await run_in_threadpool(_ingest_stream_chunk, db, device, import_id, chunk)
+    except zlib.error as e:
+        registry.add_error(import_id, None, f"Invalid gzip body: {e}")
+        registry.finish(import_id, "failed")
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    except Exception as e:
+        registry.add_error(import_id, None, str(e))
+        registry.finish(import_id, "failed")
+        raise
+    
+    registry.finish(import_id)
+    return registry.get(import_id)
+
+@app.get("/api/events/ingest/stream/{import_id}")
+def get_stream_import_progress(import_id: str, device: AuthenticatedDevice = Depends(authenticate_device)):
+    """Get progress of a streaming import started by this device."""
+    progress = get_import_registry().get(import_id)
+    if not progress or progress["device_id"] != device.id:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
 
 @app.get("/api/transactions")
 def get_transactions(
@@ -201,6 +542,56 @@ def get_raw_events(
     events = query.order_by(models.RawEvent.inserted_at.desc()).offset(skip).limit(limit).all()
     return events
 
+# ============================================================================
+# DEVICE MANAGEMENT APIs
+# ============================================================================
+
+@app.get("/api/devices")
+def get_devices(db: Session = Depends(get_db)):
+    """Get all devices (API keys are not returned)."""
+    # Make sure buffered last_seen_at values are visible
+    get_device_auth_cache().flush_last_seen()
+    
+    devices = db.query(models.Device).all()
+    return [
+        {
+            "id": device.id,
+            "user_id": device.user_id,
+            "device_name": device.device_name,
+            "last_seen_at": device.last_seen_at.isoformat() if device.last_seen_at else None,
+            "is_active": device.is_active
+        }
+        for device in devices
+    ]
+
+@app.put("/api/devices/{device_id}")
+def update_device(
+    device_id: int,
+    device_name: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """Update a device. Deactivating a device revokes its API key immediately."""
+    device = db.query(models.Device).filter(models.Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    if device_name is not None:
+        device.device_name = device_name
+    if is_active is not None:
+        device.is_active = is_active
+    
+    db.commit()
+    
+    # Drop the cached API key so the change applies to the next request
+    get_device_auth_cache().invalidate(api_key=device.api_key, device_id=device.id)
+    
+    return {
+        "id": device.id,
+        "device_name": device.device_name,
+        "is_active": device.is_active
+    }
+
 # ============================================================================
 # RULES MANAGEMENT APIs
 # ============================================================================
@@ -263,6 +654,7 @@ def create_rule(
         is_active=True
     )
     db.add(rule)
+    bump_rules_generation(db, user_id)
     db.commit()
     db.refresh(rule)
     return rule
@@ -296,10 +688,31 @@ def update_rule(
     if is_active is not None:
         rule.is_active = is_active
     
+    bump_rules_generation(db, rule.user_id)
     db.commit()
     db.refresh(rule)
     return rule
 
+@app.get("/api/rules/invalid")
+def get_invalid_rules(
+    user_id: int = 1,  # TODO: Get from auth
+    db: Session = Depends(get_db)
+):
+    """Active rules that can never apply (unparseable values, missing merchants or categories)."""
+    index = get_rule_index_cache().get(db, user_id)
+    invalid = [
+        {
+            "id": rule.id,
+            "match_type": rule.match_type,
+            "match_value": rule.match_value,
+            "action_type": rule.action_type,
+            "action_value": rule.action_value,
+            "reason": index.invalid[rule.id]
+        }
+        for rule in index.rules if rule.id in index.invalid
+    ]
+    return {"rules": invalid, "total": len(invalid)}
+
 @app.delete("/api/rules/{rule_id}")
 def delete_rule(rule_id: int, db: Session = Depends(get_db)):
     """Delete a rule."""
@@ -308,34 +721,39 @@ def delete_rule(rule_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Rule not found")
     
     db.delete(rule)
+    bump_rules_generation(db, rule.user_id)
     db.commit()
     return {"status": "deleted", "id": rule_id}
 
 @app.post("/api/rules/reapply")
 def reapply_rules(
+    background_tasks: BackgroundTasks,
     transaction_ids: Optional[List[str]] = None,
-    db: Session = Depends(get_db)
+    mode: Optional[str] = None
 ):
-    """Re-apply rules to existing transactions."""
-    from .rules_engine import RulesEngine
-    
-    query = db.query(models.Transaction)
-    
-    if transaction_ids:
-        query = query.filter(models.Transaction.id.in_(transaction_ids))
-    
-    transactions = query.all()
-    applied_count = 0
+    """
+    Re-apply rules to existing transactions (all of them, or the given ids)
+    in a background job. mode overrides RULES_EVALUATION_MODE. Poll GET
+    /api/rules/reapply/{job_id} for progress.
+    """
+    if mode is not None and mode not in EVALUATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(EVALUATION_MODES)}")
     
-    for transaction in transactions:
-        if RulesEngine.apply_rules(db, transaction):
-            applied_count += 1
+    registry = rules_reapply.get_reapply_registry()
+    job_id = registry.start(mode or get_rule_index_cache().evaluation_mode)
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="A rules reapply job is already running")
     
-    return {
-        "status": "success",
-        "transactions_processed": len(transactions),
-        "rules_applied": applied_count
-    }
+    background_tasks.add_task(rules_reapply.run_reapply_job, job_id, transaction_ids, mode)
+    return registry.get(job_id)
+
+@app.get("/api/rules/reapply/{job_id}")
+def get_reapply_progress(job_id: str):
+    """Get progress of a rules reapply job."""
+    progress = rules_reapply.get_reapply_registry().get(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Reapply job not found")
+    return progress
 
 # ============================================================================
 # MERCHANT MANAGEMENT APIs
@@ -369,6 +787,10 @@ def create_merchant(
         is_self_account=is_self_account
     )
     db.add(merchant)
+    db.flush()
+    # Rules naming this merchant can now apply
+    bump_target_generations(db, "merchant_id", [merchant.id])
+    bump_target_generations(db, "merchant_key", [merchant_key])
     db.commit()
     db.refresh(merchant)
     return merchant
@@ -422,6 +844,8 @@ def delete_merchant(merchant_id: int, db: Session = Depends(get_db)):
         )
     
     db.delete(merchant)
+    bump_target_generations(db, "merchant_id", [merchant_id])
+    bump_target_generations(db, "merchant_key", [merchant.merchant_key])
     db.commit()
     return {"status": "deleted", "id": merchant_id}
 
@@ -448,6 +872,10 @@ def create_category(
         sort_order=sort_order
     )
     db.add(category)
+    db.flush()
+    # Rules naming this category can now apply
+    bump_target_generations(db, "category_id", [category.id])
+    bump_target_generations(db, "category_name", [name])
     db.commit()
     db.refresh(category)
     return category
@@ -473,6 +901,7 @@ def update_category(
         ).first()
         if existing:
             raise HTTPException(status_code=400, detail="Category name already exists")
+        bump_target_generations(db, "category_name", [category.name, name])
         category.name = name
     
     if parent_id is not None:
@@ -503,6 +932,8 @@ def delete_category(category_id: int, db: Session = Depends(get_db)):
         )
     
     db.delete(category)
+    bump_target_generations(db, "category_id", [category_id])
+    bump_target_generations(db, "category_name", [category.name])
     db.commit()
     return {"status": "deleted", "id": category_id}
 
@@ -611,44 +1042,41 @@ def reparse_events(
     status: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    full: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Re-parse raw events (useful after improving parser logic)."""
-    from .parser import process_raw_event
-    
-    query = db.query(models.RawEvent)
-    
-    if status:
-        query = query.filter(models.RawEvent.parsed_status == status)
-    
-    if date_from:
-        query = query.filter(models.RawEvent.inserted_at >= date_from)
-    
-    if date_to:
-        query = query.filter(models.RawEvent.inserted_at <= date_to)
-    
-    events = query.all()
-    
-    success_count = 0
-    failed_count = 0
-    
-    for event in events:
-        try:
-            transaction = process_raw_event(db, event)
-            if transaction:
-                success_count += 1
-            else:
-                failed_count += 1
-        except Exception as e:
-            failed_count += 1
-            print(f"Reparse error for event {event.id}: {e}")
-    
-    return {
-        "status": "complete",
-        "total_events": len(events),
-        "successful": success_count,
-        "failed": failed_count
-    }
+    """
+    Re-parse raw events (useful after improving parser logic).
+    Only events whose parser changed since they were parsed, or FAILED
+    events that would now go to another parser, are re-parsed unless full
+    is set. Events are parsed in worker processes and written in chunks;
+    Google Sheets is not synced for reparsed transactions.
+    """
+    return reparse.reparse_events(db, status=status, date_from=date_from, date_to=date_to, full=full)
+
+@app.get("/api/admin/ingest/queue")
+def get_ingest_queue_stats(db: Session = Depends(get_db)):
+    """Get async ingest queue depth, lag and worker counters."""
+    stats = get_ingest_worker_pool().stats()
+    stats["pending_in_db"] = db.query(models.RawEvent).filter(
+        models.RawEvent.parsed_status == "PENDING"
+    ).count()
+    stats["dedupe_filter"] = get_dedupe_filter().stats()
+    stats["sender_router"] = get_sender_router().stats()
+    stats["parse_templates"] = get_template_cache().stats()
+    stats["prefilter"] = get_sms_prefilter().stats()
+    stats["rule_index"] = get_rule_index_cache().stats()
+    return stats
+
+@app.get("/api/admin/ingest/prefilter")
+def evaluate_ingest_prefilter(db: Session = Depends(get_db)):
+    """Precision/recall of the non-transaction pre-filter against stored PARSED and FAILED events."""
+    return get_sms_prefilter().evaluate(db)
+
+@app.get("/api/admin/ingest/rate-limits")
+def get_ingest_rate_limit_stats():
+    """Get ingest rate limits, in-flight requests and throttle counters."""
+    return get_ingest_rate_limiter().stats()
 
 @app.get("/api/admin/stats")
 def get_stats(db: Session = Depends(get_db)):
@@ -671,6 +1099,9 @@ def get_stats(db: Session = Depends(get_db)):
     pending_events = db.query(models.RawEvent).filter(
         models.RawEvent.parsed_status == "PENDING"
     ).count()
+    skipped_events = db.query(models.RawEvent).filter(
+        models.RawEvent.parsed_status == "SKIPPED"
+    ).count()
     
     # Categorization stats
     categorized_transactions = db.query(models.Transaction).filter(
@@ -692,7 +1123,8 @@ def get_stats(db: Session = Depends(get_db)):
             "total": total_raw_events,
             "parsed": parsed_events,
             "failed": failed_events,
-            "pending": pending_events
+            "pending": pending_events,
+            "skipped": skipped_events
         },
         "entities": {
             "merchants": total_merchants,
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Lightweight schema upgrades for existing databases.
+
+Base.metadata.create_all only creates missing tables, so columns and indexes
+added to existing tables are applied here. upgrade_schema runs at startup and
+is safe to run repeatedly; backfills that ingest does not depend on are
+one-time jobs run from the command line:
+
+    cd backend
+    python migrations.py
+"""
+from sqlalchemy import inspect, text, select, update, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import models
+
+# Rows processed per commit during backfills
+BACKFILL_CHUNK_SIZE = 500
+
+
+def _add_column(engine: Engine, table: str, column: str, ddl_type: str) -> bool:
+    """Add a column to an existing table if it is missing. Returns True if added."""
+    existing = {col['name'] for col in inspect(engine).get_columns(table)}
+    if column in existing:
+        return False
+    
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return True
+
+
+def _create_index(engine: Engine, table: str, name: str, columns: str, unique: bool = False):
+    """Create an index if it does not exist yet."""
+    unique_sql = "UNIQUE " if unique else ""
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _merge_duplicate_accounts(engine: Engine) -> int:
+    """
+    Fold accounts that share (user_id, bank_name, account_mask) into the
+    oldest one, so the unique index can be created. Returns accounts removed.
+    """
+    with engine.begin() as conn:
+        duplicates = conn.execute(text(
+            "SELECT a.id, keep.id FROM accounts a "
+            "JOIN (SELECT MIN(id) AS id, user_id, bank_name, account_mask FROM accounts "
+            "      GROUP BY user_id, bank_name, account_mask HAVING COUNT(*) > 1) keep "
+            "ON a.user_id = keep.user_id AND a.bank_name = keep.bank_name "
+            "AND a.account_mask = keep.account_mask AND a.id != keep.id"
+        )).all()
+        
+        for duplicate_id, keep_id in duplicates:
+            conn.execute(text("UPDATE transactions SET account_id = :keep_id WHERE account_id = :duplicate_id"),
+                         {"keep_id": keep_id, "duplicate_id": duplicate_id})
+            conn.execute(text("DELETE FROM accounts WHERE id = :duplicate_id"), {"duplicate_id": duplicate_id})
+    
+    return len(duplicates)
+
+
+def _drop_index(engine: Engine, name: str):
+    """Drop an index if it exists."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def backfill_dedupe_hashes(engine: Engine) -> int:
+    """
+    Fill transactions.dedupe_hash for rows stored before the hash column
+    existed. Runs from upgrade_schema, since ingest dedupes on the hash.
+    Returns the number of rows updated.
+    """
+    from parser import generate_dedupe_hash
+    
+    transactions_table = models.Transaction.__table__
+    statement = update(transactions_table).where(
+        transactions_table.c.id == bindparam('b_id')
+    ).values(dedupe_hash=bindparam('b_dedupe_hash'))
+    
+    updated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(transactions_table.c.id, transactions_table.c.dedupe_key).where(
+                    transactions_table.c.dedupe_hash.is_(None),
+                    transactions_table.c.dedupe_key.isnot(None)
+                ).limit(BACKFILL_CHUNK_SIZE)
+            ).all()
+            
+            if not rows:
+                break
+            
+            conn.execute(statement, [
+                {"b_id": row.id, "b_dedupe_hash": generate_dedupe_hash(row.dedupe_key)}
+                for row in rows
+            ])
+            updated += len(rows)
+    
+    return updated
+
+
+def upgrade_schema(engine: Engine):
+    """Bring an existing database up to the current models."""
+    tables = set(inspect(engine).get_table_names())
+    
+    if 'raw_events' in tables:
+        _add_column(engine, 'raw_events', 'content_hash', 'VARCHAR')
+        _create_index(engine, 'raw_events', 'ix_raw_events_content_hash', 'content_hash', unique=True)
+        _add_column(engine, 'raw_events', 'parser_name', 'VARCHAR')
+        _add_column(engine, 'raw_events', 'parser_version', 'VARCHAR')
+    
+    if 'transactions' in tables:
+        _add_column(engine, 'transactions', 'dedupe_hash', 'BIGINT')
+        backfill_dedupe_hashes(engine)
+        _create_index(engine, 'transactions', 'ix_transactions_dedupe_hash', 'dedupe_hash', unique=True)
+        # The exact check moved to the 64-bit hash; the wide text index is no longer used
+        _drop_index(engine, 'ix_transactions_dedupe_key')
+        
+        if _add_column(engine, 'transactions', 'amount_paise', 'INTEGER'):
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE transactions SET amount_paise = CAST(ROUND(amount * 100) AS INTEGER)"))
+        _create_index(engine, 'transactions', 'ix_transactions_user_amount_time',
+                      'user_id, amount_paise, transaction_time')
+    
+    if 'accounts' in tables:
+        merged = _merge_duplicate_accounts(engine)
+        if merged:
+            print(f"⚠️  Merged {merged} duplicate accounts")
+        _create_index(engine, 'accounts', 'ix_accounts_user_bank_mask', 'user_id, bank_name, account_mask', unique=True)
+
+
+def backfill_content_hashes(db: Session) -> int:
+    """
+    Fill raw_events.content_hash for rows stored before idempotent ingest.
+    When several old rows share a fingerprint, only the first one gets it.
+    Returns the number of rows updated.
+    """
+    from parser import generate_content_hash
+    
+    updated = 0
+    last_id = 0
+    
+    while True:
+        raw_events = db.query(models.RawEvent).filter(
+            models.RawEvent.id > last_id,
+            models.RawEvent.content_hash.is_(None)
+        ).order_by(models.RawEvent.id.asc()).limit(BACKFILL_CHUNK_SIZE).all()
+        
+        if not raw_events:
+            break
+        
+        hashes = {
+            raw_event.id: generate_content_hash(
+                raw_event.device_id, raw_event.source_sender, raw_event.raw_text, raw_event.received_at
+            )
+            for raw_event in raw_events
+        }
+        taken = {
+            row.content_hash for row in db.query(models.RawEvent.content_hash).filter(
+                models.RawEvent.content_hash.in_(list(set(hashes.values())))
+            )
+        }
+        
+        for raw_event in raw_events:
+            content_hash = hashes[raw_event.id]
+            if content_hash not in taken:
+                raw_event.content_hash = content_hash
+                taken.add(content_hash)
+                updated += 1
+        
+        last_id = raw_events[-1].id
+        db.commit()
+    
+    return updated
+
+
+if __name__ == "__main__":
+    from database import engine, Base, SessionLocal
+    
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    print("✅ Schema is up to date")
+    
+    db = SessionLocal()
+    try:
+        count = backfill_content_hashes(db)
+        print(f"✅ Backfilled content hashes for {count} raw events")
+    finally:
+        db.close()
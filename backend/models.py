@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Numeric, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Numeric, Text, Float, Index, BigInteger
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -31,6 +31,9 @@ class Device(Base):
 
 class Account(Base):
     __tablename__ = "accounts"
+    __table_args__ = (
+        Index("ix_accounts_user_bank_mask", "user_id", "bank_name", "account_mask", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -55,18 +58,26 @@ class RawEvent(Base):
     raw_text = Column(Text)
     received_at = Column(DateTime(timezone=True))
     inserted_at = Column(DateTime(timezone=True), server_default=func.now())
-    parsed_status = Column(String, default="PENDING") # PENDING, PARSED, FAILED
+    parsed_status = Column(String, default="PENDING") # PENDING, PARSED, FAILED, SKIPPED
     error_message = Column(Text, nullable=True)
     related_transaction_id = Column(String, ForeignKey("transactions.id"), nullable=True)
+    content_hash = Column(String, unique=True, index=True, nullable=True) # Fingerprint for idempotent ingest
+    parser_name = Column(String, nullable=True) # Parser that handled the event on its last parse
+    parser_version = Column(String, nullable=True) # Version hash of that parser's spec
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Cross-source dedupe looks up near matches by amount within a time window
+        Index("ix_transactions_user_amount_time", "user_id", "amount_paise", "transaction_time"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey("users.id"))
     account_id = Column(Integer, ForeignKey("accounts.id"))
     direction = Column(String) # DEBIT, CREDIT
     amount = Column(Float)
+    amount_paise = Column(Integer)  # amount * 100, for indexed matching
     currency = Column(String, default="INR")
     channel = Column(String) # UPI, CARD, NETBANKING, ATM, OTHER
     raw_merchant_identifier = Column(String, nullable=True)
@@ -76,7 +87,8 @@ class Transaction(Base):
     description = Column(String, nullable=True)
     transaction_time = Column(DateTime(timezone=True))
     ingested_at = Column(DateTime(timezone=True), server_default=func.now())
-    dedupe_key = Column(String, unique=True, index=True)
+    dedupe_key = Column(String)
+    dedupe_hash = Column(BigInteger, unique=True, index=True)  # 64-bit hash of dedupe_key
     is_internal_transfer = Column(Boolean, default=False)
     manual_override_flags = Column(Integer, default=0)
 
@@ -121,3 +133,17 @@ class Rule(Base):
     is_active = Column(Boolean, default=True)
 
     user = relationship("User", back_populates="rules")
+
+class RuleSetGeneration(Base):
+    __tablename__ = "rule_set_generations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    generation = Column(Integer, nullable=False, default=0) # Bumped on every change to the user's rules
+
+class SenderRoute(Base):
+    __tablename__ = "sender_routes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sender = Column(String, unique=True, index=True) # Normalized sender header or package name
+    parser_name = Column(String)
+    learned_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,9 +1,56 @@
+import os
+import uuid
+import hashlib
 import re
-from datetime import datetime
-from typing import Optional, Dict, Any
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple, Sequence
+from sqlalchemy.orm import Session, make_transient_to_detached
+from upsert import insert_ignore_returning
+from dedupe_filter import get_dedupe_filter
+from sender_router import get_sender_router
+from template_cache import get_template_cache
+from parser_engine import PARSERS, MAX_PARSE_LENGTH, ParseBudgetExceeded, check_parse_length
+from sms_prefilter import PREFILTER_NAME, get_sms_prefilter
 import models
 
+# SQLite caps the number of bound parameters per statement, so IN (...) lookups
+# over a batch are split into chunks of this size.
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Replays of the same event whose timestamps fall in the same bucket share a
+# content hash (matches the minute resolution of the dedupe key).
+CONTENT_HASH_BUCKET_SECONDS = 60
+
+# Recorded as the parser_name of events too long to parse, which never reach
+# a parser; its version is the limit, so they are only re-parsed if it changes
+LENGTH_LIMIT_NAME = 'length_limit'
+
+# Cross-source dedupe window, loaded lazily by get_cross_source_window()
+_cross_source_window = None
+
+class ParseOutcome(NamedTuple):
+    """Result of parsing one event."""
+    parsed_data: Optional[Dict[str, Any]]
+    error: Optional[str]
+    # Parser the event was routed to (LENGTH_LIMIT_NAME if it was too long to
+    # route, None if routing itself failed)
+    parser_name: Optional[str] = None
+    # Why the pre-filter rejected the event as not a transaction
+    skip_reason: Optional[str] = None
+
+
+def current_parser_versions() -> Dict[str, str]:
+    """
+    Version of every parser (and of the pre-filter, when enabled, and the
+    length limit) by the name stored on raw events.
+    """
+    versions = {name: parser.version for name, parser in PARSERS.items()}
+    versions[LENGTH_LIMIT_NAME] = str(MAX_PARSE_LENGTH)
+    prefilter = get_sms_prefilter()
+    if prefilter.enabled:
+        versions[PREFILTER_NAME] = prefilter.version
+    return versions
+
 class TransactionParser:
     """Parse SMS and notification texts to extract transaction details."""
     
@@ -15,37 +62,7 @@ class TransactionParser:
         - "Sent Rs.15.00 from Kotak Bank AC X1415 to amitabh10b26.hts21@okicici via UPI Ref no 434750881179"
         - "Rs 123.45 debited from a/c X1415 on 01-Dec-25..."
         """
-        result = {}
-        
-        # Extract amount
-        amount_match = re.search(r'Rs\.?\s*(\d+\.?\d*)', raw_text, re.IGNORECASE)
-        if amount_match:
-            result['amount'] = float(amount_match.group(1))
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['sent', 'debited', 'paid', 'withdrawn']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['received', 'credited', 'deposited']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'[Aa]/[Cc]\s*([A-Z0-9]+)|AC\s*([A-Z0-9]+)', raw_text)
-        if account_match:
-            result['account_mask'] = account_match.group(1) or account_match.group(2)
-        
-        # Extract UPI ID if present
-        upi_match = re.search(r'to\s+([\w.]+@[\w]+)', raw_text)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Check if it's a UPI transaction
-        if 'upi' in raw_text.lower():
-            result['channel'] = 'UPI'
-        
-        result['bank_name'] = 'Kotak'
-        
-        return result if result else None
+        return PARSERS['kotak'].parse(raw_text)
     
     @staticmethod
     def parse_uco_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -53,41 +70,12 @@ class TransactionParser:
         Parse UCO Bank SMS messages.
         Example: "UCO-UPI/CR/434750881179/amitabh10b26.hts21@okicici/UCO BANK/XX3242/15.00"
         """
-        result = {}
-        
-        # UCO UPI pattern
-        uco_pattern = r'UCO-UPI/(CR|DR)/(\d+)/([\w.@]+)/([^/]+)/([^/]+)/([\d.]+)'
-        match = re.search(uco_pattern, raw_text)
-        
-        if match:
-            result['direction'] = 'CREDIT' if match.group(1) == 'CR' else 'DEBIT'
-            result['raw_merchant_identifier'] = match.group(3)
-            result['account_mask'] = match.group(5)
-            result['amount'] = float(match.group(6))
-            result['channel'] = 'UPI'
-            result['bank_name'] = 'UCO'
-        
-        return result if result else None
+        return PARSERS['uco'].parse(raw_text)
     
     @staticmethod
     def parse_gpay_notification(raw_text: str) -> Optional[Dict[str, Any]]:
         """Parse Google Pay notification."""
-        result = {}
-        
-        # Extract amount
-        amount_match = re.search(r'₹\s*(\d+\.?\d*)', raw_text)
-        if amount_match:
-            result['amount'] = float(amount_match.group(1))
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['sent', 'paid']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['received']):
-            result['direction'] = 'CREDIT'
-        
-        result['channel'] = 'UPI'
-        
-        return result if result else None
+        return PARSERS['gpay'].parse(raw_text)
     
     @staticmethod
     def parse_hdfc_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -99,52 +87,7 @@ class TransactionParser:
         - "You've done a UPI txn of Rs.100.00 from HDFC A/c XX1234 to JOHN@okaxis. Ref 123456789012"
         - "Alert: INR 1500.00 debited from A/c XX1234 on 01-Dec-25 by ATM-WDL. Avl Bal: INR 5000.00"
         """
-        result = {}
-        
-        # Extract amount - multiple patterns
-        amount_patterns = [
-            r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)',
-            r'INR\s*(\d+(?:,\d+)*\.?\d*)',
-            r'₹\s*(\d+(?:,\d+)*\.?\d*)'
-        ]
-        for pattern in amount_patterns:
-            amount_match = re.search(pattern, raw_text, re.IGNORECASE)
-            if amount_match:
-                result['amount'] = float(amount_match.group(1).replace(',', ''))
-                break
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['debited', 'debit', 'withdrawn', 'sent', 'paid', 'txn of rs']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['credited', 'credit', 'received', 'deposited']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'A/c\s*(?:no\.?)?\s*[Xx]*(\d{4})|[Xx]{2}(\d{4})', raw_text, re.IGNORECASE)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1) or account_match.group(2)}"
-        
-        # Extract UPI ID/merchant
-        upi_match = re.search(r'(?:to|from|Info:)\s*(?:UPI/?)?\s*([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Detect channel
-        if 'upi' in raw_text.lower():
-            result['channel'] = 'UPI'
-        elif 'atm' in raw_text.lower():
-            result['channel'] = 'ATM'
-        elif 'neft' in raw_text.lower():
-            result['channel'] = 'NEFT'
-        elif 'imps' in raw_text.lower():
-            result['channel'] = 'IMPS'
-        elif 'pos' in raw_text.lower():
-            result['channel'] = 'POS'
-        
-        result['bank_name'] = 'HDFC'
-        
-        return result if result else None
+        return PARSERS['hdfc'].parse(raw_text)
     
     @staticmethod
     def parse_icici_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -156,58 +99,7 @@ class TransactionParser:
         - "Rs.500 sent from ICICI Bank Acc XX1234 to john@okaxis. UPI Ref:123456789012"
         - "Dear Customer, your ICICI Bank Credit Card XX1234 has been used for Rs.500.00 at AMAZON"
         """
-        result = {}
-        
-        # Extract amount
-        amount_patterns = [
-            r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)',
-            r'INR\s*(\d+(?:,\d+)*\.?\d*)',
-            r'for\s+(\d+(?:,\d+)*\.?\d*)',
-            r'with\s+Rs\.?\s*(\d+(?:,\d+)*\.?\d*)'
-        ]
-        for pattern in amount_patterns:
-            amount_match = re.search(pattern, raw_text, re.IGNORECASE)
-            if amount_match:
-                result['amount'] = float(amount_match.group(1).replace(',', ''))
-                break
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['debited', 'sent', 'used for', 'paid']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['credited', 'received', 'deposited']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'(?:Acct?|Acc|A/c|Card)\s*[Xx]*(\d{4})', raw_text, re.IGNORECASE)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1)}"
-        
-        # Extract UPI ID/merchant
-        upi_match = re.search(r'(?:to|from)\s+([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Extract merchant name for card transactions
-        merchant_match = re.search(r'at\s+([A-Za-z0-9\s]+?)(?:\s+on|\.|$)', raw_text)
-        if merchant_match and 'raw_merchant_identifier' not in result:
-            result['raw_merchant_identifier'] = merchant_match.group(1).strip()
-        
-        # Detect channel
-        if 'upi' in raw_text.lower():
-            result['channel'] = 'UPI'
-        elif 'imps' in raw_text.lower():
-            result['channel'] = 'IMPS'
-        elif 'neft' in raw_text.lower():
-            result['channel'] = 'NEFT'
-        elif 'credit card' in raw_text.lower():
-            result['channel'] = 'CARD'
-        elif 'debit card' in raw_text.lower():
-            result['channel'] = 'CARD'
-        
-        result['bank_name'] = 'ICICI'
-        
-        return result if result else None
+        return PARSERS['icici'].parse(raw_text)
     
     @staticmethod
     def parse_sbi_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -219,49 +111,7 @@ class TransactionParser:
         - "SBI UPI: A/c X1234 debited Rs.500.00 on 01Dec Ref 123456789012 credited to VPA john@upi"
         - "ATM-SBI: Rs.500 withdrawn from A/c XX1234 on 01Dec25. Avl bal: Rs.5000.00"
         """
-        result = {}
-        
-        # Extract amount
-        amount_patterns = [
-            r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)',
-            r'INR\s*(\d+(?:,\d+)*\.?\d*)'
-        ]
-        for pattern in amount_patterns:
-            amount_match = re.search(pattern, raw_text, re.IGNORECASE)
-            if amount_match:
-                result['amount'] = float(amount_match.group(1).replace(',', ''))
-                break
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['debited', 'withdrawn', 'sent', 'paid', 'debit']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['credited', 'received', 'deposited', 'credit']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'(?:a/c\s*(?:no\.?)?\s*)?[Xx]+(\d{4})', raw_text, re.IGNORECASE)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1)}"
-        
-        # Extract VPA/UPI ID
-        vpa_match = re.search(r'(?:VPA|to|from)\s+([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if vpa_match:
-            result['raw_merchant_identifier'] = vpa_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Detect channel
-        if 'upi' in raw_text.lower() or 'vpa' in raw_text.lower():
-            result['channel'] = 'UPI'
-        elif 'atm' in raw_text.lower():
-            result['channel'] = 'ATM'
-        elif 'neft' in raw_text.lower():
-            result['channel'] = 'NEFT'
-        elif 'imps' in raw_text.lower():
-            result['channel'] = 'IMPS'
-        
-        result['bank_name'] = 'SBI'
-        
-        return result if result else None
+        return PARSERS['sbi'].parse(raw_text)
     
     @staticmethod
     def parse_axis_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -273,58 +123,7 @@ class TransactionParser:
         - "INR 500.00 spent on Axis Bank Credit Card XX1234 at AMAZON on 01-Dec-25. Avl Limit: INR 50000"
         - "Rs 500 transferred from Axis Bank A/c XX1234 to john@okaxis. UPI Ref: 123456789012"
         """
-        result = {}
-        
-        # Extract amount
-        amount_patterns = [
-            r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)',
-            r'INR\s*(\d+(?:,\d+)*\.?\d*)'
-        ]
-        for pattern in amount_patterns:
-            amount_match = re.search(pattern, raw_text, re.IGNORECASE)
-            if amount_match:
-                result['amount'] = float(amount_match.group(1).replace(',', ''))
-                break
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['debited', 'spent', 'transferred', 'sent', 'paid']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['credited', 'received', 'deposited']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'(?:A/c\s*(?:no\.?)?\s*|Card\s*)[Xx]*(\d{4})', raw_text, re.IGNORECASE)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1)}"
-        
-        # Extract UPI ID from Info field or direct mention
-        upi_match = re.search(r'(?:Info[:\-]?\s*UPI/|to\s+)([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Extract merchant name for card transactions
-        merchant_match = re.search(r'at\s+([A-Za-z0-9\s]+?)\s+on', raw_text)
-        if merchant_match and 'raw_merchant_identifier' not in result:
-            result['raw_merchant_identifier'] = merchant_match.group(1).strip()
-        
-        # Detect channel
-        if 'upi' in raw_text.lower():
-            result['channel'] = 'UPI'
-        elif 'credit card' in raw_text.lower():
-            result['channel'] = 'CARD'
-        elif 'debit card' in raw_text.lower():
-            result['channel'] = 'CARD'
-        elif 'neft' in raw_text.lower():
-            result['channel'] = 'NEFT'
-        elif 'imps' in raw_text.lower():
-            result['channel'] = 'IMPS'
-        elif 'atm' in raw_text.lower():
-            result['channel'] = 'ATM'
-        
-        result['bank_name'] = 'Axis'
-        
-        return result if result else None
+        return PARSERS['axis'].parse(raw_text)
     
     @staticmethod
     def parse_phonepe_notification(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -335,37 +134,7 @@ class TransactionParser:
         - "Received ₹500 from john@upi to HDFC XX1234"
         - "Payment of ₹500 to AMAZON successful"
         """
-        result = {}
-        
-        # Extract amount
-        amount_match = re.search(r'₹\s*(\d+(?:,\d+)*\.?\d*)', raw_text)
-        if amount_match:
-            result['amount'] = float(amount_match.group(1).replace(',', ''))
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['paid', 'payment of', 'sent']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['received']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract UPI ID or merchant
-        upi_match = re.search(r'(?:to|from)\s+([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-        else:
-            # Try to extract merchant name
-            merchant_match = re.search(r'(?:to|from)\s+([A-Za-z0-9\s]+?)(?:\s+from|\s+to|\s+successful|$)', raw_text, re.IGNORECASE)
-            if merchant_match:
-                result['raw_merchant_identifier'] = merchant_match.group(1).strip()
-        
-        # Extract account mask
-        account_match = re.search(r'[Xx]{2}(\d{4})', raw_text)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1)}"
-        
-        result['channel'] = 'UPI'
-        
-        return result if result else None
+        return PARSERS['phonepe'].parse(raw_text)
     
     @staticmethod
     def parse_paytm_notification(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -376,32 +145,7 @@ class TransactionParser:
         - "Rs.500 received from john@paytm"
         - "Paid Rs.500 at AMAZON using Paytm"
         """
-        result = {}
-        
-        # Extract amount
-        amount_match = re.search(r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)', raw_text, re.IGNORECASE)
-        if amount_match:
-            result['amount'] = float(amount_match.group(1).replace(',', ''))
-        
-        # Determine direction
-        if any(word in raw_text.lower() for word in ['paid', 'sent', 'you paid']):
-            result['direction'] = 'DEBIT'
-        elif any(word in raw_text.lower() for word in ['received']):
-            result['direction'] = 'CREDIT'
-        
-        # Extract UPI ID or merchant
-        upi_match = re.search(r'(?:to|from)\s+([\w.]+@[\w]+)', raw_text, re.IGNORECASE)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-        else:
-            # Try to extract merchant name
-            merchant_match = re.search(r'at\s+([A-Za-z0-9\s]+?)(?:\s+using|$)', raw_text, re.IGNORECASE)
-            if merchant_match:
-                result['raw_merchant_identifier'] = merchant_match.group(1).strip()
-        
-        result['channel'] = 'UPI'
-        
-        return result if result else None
+        return PARSERS['paytm'].parse(raw_text)
     
     @staticmethod
     def parse_generic_bank_sms(raw_text: str) -> Optional[Dict[str, Any]]:
@@ -409,184 +153,537 @@ class TransactionParser:
         Generic parser for unknown banks. Tries to extract basic info.
         Works as a fallback for less common banks.
         """
-        result = {}
-        
-        # Extract amount - try multiple patterns
-        amount_patterns = [
-            r'Rs\.?\s*(\d+(?:,\d+)*\.?\d*)',
-            r'INR\s*(\d+(?:,\d+)*\.?\d*)',
-            r'₹\s*(\d+(?:,\d+)*\.?\d*)',
-            r'(?:debited|credited|paid|received)\s*(?:Rs\.?|INR)?\s*(\d+(?:,\d+)*\.?\d*)'
-        ]
-        for pattern in amount_patterns:
-            amount_match = re.search(pattern, raw_text, re.IGNORECASE)
-            if amount_match:
-                result['amount'] = float(amount_match.group(1).replace(',', ''))
-                break
-        
-        # Determine direction
-        debit_words = ['debited', 'debit', 'withdrawn', 'sent', 'paid', 'spent', 'transferred']
-        credit_words = ['credited', 'credit', 'received', 'deposited']
-        
-        text_lower = raw_text.lower()
-        if any(word in text_lower for word in debit_words):
-            result['direction'] = 'DEBIT'
-        elif any(word in text_lower for word in credit_words):
-            result['direction'] = 'CREDIT'
-        
-        # Extract account mask
-        account_match = re.search(r'(?:A/c|Acct?|Account|Card)\s*(?:no\.?)?\s*[Xx]*(\d{4})', raw_text, re.IGNORECASE)
-        if account_match:
-            result['account_mask'] = f"XX{account_match.group(1)}"
-        
-        # Extract UPI ID if present
-        upi_match = re.search(r'([\w.]+@[\w]+)', raw_text)
-        if upi_match:
-            result['raw_merchant_identifier'] = upi_match.group(1)
-            result['channel'] = 'UPI'
-        
-        # Detect channel
-        if 'upi' in text_lower:
-            result['channel'] = 'UPI'
-        elif 'atm' in text_lower:
-            result['channel'] = 'ATM'
-        elif 'neft' in text_lower:
-            result['channel'] = 'NEFT'
-        elif 'imps' in text_lower:
-            result['channel'] = 'IMPS'
-        elif 'card' in text_lower:
-            result['channel'] = 'CARD'
-        
-        result['bank_name'] = 'Unknown'
-        
-        return result if result else None
+        return PARSERS['generic'].parse(raw_text)
     
     @staticmethod
     def parse_event(raw_event: models.RawEvent) -> Optional[Dict[str, Any]]:
-        """Route to appropriate parser based on source."""
-        source_lower = raw_event.source_sender.lower()
+        """
+        Route to the appropriate parser: by sender header or package name
+        when it is indexed or learned, by body keywords otherwise. Messages
+        whose template was parsed before reuse the cached extraction.
+        """
         raw_text_lower = raw_event.raw_text.lower()
         
-        # Bank-specific parsers
-        if 'kotak' in source_lower or 'kotak' in raw_text_lower:
-            return TransactionParser.parse_kotak_sms(raw_event.raw_text)
-        elif 'uco' in source_lower or 'uco-upi' in raw_text_lower:
-            return TransactionParser.parse_uco_sms(raw_event.raw_text)
-        elif 'hdfc' in source_lower or 'hdfc' in raw_text_lower:
-            return TransactionParser.parse_hdfc_sms(raw_event.raw_text)
-        elif 'icici' in source_lower or 'icici' in raw_text_lower:
-            return TransactionParser.parse_icici_sms(raw_event.raw_text)
-        elif 'sbi' in source_lower or ('sbi' in raw_text_lower and 'possible' not in raw_text_lower):
-            return TransactionParser.parse_sbi_sms(raw_event.raw_text)
-        elif 'axis' in source_lower or 'axis' in raw_text_lower:
-            return TransactionParser.parse_axis_sms(raw_event.raw_text)
+        router = get_sender_router()
+        parser_name, from_index = router.route(raw_event.source_sender, raw_text_lower)
+        result = get_template_cache().parse(PARSERS[parser_name], raw_event.raw_text, raw_text_lower)
         
-        # UPI app parsers
-        elif 'gpay' in source_lower or 'google' in source_lower:
-            return TransactionParser.parse_gpay_notification(raw_event.raw_text)
-        elif 'phonepe' in source_lower:
-            return TransactionParser.parse_phonepe_notification(raw_event.raw_text)
-        elif 'paytm' in source_lower:
-            return TransactionParser.parse_paytm_notification(raw_event.raw_text)
+        # Learn the sender from successful fallback parses
+        if not from_index and result and 'amount' in result and 'direction' in result:
+            router.observe(raw_event.source_sender, parser_name)
         
-        # Fallback to generic parser
-        else:
-            return TransactionParser.parse_generic_bank_sms(raw_event.raw_text)
-
+        return result
+    
+    @staticmethod
+    def parse_many(records: Sequence[Tuple[Optional[str], str]]) -> List[ParseOutcome]:
+        """
+        Parse (sender, raw_text) records, e.g. EventTexts, without ORM objects.
+        
+        Every record is pre-filtered and routed first; then each parser's
+        group goes through the template cache as one batch. Returns a
+        ParseOutcome per record, in order. Obvious non-transactions are not
+        parsed, and errors (including messages over the length limit or the
+        parse time budget) only fail their own record. Senders learned from
+        fallback parses in a batch are routed by the mapping from the next
+        batch on.
+        """
+        prefilter = get_sms_prefilter()
+        router = get_sender_router()
+        outcomes: List[Optional[ParseOutcome]] = [None] * len(records)
+        
+        # parser name -> [(record index, sender, from_index)] and [(raw_text, raw_text_lower)]
+        groups: Dict[str, Tuple[List[Tuple[int, Optional[str], bool]], List[Tuple[str, str]]]] = {}
+        for index, (sender, raw_text) in enumerate(records):
+            try:
+                check_parse_length(raw_text)
+            except ParseBudgetExceeded as e:
+                outcomes[index] = ParseOutcome(None, str(e), LENGTH_LIMIT_NAME)
+                continue
+            
+            try:
+                skip_reason = prefilter.check(raw_text)
+                if skip_reason is not None:
+                    outcomes[index] = ParseOutcome(None, None, PREFILTER_NAME, skip_reason)
+                    continue
+                
+                raw_text_lower = raw_text.lower()
+                parser_name, from_index = router.route(sender, raw_text_lower)
+            except Exception as e:
+                outcomes[index] = ParseOutcome(None, str(e))
+                continue
+            
+            members, texts = groups.setdefault(parser_name, ([], []))
+            members.append((index, sender, from_index))
+            texts.append((raw_text, raw_text_lower))
+        
+        template_cache = get_template_cache()
+        for parser_name, (members, texts) in groups.items():
+            results = template_cache.parse_many(PARSERS[parser_name], texts)
+            for (index, sender, from_index), (result, error) in zip(members, results):
+                if error is not None:
+                    outcomes[index] = ParseOutcome(None, str(error), parser_name)
+                    continue
+                
+                # Learn the sender from successful fallback parses
+                if not from_index and result and 'amount' in result and 'direction' in result:
+                    router.observe(sender, parser_name)
+                outcomes[index] = ParseOutcome(result, None, parser_name)
+        
+        return outcomes
 
 def process_raw_event(db: Session, raw_event: models.RawEvent) -> Optional[models.Transaction]:
-    """Parse raw event and create/update transaction."""
-    
-    # Parse the event
-    parsed_data = TransactionParser.parse_event(raw_event)
-    
-    if not parsed_data or 'amount' not in parsed_data or 'direction' not in parsed_data:
-        # Mark as failed
-        raw_event.parsed_status = "FAILED"
-        raw_event.error_message = "Could not extract required fields (amount, direction)"
-        db.commit()
-        return None
-    
-    # Find or create account
-    account = db.query(models.Account).filter(
-        models.Account.user_id == raw_event.user_id,
-        models.Account.bank_name == parsed_data.get('bank_name', 'Unknown'),
-        models.Account.account_mask == parsed_data.get('account_mask', 'Unknown')
-    ).first()
-    
-    if not account:
-        account = models.Account(
-            user_id=raw_event.user_id,
-            bank_name=parsed_data.get('bank_name', 'Unknown'),
-            account_mask=parsed_data.get('account_mask', 'Unknown'),
-            display_name=f"{parsed_data.get('bank_name', 'Unknown')} {parsed_data.get('account_mask', 'Unknown')}",
-            type='SAVINGS',
-            is_active=True
-        )
-        db.add(account)
-        db.flush()
-    
-    # Generate dedupe key
-    merchant_key = normalize_merchant_key(parsed_data.get('raw_merchant_identifier', ''))
-    dedupe_key = generate_dedupe_key(
-        raw_event.user_id,
-        account.id,
-        parsed_data['direction'],
-        parsed_data['amount'],
-        raw_event.received_at,
-        merchant_key
-    )
-    
-    # Check for duplicate
-    existing = db.query(models.Transaction).filter(
-        models.Transaction.dedupe_key == dedupe_key
-    ).first()
-    
-    if existing:
-        # Link this event to existing transaction
-        raw_event.related_transaction_id = existing.id
-        raw_event.parsed_status = "PARSED"
-        db.commit()
-        return existing
-    
-    # Create new transaction
-    transaction = models.Transaction(
-        user_id=raw_event.user_id,
-        account_id=account.id,
-        direction=parsed_data['direction'],
-        amount=parsed_data['amount'],
-        currency='INR',
-        channel=parsed_data.get('channel', 'OTHER'),
-        raw_merchant_identifier=parsed_data.get('raw_merchant_identifier'),
-        merchant_key=merchant_key,
-        transaction_time=raw_event.received_at,
-        dedupe_key=dedupe_key
-    )
-    
-    db.add(transaction)
-    raw_event.related_transaction_id = transaction.id
-    raw_event.parsed_status = "PARSED"
+    """
+    Parse raw event and create/update transaction.
+    
+    Runs the ingest pipeline for one event, commits once and syncs a newly
+    created transaction to Google Sheets. Callers that own the unit of work
+    use process_raw_events instead.
+    """
+    transactions, new_transactions = process_raw_events(db, [raw_event])
     db.commit()
-    db.refresh(transaction)
     
-    # Apply rules engine for auto-categorization
-    try:
-        import rules_engine
-        rules_engine.RulesEngine.apply_rules(db, transaction)
-    except Exception as e:
-        # Don't fail transaction creation if rules fail
-        print(f"Rules engine error: {e}")
+    sync_transactions_to_sheets(db, new_transactions)
+    
+    return transactions[0]
+
+
+def sync_transactions_to_sheets(db: Session, transactions: List[models.Transaction]):
+    """Sync committed transactions to Google Sheets (best effort)."""
+    if not transactions:
+        return
     
-    # Sync to Google Sheets
     try:
         import sheets_sync
         sheets_sync_instance = sheets_sync.get_sheets_sync()
-        sheets_sync_instance.sync_transaction(db, transaction)
+        for transaction in transactions:
+            sheets_sync_instance.sync_transaction(db, transaction)
     except Exception as e:
         # Don't fail transaction creation if sheets sync fails
         print(f"Google Sheets sync error: {e}")
+
+
+class EventText(NamedTuple):
+    """The parts of a raw event the parsers read, safe to send to another process."""
+    source_sender: str
+    raw_text: str
+
+
+def parse_event_safely(raw_event) -> ParseOutcome:
+    """Parse one raw event (or EventText), catching parser errors; see TransactionParser.parse_many."""
+    return TransactionParser.parse_many([(raw_event.source_sender, raw_event.raw_text)])[0]
+
+
+def parse_event_texts(events: List[EventText]) -> List[ParseOutcome]:
+    """Parse event texts without touching the database (runs in reparse worker processes)."""
+    return TransactionParser.parse_many(events)
+
+
+def process_raw_events(db: Session, raw_events: List[models.RawEvent],
+                       outcomes: Optional[List[ParseOutcome]] = None) -> Tuple[List[Optional[models.Transaction]], List[models.Transaction]]:
+    """
+    Parse raw events and create/update transactions inside the caller's unit of work.
+    
+    Accounts and transactions are written with INSERT ... ON CONFLICT DO
+    NOTHING, so duplicates (including concurrent ingests of the same
+    transaction) link to the existing row instead of failing. Nothing is
+    committed - the caller commits once (and syncs new transactions to Google
+    Sheets after the commit). Returns the transaction for each raw event, in
+    order (None if the event could not be parsed), and the list of newly
+    created transactions. outcomes, if given, are the already computed parse
+    outcomes of raw_events (see parse_event_texts).
+    """
+    results: List[Optional[models.Transaction]] = [None] * len(raw_events)
+    
+    sender_router = get_sender_router()
+    sender_router.ensure_loaded(db)
+    
+    if outcomes is None:
+        outcomes = TransactionParser.parse_many(
+            [(raw_event.source_sender, raw_event.raw_text) for raw_event in raw_events]
+        )
+    
+    parser_versions = current_parser_versions()
+    
+    parsed_events = []
+    for index, (raw_event, (parsed_data, error, parser_name, skip_reason)) in enumerate(zip(raw_events, outcomes)):
+        # Recorded whatever the outcome, so reparse can tell which events a parser change affects
+        raw_event.parser_name = parser_name
+        raw_event.parser_version = parser_versions.get(parser_name)
+        
+        if skip_reason is not None:
+            raw_event.parsed_status = "SKIPPED"
+            raw_event.error_message = f"Not a transaction ({skip_reason})"
+            continue
+        
+        if error is not None:
+            raw_event.parsed_status = "FAILED"
+            raw_event.error_message = error
+            continue
+        
+        if not parsed_data or 'amount' not in parsed_data or 'direction' not in parsed_data:
+            raw_event.parsed_status = "FAILED"
+            raw_event.error_message = "Could not extract required fields (amount, direction)"
+            continue
+        
+        parsed_data.setdefault('bank_name', 'Unknown')
+        parsed_data.setdefault('account_mask', 'Unknown')
+        parsed_events.append((index, raw_event, parsed_data))
+    
+    # Persist senders learned from this batch with the rest of the unit of work
+    sender_router.save_learned(db)
+    
+    if not parsed_events:
+        return results, []
+    
+    # Resolve accounts: one lookup for the batch, then INSERT ... ON CONFLICT
+    # DO NOTHING for missing ones (a concurrent ingest may create them first)
+    account_keys = {
+        (raw_event.user_id, parsed_data['bank_name'], parsed_data['account_mask'])
+        for _, raw_event, parsed_data in parsed_events
+    }
+    account_ids = {}
+    for user_id in {key[0] for key in account_keys}:
+        for account in db.query(models.Account).filter(models.Account.user_id == user_id).all():
+            account_ids.setdefault((account.user_id, account.bank_name, account.account_mask), account.id)
+    
+    missing_accounts = [key for key in account_keys if key not in account_ids]
+    if missing_accounts:
+        inserted = insert_ignore_returning(
+            db,
+            models.Account,
+            [
+                {
+                    'user_id': user_id,
+                    'bank_name': bank_name,
+                    'account_mask': account_mask,
+                    'display_name': f"{bank_name} {account_mask}",
+                    'type': 'SAVINGS',
+                    'is_active': True
+                }
+                for user_id, bank_name, account_mask in missing_accounts
+            ],
+            conflict_columns=('user_id', 'bank_name', 'account_mask'),
+            returning=('id', 'user_id', 'bank_name', 'account_mask')
+        )
+        for row in inserted:
+            account_ids[(row.user_id, row.bank_name, row.account_mask)] = row.id
+        
+        # Accounts created concurrently by another ingest
+        for user_id, bank_name, account_mask in missing_accounts:
+            if (user_id, bank_name, account_mask) not in account_ids:
+                account_ids[(user_id, bank_name, account_mask)] = db.query(models.Account.id).filter(
+                    models.Account.user_id == user_id,
+                    models.Account.bank_name == bank_name,
+                    models.Account.account_mask == account_mask
+                ).scalar()
+    
+    # Build one transaction per dedupe hash; duplicates within the batch link to the first one
+    keyed_events = []
+    candidates = {}
+    candidate_sources = {}
+    for index, raw_event, parsed_data in parsed_events:
+        account_id = account_ids[(raw_event.user_id, parsed_data['bank_name'], parsed_data['account_mask'])]
+        merchant_key = normalize_merchant_key(parsed_data.get('raw_merchant_identifier', ''))
+        dedupe_key = generate_dedupe_key(
+            raw_event.user_id,
+            account_id,
+            parsed_data['direction'],
+            parsed_data['amount'],
+            raw_event.received_at,
+            merchant_key
+        )
+        dedupe_hash = generate_dedupe_hash(dedupe_key)
+        keyed_events.append((index, raw_event, dedupe_hash))
+        
+        if dedupe_hash not in candidates:
+            candidates[dedupe_hash] = models.Transaction(
+                id=str(uuid.uuid4()),
+                user_id=raw_event.user_id,
+                account_id=account_id,
+                direction=parsed_data['direction'],
+                amount=parsed_data['amount'],
+                currency='INR',
+                channel=parsed_data.get('channel', 'OTHER'),
+                raw_merchant_identifier=parsed_data.get('raw_merchant_identifier'),
+                merchant_key=merchant_key,
+                transaction_time=raw_event.received_at,
+                dedupe_key=dedupe_key,
+                dedupe_hash=dedupe_hash,
+                amount_paise=to_paise(parsed_data['amount']),
+                is_internal_transfer=False,
+                manual_override_flags=0
+            )
+            candidate_sources[dedupe_hash] = set()
+        candidate_sources[dedupe_hash].add(raw_event.source_type)
+    
+    # Known duplicates are resolved before rules run: recent hashes map straight
+    # to their transaction, Bloom-negative hashes are definitely new, and only
+    # the rest need a lookup on the hash index
+    dedupe_filter = get_dedupe_filter()
+    dedupe_filter.ensure_warm(db)
+    
+    transactions_by_hash = {}
+    maybe_existing = []
+    for dedupe_hash in candidates:
+        transaction_id = dedupe_filter.recent_transaction_id(dedupe_hash)
+        if transaction_id is not None:
+            transaction = db.get(models.Transaction, transaction_id)
+            if transaction is not None:
+                transactions_by_hash[dedupe_hash] = transaction
+                continue
+            dedupe_filter.forget(dedupe_hash)
+        
+        if dedupe_filter.might_contain(dedupe_hash):
+            maybe_existing.append(dedupe_hash)
+    
+    transactions_by_hash.update(_find_transactions_by_hash(db, maybe_existing))
+    
+    # Second stage: the same payment reported by a bank SMS and a wallet
+    # notification lands on different accounts, so link near matches instead
+    unknown_account_ids = {
+        account_id for (_, _, account_mask), account_id in account_ids.items() if account_mask == 'Unknown'
+    }
+    transactions_by_hash.update(_match_cross_source_duplicates(
+        db,
+        {dedupe_hash: transaction for dedupe_hash, transaction in candidates.items()
+         if dedupe_hash not in transactions_by_hash},
+        candidate_sources,
+        unknown_account_ids,
+        {raw_event.id for _, raw_event, _ in parsed_events if raw_event.id is not None}
+    ))
+    new_candidates = []
+    for dedupe_hash, transaction in candidates.items():
+        if dedupe_hash not in transactions_by_hash:
+            transactions_by_hash[dedupe_hash] = transaction
+            new_candidates.append(transaction)
     
-    return transaction
+    # Apply rules engine for auto-categorization before the insert, so rule
+    # effects go out with each transaction's INSERT
+    import rules_engine
+    for transaction in new_candidates:
+        try:
+            rules_engine.RulesEngine.apply_rules(db, transaction)
+        except Exception as e:
+            # Don't fail transaction creation if rules fail
+            print(f"Rules engine error: {e}")
+    
+    # INSERT ... ON CONFLICT (dedupe_hash) DO NOTHING: the unique index is the
+    # source of truth, so hashes stored concurrently (or by another process)
+    # are not returned
+    # (columns left unset on every row keep their server defaults)
+    transaction_columns = [
+        column.key for column in models.Transaction.__table__.columns
+        if any(getattr(transaction, column.key) is not None for transaction in new_candidates)
+    ]
+    inserted_hashes = {
+        row.dedupe_hash for row in insert_ignore_returning(
+            db,
+            models.Transaction,
+            [
+                {name: getattr(transaction, name) for name in transaction_columns}
+                for transaction in new_candidates
+            ],
+            conflict_columns=('dedupe_hash',),
+            returning=('dedupe_hash',)
+        )
+    }
+    
+    new_transactions = []
+    lost_candidates = []
+    for transaction in new_candidates:
+        if transaction.dedupe_hash in inserted_hashes:
+            # Already written - attach to the session without another SELECT
+            make_transient_to_detached(transaction)
+            db.add(transaction)
+            new_transactions.append(transaction)
+        else:
+            lost_candidates.append(transaction)
+    
+    # Candidates that lost the insert to a concurrent ingest resolve to the stored row
+    if lost_candidates:
+        stored = _find_transactions_by_hash(db, [transaction.dedupe_hash for transaction in lost_candidates])
+        replacements = {transaction.id: stored[transaction.dedupe_hash] for transaction in lost_candidates}
+        for dedupe_hash, transaction in transactions_by_hash.items():
+            transactions_by_hash[dedupe_hash] = replacements.get(transaction.id, transaction)
+    
+    for dedupe_hash, transaction in transactions_by_hash.items():
+        dedupe_filter.add(dedupe_hash, transaction.id)
+        if transaction.dedupe_hash != dedupe_hash:
+            dedupe_filter.add(transaction.dedupe_hash, transaction.id)
+    
+    for index, raw_event, dedupe_hash in keyed_events:
+        transaction = transactions_by_hash[dedupe_hash]
+        raw_event.related_transaction_id = transaction.id
+        raw_event.parsed_status = "PARSED"
+        raw_event.error_message = None
+        results[index] = transaction
+    
+    return results, new_transactions
+
+
+def _find_transactions_by_hash(db: Session, dedupe_hashes: List[int]) -> Dict[int, models.Transaction]:
+    """Look up existing transactions by dedupe hash, in chunks."""
+    found = {}
+    for start in range(0, len(dedupe_hashes), IN_CLAUSE_CHUNK_SIZE):
+        chunk = dedupe_hashes[start:start + IN_CLAUSE_CHUNK_SIZE]
+        for existing in db.query(models.Transaction).filter(models.Transaction.dedupe_hash.in_(chunk)).all():
+            found[existing.dedupe_hash] = existing
+    return found
+
+
+def _match_cross_source_duplicates(db: Session, candidates: Dict[int, models.Transaction],
+                                   candidate_sources: Dict[int, set], unknown_account_ids: set,
+                                   batch_raw_event_ids: set) -> Dict[int, models.Transaction]:
+    """
+    Find transactions that are the same payment as a candidate seen from
+    another source, e.g. a bank SMS and a GPay notification for one UPI
+    payment. A match has the same user, direction and amount within the
+    cross-source window, exactly one side on an "Unknown" account, no
+    conflicting payee (see _payees_conflict), and no raw event of the
+    candidate's source type linked yet. Raw events of the
+    batch itself (batch_raw_event_ids) do not count as linked, so a reparse
+    finds the transaction a notification was merged into again. Matches are
+    merged (see _merge_cross_source_duplicate) and returned by candidate
+    hash; candidates can also match earlier candidates in the same batch.
+    """
+    window = get_cross_source_window()
+    if not candidates or not window:
+        return {}
+    
+    # Existing rows near the candidates: one range scan per user on
+    # (user_id, amount_paise, transaction_time)
+    pool = []
+    by_user = {}
+    for transaction in candidates.values():
+        by_user.setdefault(transaction.user_id, []).append(transaction)
+    
+    for user_id, group in by_user.items():
+        times = [transaction.transaction_time for transaction in group]
+        rows = db.query(models.Transaction, models.Account.account_mask).join(
+            models.Account, models.Account.id == models.Transaction.account_id
+        ).filter(
+            models.Transaction.user_id == user_id,
+            models.Transaction.amount_paise.in_({transaction.amount_paise for transaction in group}),
+            models.Transaction.transaction_time.between(min(times) - window, max(times) + window)
+        ).all()
+        
+        for existing, account_mask in rows:
+            if account_mask == 'Unknown':
+                unknown_account_ids.add(existing.account_id)
+            pool.append(existing)
+    
+    # Source types already linked to each existing transaction
+    sources = {}
+    if pool:
+        for raw_event_id, transaction_id, source_type in db.query(
+            models.RawEvent.id, models.RawEvent.related_transaction_id, models.RawEvent.source_type
+        ).filter(models.RawEvent.related_transaction_id.in_([existing.id for existing in pool])):
+            if raw_event_id not in batch_raw_event_ids:
+                sources.setdefault(transaction_id, set()).add(source_type)
+    
+    matches = {}
+    for dedupe_hash, candidate in candidates.items():
+        candidate_unknown = candidate.account_id in unknown_account_ids
+        best = None
+        
+        for other in pool:
+            if (other.user_id != candidate.user_id
+                    or other.direction != candidate.direction
+                    or other.amount_paise != candidate.amount_paise
+                    or (other.account_id in unknown_account_ids) == candidate_unknown
+                    or _payees_conflict(other, candidate)
+                    or sources.get(other.id, set()) & candidate_sources[dedupe_hash]):
+                continue
+            
+            gap = abs(other.transaction_time - candidate.transaction_time)
+            if gap <= window and (best is None or gap < abs(best.transaction_time - candidate.transaction_time)):
+                best = other
+        
+        if best is None:
+            pool.append(candidate)
+            sources[candidate.id] = set(candidate_sources[dedupe_hash])
+            continue
+        
+        _merge_cross_source_duplicate(db, best, candidate, best.account_id in unknown_account_ids)
+        sources.setdefault(best.id, set()).update(candidate_sources[dedupe_hash])
+        matches[dedupe_hash] = best
+    
+    return matches
+
+
+def _payee_handle(transaction: models.Transaction) -> str:
+    """Payee of a transaction reduced for comparison: the UPI handle before '@', letters and digits only."""
+    merchant = transaction.merchant_key or normalize_merchant_key(transaction.raw_merchant_identifier or '')
+    return re.sub(r'[^a-z0-9]', '', merchant.split('@')[0])
+
+
+def _payees_conflict(first: models.Transaction, second: models.Transaction) -> bool:
+    """
+    Whether two transactions name different payees. Sources spell payees
+    differently (a UPI id, a display name), so they only conflict when both
+    name one and neither handle contains the other.
+    """
+    first_handle = _payee_handle(first)
+    second_handle = _payee_handle(second)
+    if not first_handle or not second_handle:
+        return False
+    return first_handle not in second_handle and second_handle not in first_handle
+
+
+def _merge_cross_source_duplicate(db: Session, target: models.Transaction, duplicate: models.Transaction,
+                                  target_unknown: bool):
+    """
+    Fold a cross-source duplicate into the transaction it matched. A target
+    on an "Unknown" account moves to the duplicate's real account (and takes
+    its dedupe key); merchant details and channel fill in where missing.
+    """
+    changed = False
+    
+    if target_unknown:
+        target.account_id = duplicate.account_id
+        target.dedupe_key = duplicate.dedupe_key
+        target.dedupe_hash = duplicate.dedupe_hash
+        changed = True
+    
+    if not target.raw_merchant_identifier and duplicate.raw_merchant_identifier:
+        target.raw_merchant_identifier = duplicate.raw_merchant_identifier
+        target.merchant_key = duplicate.merchant_key
+        changed = True
+    
+    if target.channel in (None, 'OTHER') and duplicate.channel not in (None, 'OTHER'):
+        target.channel = duplicate.channel
+        changed = True
+    
+    # Stored transactions get rules re-applied for the new details (new ones
+    # run rules before their INSERT anyway)
+    if changed and target in db:
+        import rules_engine
+        try:
+            rules_engine.RulesEngine.apply_rules(db, target)
+        except Exception as e:
+            print(f"Rules engine error: {e}")
+
+
+def get_cross_source_window() -> timedelta:
+    """
+    Window for cross-source dedupe, from CROSS_SOURCE_DEDUPE_WINDOW_MINUTES
+    (default 5, 0 disables it).
+    """
+    global _cross_source_window
+    if _cross_source_window is None:
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        _cross_source_window = timedelta(minutes=float(os.getenv('CROSS_SOURCE_DEDUPE_WINDOW_MINUTES', '5')))
+    return _cross_source_window
+
+
+def to_paise(amount: float) -> int:
+    """Amount in integer paise, for exact indexed matching."""
+    return int(round(amount * 100))
 
 
 def normalize_merchant_key(raw_merchant: str) -> str:
@@ -605,3 +702,22 @@ def generate_dedupe_key(user_id: int, account_id: int, direction: str,
     # Create key from components
     key = f"{user_id}_{account_id}_{direction}_{amount:.2f}_{rounded_time.isoformat()}_{merchant_key}"
     return key
+
+
+def generate_dedupe_hash(dedupe_key: str) -> int:
+    """Compact signed 64-bit hash of a dedupe key, stored in the unique dedupe_hash column."""
+    digest = hashlib.sha256(dedupe_key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def generate_content_hash(device_id: int, source_sender: str, raw_text: str, timestamp: datetime) -> str:
+    """
+    Generate a fingerprint of a raw event for idempotent ingestion.
+    Built from device, sender, normalized text and timestamp bucket.
+    """
+    normalized_sender = (source_sender or "").strip().lower()
+    normalized_text = " ".join((raw_text or "").lower().split())
+    time_bucket = int(timestamp.timestamp()) // CONTENT_HASH_BUCKET_SECONDS if timestamp else 0
+    
+    fingerprint = f"{device_id}|{normalized_sender}|{normalized_text}|{time_bucket}"
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
@@ -0,0 +1,517 @@
+"""
+Table-driven extraction engine for bank SMS and UPI app notifications.
+
+Each bank or app is described by a declarative ParserSpec (amount patterns,
+direction keywords, account mask, counterparty and channel rules). Specs are
+compiled once at import into precompiled patterns, with all amount patterns
+of a spec merged into a single alternation, and one shared engine extracts
+every field. Direction and channel keywords are tested on a lowered copy of
+the text that is made once per message; captures that keep their case
+(account masks, UPI ids, merchant names) run on the original text.
+"""
+import os
+import re
+import time
+import hashlib
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple, Iterable, Callable, Match
+
+# Amount with optional thousands separators, e.g. "1,500.00"
+AMOUNT = r'(\d+(?:,\d+)*\.?\d*)'
+
+# Bump when the extraction code below changes how a spec is applied, so
+# every parser version changes with it
+ENGINE_VERSION = 1
+
+# Longest message the parsers accept. Every pattern runs in bounded time on
+# messages this long (test_regex_budget.py fuzzes them); longer texts are
+# stored (up to schemas.MAX_RAW_TEXT_LENGTH) but fail without being parsed.
+MAX_PARSE_LENGTH = 2000
+
+# Per-message CPU time budget, loaded lazily by get_parse_time_budget()
+_parse_time_budget = None
+
+# field -> (start, end, convert): where a field was read from the text and
+# how the captured text becomes its value
+FieldSpans = Dict[str, Tuple[int, int, Callable[[str], Any]]]
+
+
+def parse_amount(text: str) -> float:
+    """Amount text (with optional thousands separators) as a float."""
+    return float(text.replace(',', ''))
+
+
+class ParseBudgetExceeded(Exception):
+    """A message is too long to parse, or parsing it ran over the time budget."""
+
+
+def get_parse_time_budget() -> float:
+    """
+    CPU seconds one message may spend in a parser, from PARSE_TIME_BUDGET_MS
+    (default 50, 0 disables the check).
+    """
+    global _parse_time_budget
+    if _parse_time_budget is None:
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        _parse_time_budget = float(os.getenv('PARSE_TIME_BUDGET_MS', '50')) / 1000
+    return _parse_time_budget
+
+
+def check_parse_length(raw_text: str):
+    """Raise ParseBudgetExceeded for messages longer than MAX_PARSE_LENGTH."""
+    if len(raw_text) > MAX_PARSE_LENGTH:
+        raise ParseBudgetExceeded(f"Message too long to parse ({len(raw_text)} > {MAX_PARSE_LENGTH} characters)")
+
+
+class ParseDeadline:
+    """
+    Time budget for one parse. Python regexes cannot be interrupted from
+    another thread, so the budget is checked between patterns; bounded input
+    length keeps any single pattern short. Uses thread CPU time, so waiting
+    for the GIL under load does not count.
+    """
+    __slots__ = ('deadline',)
+    
+    def __init__(self):
+        budget = get_parse_time_budget()
+        self.deadline = time.thread_time() + budget if budget else None
+    
+    def check(self, stage: str):
+        """Raise ParseBudgetExceeded if the budget is used up."""
+        if self.deadline is not None and time.thread_time() > self.deadline:
+            raise ParseBudgetExceeded(f"Parse time budget exceeded (after {stage})")
+
+
+class CounterpartyRule(NamedTuple):
+    """One way of finding the counterparty; the first rule that matches wins."""
+    pattern: str
+    ignore_case: bool = False
+    # A match means the payment went over UPI (a VPA was found)
+    sets_upi: bool = False
+    # Strip surrounding whitespace (free-text merchant names)
+    strip: bool = False
+
+
+class ParserSpec(NamedTuple):
+    """
+    Declarative description of one bank or app message format.
+    
+    Patterns must not tell digits apart (no digit literals, digit ranges or
+    backreferences): the parse template cache relies on messages that differ
+    only in their digits parsing the same way.
+    """
+    name: str
+    bank_name: Optional[str] = None
+    # Tried in order: the first pattern that matches anywhere wins (always case-insensitive)
+    amount_patterns: Tuple[str, ...] = ()
+    # Checked as substrings of the lowered text; debit is checked first
+    debit_keywords: Tuple[str, ...] = ()
+    credit_keywords: Tuple[str, ...] = ()
+    # The first non-empty group is the mask, prefixed with account_prefix
+    account_pattern: Optional[str] = None
+    account_ignore_case: bool = False
+    account_prefix: str = ''
+    counterparty: Tuple[CounterpartyRule, ...] = ()
+    # (keywords, channel) in order: the first entry with a keyword in the text wins
+    channel_keywords: Tuple[Tuple[Tuple[str, ...], str], ...] = ()
+    # Direction/channel keywords that only count as whole words, not inside a longer word
+    whole_word_keywords: Tuple[str, ...] = ()
+    # Fixed channel for app notifications, overrides everything else
+    channel: Optional[str] = None
+    # Fully structured formats: one pattern with (field, group) pairs, and
+    # the direction group value that means CREDIT
+    record_pattern: Optional[str] = None
+    record_groups: Tuple[Tuple[str, int], ...] = ()
+    record_credit_value: Optional[str] = None
+
+
+class PriorityPattern:
+    """
+    Several patterns searched in priority order.
+    
+    Gives the same result as trying the patterns one at a time with
+    re.search: the lowest-indexed pattern that matches anywhere wins, at its
+    leftmost match. The first pattern, which matches most messages, is
+    searched on its own; the rest are merged into one alternation of
+    lookaheads, so a match of one pattern never hides an overlapping match
+    of a higher-priority one.
+    """
+    
+    def __init__(self, patterns: List[str], flags: int = 0):
+        self.first = re.compile(patterns[0], flags)
+        self.rest = re.compile(
+            '|'.join(f'(?=(?P<p{index}>{pattern}))' for index, pattern in enumerate(patterns) if index),
+            flags
+        ) if len(patterns) > 1 else None
+        # wrapper group number -> (pattern index, group number of its first capture)
+        self._alternatives = {
+            self.rest.groupindex[f'p{index}']: (index, self.rest.groupindex[f'p{index}'] + 1)
+            for index in range(1, len(patterns))
+        } if self.rest is not None else {}
+    
+    def search(self, text: str) -> Optional[Tuple[int, Match, int]]:
+        """Return (pattern index, match, group number of its first capture) of the winning match, or None."""
+        match = self.first.search(text)
+        if match:
+            return 0, match, 1
+        if self.rest is None:
+            return None
+        
+        best = None
+        for match in self.rest.finditer(text):
+            index, group = self._alternatives[match.lastindex]
+            if best is None or index < best[0]:
+                best = (index, match, group)
+                if index == 1:
+                    break
+        return best
+
+
+class KeywordHits:
+    """
+    Keyword occurrences in one lowered message.
+    
+    Plain keyword checks are substring tests; positions (needed for
+    whole-word matches) are found on first use and memoized.
+    """
+    
+    def __init__(self, text_lower: str):
+        self.text_lower = text_lower
+        self._positions: Dict[str, List[int]] = {}
+    
+    def positions(self, word: str) -> List[int]:
+        """Start offsets of every occurrence of word."""
+        positions = self._positions.get(word)
+        if positions is None:
+            positions = []
+            start = self.text_lower.find(word)
+            while start != -1:
+                positions.append(start)
+                start = self.text_lower.find(word, start + 1)
+            self._positions[word] = positions
+        return positions
+    
+    def found(self, word: str, whole_word: bool = False) -> bool:
+        """True if word occurs in the text (only as a whole word, if whole_word)."""
+        if not whole_word:
+            return word in self.text_lower
+        
+        text = self.text_lower
+        for start in self.positions(word):
+            end = start + len(word)
+            if (start == 0 or not text[start - 1].isalpha()) and (end == len(text) or not text[end].isalpha()):
+                return True
+        return False
+
+
+class KeywordScanner:
+    """
+    Multi-keyword scan of a lowered text (used for rule matching).
+    
+    find_all runs the whole vocabulary as a single alternation, longest
+    keyword first. Each search resumes one character after the previous hit,
+    so overlapping keywords are found too, and keywords that are a prefix of
+    a longer hit are added from a precomputed table - the hits are the same
+    an Aho-Corasick scan would give. Parsers only test a handful of keywords
+    per message, which plain substring tests (KeywordHits) answer faster
+    than a full scan.
+    """
+    
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keywords), key=lambda word: (-len(word), word))
+        self._search = re.compile('|'.join(re.escape(word) for word in self.keywords)).search
+        # keyword -> shorter keywords it starts with
+        self._prefixes = {
+            word: [other for other in self.keywords if other != word and word.startswith(other)]
+            for word in self.keywords
+        }
+    
+    def find_all(self, text_lower: str) -> List[Tuple[int, str]]:
+        """Every (position, keyword) occurrence in a lowered message, in text order."""
+        hits = []
+        search = self._search
+        match = search(text_lower)
+        while match is not None:
+            start = match.start()
+            hits.append((start, match.group()))
+            hits.extend((start, prefix) for prefix in self._prefixes[match.group()])
+            match = search(text_lower, start + 1)
+        return hits
+
+
+class CompiledParser:
+    """A ParserSpec compiled into ready-to-run patterns."""
+    
+    def __init__(self, spec: ParserSpec):
+        self.spec = spec
+        self.name = spec.name
+        # Changes whenever the spec (or the engine) changes; stored on raw
+        # events so reparse can skip events their parser would parse the same way
+        self.version = hashlib.sha1(repr((ENGINE_VERSION, spec)).encode('utf-8')).hexdigest()[:12]
+        self.amount = PriorityPattern(list(spec.amount_patterns), re.IGNORECASE) if spec.amount_patterns else None
+        self.account = re.compile(
+            spec.account_pattern, re.IGNORECASE if spec.account_ignore_case else 0
+        ) if spec.account_pattern else None
+        self.counterparty = [
+            (re.compile(rule.pattern, re.IGNORECASE if rule.ignore_case else 0), rule.sets_upi, rule.strip)
+            for rule in spec.counterparty
+        ]
+        self.record = re.compile(spec.record_pattern) if spec.record_pattern else None
+        whole_words = set(spec.whole_word_keywords)
+        self.direction_keywords = [(word, word in whole_words, 'DEBIT') for word in spec.debit_keywords] + \
+            [(word, word in whole_words, 'CREDIT') for word in spec.credit_keywords]
+        # Flattened in priority order: the first keyword found decides the channel
+        self.channel_keywords = [
+            (word, word in whole_words, channel) for words, channel in spec.channel_keywords for word in words
+        ]
+    
+    def parse(self, raw_text: str, text_lower: Optional[str] = None,
+              spans: Optional[FieldSpans] = None) -> Optional[Dict[str, Any]]:
+        """
+        Extract transaction fields from a message (text_lower: raw_text.lower(), if already made).
+        If spans is given it receives, for every field read from the text,
+        where it was captured and how it was converted.
+        """
+        check_parse_length(raw_text)
+        if self.record is not None:
+            return self._parse_record(raw_text, spans)
+        
+        spec = self.spec
+        deadline = ParseDeadline()
+        if text_lower is None:
+            text_lower = raw_text.lower()
+        result = {}
+        
+        if self.amount is not None:
+            amount_match = self.amount.search(raw_text)
+            if amount_match:
+                _, match, group = amount_match
+                result['amount'] = parse_amount(match.group(group))
+                if spans is not None:
+                    spans['amount'] = (*match.span(group), parse_amount)
+        
+        hits = KeywordHits(text_lower)
+        for word, whole_word, direction in self.direction_keywords:
+            if hits.found(word, whole_word):
+                result['direction'] = direction
+                break
+        
+        if self.account is not None:
+            account_match = self.account.search(raw_text)
+            if account_match:
+                group = next(index for index, value in enumerate(account_match.groups(), 1) if value)
+                result['account_mask'] = self._account_mask(account_match.group(group))
+                if spans is not None:
+                    spans['account_mask'] = (*account_match.span(group), self._account_mask)
+            deadline.check('account')
+        
+        for regex, sets_upi, strip in self.counterparty:
+            counterparty_match = regex.search(raw_text)
+            deadline.check('counterparty')
+            if counterparty_match:
+                convert = str.strip if strip else str
+                result['raw_merchant_identifier'] = convert(counterparty_match.group(1))
+                if spans is not None:
+                    spans['raw_merchant_identifier'] = (*counterparty_match.span(1), convert)
+                if sets_upi:
+                    result['channel'] = 'UPI'
+                break
+        
+        for word, whole_word, channel in self.channel_keywords:
+            if hits.found(word, whole_word):
+                result['channel'] = channel
+                break
+        
+        if spec.channel:
+            result['channel'] = spec.channel
+        
+        if spec.bank_name:
+            result['bank_name'] = spec.bank_name
+        
+        return result if result else None
+    
+    def _account_mask(self, mask: str) -> str:
+        """Account mask as stored, from the captured digits."""
+        return f"{self.spec.account_prefix}{mask}"
+    
+    def _parse_record(self, raw_text: str, spans: Optional[FieldSpans]) -> Optional[Dict[str, Any]]:
+        """Extract fields from a fully structured message."""
+        spec = self.spec
+        match = self.record.search(raw_text)
+        if not match:
+            return None
+        
+        result = {}
+        for field, group in spec.record_groups:
+            value = match.group(group)
+            if field == 'direction':
+                result['direction'] = 'CREDIT' if value == spec.record_credit_value else 'DEBIT'
+                continue
+            
+            convert = parse_amount if field == 'amount' else str
+            result[field] = convert(value)
+            if spans is not None:
+                spans[field] = (*match.span(group), convert)
+        
+        if spec.channel:
+            result['channel'] = spec.channel
+        if spec.bank_name:
+            result['bank_name'] = spec.bank_name
+        
+        return result
+
+
+UPI_ID = r'([\w.]+@[\w]+)'
+# UPI_ID without a prefix: only tried where a run of id characters starts
+# (later starts in the run end the same way), which keeps search linear
+UPI_ID_ANYWHERE = r'(?<![\w.])' + UPI_ID
+
+PARSER_SPECS = [
+    ParserSpec(
+        name='kotak',
+        bank_name='Kotak',
+        amount_patterns=(r'Rs\.?\s*(\d+\.?\d*)',),
+        debit_keywords=('sent', 'debited', 'paid', 'withdrawn'),
+        credit_keywords=('received', 'credited', 'deposited'),
+        account_pattern=r'[Aa]/[Cc]\s*([A-Z0-9]+)|AC\s*([A-Z0-9]+)',
+        counterparty=(CounterpartyRule(r'to\s+' + UPI_ID, sets_upi=True),),
+        channel_keywords=((('upi',), 'UPI'),)
+    ),
+    ParserSpec(
+        name='uco',
+        bank_name='UCO',
+        record_pattern=r'UCO-UPI/(CR|DR)/(\d+)/([\w.@]+)/([^/]+)/([^/]+)/([\d.]+)',
+        record_groups=(('direction', 1), ('raw_merchant_identifier', 3), ('account_mask', 5), ('amount', 6)),
+        record_credit_value='CR',
+        channel='UPI'
+    ),
+    ParserSpec(
+        name='gpay',
+        amount_patterns=(r'₹\s*(\d+\.?\d*)',),
+        debit_keywords=('sent', 'paid'),
+        credit_keywords=('received',),
+        counterparty=(CounterpartyRule(r'(?:to|from)\s+' + UPI_ID, ignore_case=True),),
+        channel='UPI'
+    ),
+    ParserSpec(
+        name='hdfc',
+        bank_name='HDFC',
+        amount_patterns=(r'Rs\.?\s*' + AMOUNT, r'INR\s*' + AMOUNT, r'₹\s*' + AMOUNT),
+        debit_keywords=('debited', 'debit', 'withdrawn', 'sent', 'paid', 'txn of rs'),
+        credit_keywords=('credited', 'credit', 'received', 'deposited'),
+        account_pattern=r'A/c\s*(?:no\.?)?\s*[Xx]*(\d{4})|[Xx]{2}(\d{4})',
+        account_ignore_case=True,
+        account_prefix='XX',
+        counterparty=(
+            CounterpartyRule(r'(?:to|from|Info:)\s*(?:UPI/?)?\s*' + UPI_ID, ignore_case=True, sets_upi=True),
+        ),
+        channel_keywords=(
+            (('upi',), 'UPI'), (('atm',), 'ATM'), (('neft',), 'NEFT'), (('imps',), 'IMPS'), (('pos',), 'POS')
+        ),
+        # Not inside "deposited" or "possible"
+        whole_word_keywords=('pos',)
+    ),
+    ParserSpec(
+        name='icici',
+        bank_name='ICICI',
+        amount_patterns=(
+            r'Rs\.?\s*' + AMOUNT, r'INR\s*' + AMOUNT, r'for\s+' + AMOUNT, r'with\s+Rs\.?\s*' + AMOUNT
+        ),
+        debit_keywords=('debited', 'sent', 'used for', 'paid'),
+        credit_keywords=('credited', 'received', 'deposited'),
+        account_pattern=r'(?:Acct?|Acc|A/c|Card)\s*[Xx]*(\d{4})',
+        account_ignore_case=True,
+        account_prefix='XX',
+        counterparty=(
+            CounterpartyRule(r'(?:to|from)\s+' + UPI_ID, ignore_case=True, sets_upi=True),
+            # Merchant name for card transactions
+            CounterpartyRule(r'at\s+([A-Za-z0-9\s]+?)(?:\s+on|\.|$)', strip=True),
+        ),
+        channel_keywords=(
+            (('upi',), 'UPI'), (('imps',), 'IMPS'), (('neft',), 'NEFT'),
+            (('credit card',), 'CARD'), (('debit card',), 'CARD')
+        )
+    ),
+    ParserSpec(
+        name='sbi',
+        bank_name='SBI',
+        amount_patterns=(r'Rs\.?\s*' + AMOUNT, r'INR\s*' + AMOUNT),
+        debit_keywords=('debited', 'withdrawn', 'sent', 'paid', 'debit'),
+        credit_keywords=('credited', 'received', 'deposited', 'credit'),
+        # The lookbehind starts masks only at the first X of a run (linear search)
+        account_pattern=r'(?:a/c\s*(?:no\.?)?\s*)?(?<![Xx])[Xx]+(\d{4})',
+        account_ignore_case=True,
+        account_prefix='XX',
+        counterparty=(CounterpartyRule(r'(?:VPA|to|from)\s+' + UPI_ID, ignore_case=True, sets_upi=True),),
+        channel_keywords=((('upi', 'vpa'), 'UPI'), (('atm',), 'ATM'), (('neft',), 'NEFT'), (('imps',), 'IMPS'))
+    ),
+    ParserSpec(
+        name='axis',
+        bank_name='Axis',
+        amount_patterns=(r'Rs\.?\s*' + AMOUNT, r'INR\s*' + AMOUNT),
+        debit_keywords=('debited', 'spent', 'transferred', 'sent', 'paid'),
+        credit_keywords=('credited', 'received', 'deposited'),
+        account_pattern=r'(?:A/c\s*(?:no\.?)?\s*|Card\s*)[Xx]*(\d{4})',
+        account_ignore_case=True,
+        account_prefix='XX',
+        counterparty=(
+            # UPI id from the Info field or a direct mention
+            CounterpartyRule(r'(?:Info[:\-]?\s*UPI/|to\s+)' + UPI_ID, ignore_case=True, sets_upi=True),
+            # Merchant name for card transactions
+            CounterpartyRule(r'at\s+([A-Za-z0-9\s]+?)\s+on', strip=True),
+        ),
+        channel_keywords=(
+            (('upi',), 'UPI'), (('credit card',), 'CARD'), (('debit card',), 'CARD'),
+            (('neft',), 'NEFT'), (('imps',), 'IMPS'), (('atm',), 'ATM')
+        )
+    ),
+    ParserSpec(
+        name='phonepe',
+        amount_patterns=(r'₹\s*' + AMOUNT,),
+        debit_keywords=('paid', 'payment of', 'sent'),
+        credit_keywords=('received',),
+        account_pattern=r'[Xx]{2}(\d{4})',
+        account_prefix='XX',
+        counterparty=(
+            CounterpartyRule(r'(?:to|from)\s+' + UPI_ID, ignore_case=True),
+            CounterpartyRule(r'(?:to|from)\s+([A-Za-z0-9\s]+?)(?:\s+from|\s+to|\s+successful|$)',
+                             ignore_case=True, strip=True),
+        ),
+        channel='UPI'
+    ),
+    ParserSpec(
+        name='paytm',
+        amount_patterns=(r'Rs\.?\s*' + AMOUNT,),
+        debit_keywords=('paid', 'sent', 'you paid'),
+        credit_keywords=('received',),
+        counterparty=(
+            CounterpartyRule(r'(?:to|from)\s+' + UPI_ID, ignore_case=True),
+            CounterpartyRule(r'at\s+([A-Za-z0-9\s]+?)(?:\s+using|$)', ignore_case=True, strip=True),
+        ),
+        channel='UPI'
+    ),
+    ParserSpec(
+        name='generic',
+        bank_name='Unknown',
+        amount_patterns=(
+            r'Rs\.?\s*' + AMOUNT, r'INR\s*' + AMOUNT, r'₹\s*' + AMOUNT,
+            r'(?:debited|credited|paid|received)\s*(?:Rs\.?|INR)?\s*' + AMOUNT
+        ),
+        debit_keywords=('debited', 'debit', 'withdrawn', 'sent', 'paid', 'spent', 'transferred'),
+        credit_keywords=('credited', 'credit', 'received', 'deposited'),
+        account_pattern=r'(?:A/c|Acct?|Account|Card)\s*(?:no\.?)?\s*[Xx]*(\d{4})',
+        account_ignore_case=True,
+        account_prefix='XX',
+        counterparty=(CounterpartyRule(UPI_ID_ANYWHERE, sets_upi=True),),
+        channel_keywords=(
+            (('upi',), 'UPI'), (('atm',), 'ATM'), (('neft',), 'NEFT'), (('imps',), 'IMPS'), (('card',), 'CARD')
+        )
+    ),
+]
+
+# Compiled once at import, by spec name
+PARSERS: Dict[str, CompiledParser] = {spec.name: CompiledParser(spec) for spec in PARSER_SPECS}
@@ -0,0 +1,124 @@
+"""
+Admission control for the ingest endpoints.
+
+Each device gets a token bucket, so one misbehaving listener cannot flood
+ingest, and a global cap on in-flight ingest requests keeps enough worker
+threads (and the SQLite write lock) free for the dashboard. Rejected
+requests get a 429 with a Retry-After hint.
+"""
+import math
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+
+class TokenBucket:
+    """Refill rate tokens per second, up to burst."""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+    
+    def take(self, cost: float = 1.0) -> float:
+        """Take cost tokens. Returns 0 if allowed, else seconds until enough tokens are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class IngestRateLimiter:
+    """Per-device token buckets plus a global in-flight cap on ingest requests."""
+    
+    def __init__(self, rate_per_second: Optional[float] = None, burst: Optional[float] = None,
+                 max_in_flight: Optional[int] = None):
+        """
+        Initialize the limiter. Unset options are read from environment variables:
+        INGEST_RATE_PER_SECOND, INGEST_BURST and INGEST_MAX_IN_FLIGHT
+        (0 disables the respective limit).
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.rate_per_second = rate_per_second if rate_per_second is not None \
+            else float(os.getenv('INGEST_RATE_PER_SECOND', '5'))
+        self.burst = burst if burst is not None else float(os.getenv('INGEST_BURST', '30'))
+        self.max_in_flight = max_in_flight if max_in_flight is not None \
+            else int(os.getenv('INGEST_MAX_IN_FLIGHT', '4'))
+        
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.admitted = 0
+        self.throttled_rate = 0
+        self.throttled_in_flight = 0
+        self._throttled_by_device: Dict[int, int] = {}
+    
+    def acquire(self, device_id: int, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Admit an ingest request for a device. Returns (admitted, retry_after_seconds);
+        an admitted request must call release() when it finishes.
+        """
+        with self._lock:
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self.throttled_in_flight += 1
+                self._throttled_by_device[device_id] = self._throttled_by_device.get(device_id, 0) + 1
+                return False, 1.0
+            
+            if self.rate_per_second:
+                bucket = self._buckets.get(device_id)
+                if bucket is None:
+                    bucket = self._buckets[device_id] = TokenBucket(self.rate_per_second, self.burst)
+                
+                wait = bucket.take(cost)
+                if wait:
+                    self.throttled_rate += 1
+                    self._throttled_by_device[device_id] = self._throttled_by_device.get(device_id, 0) + 1
+                    return False, wait
+            
+            self._in_flight += 1
+            self.admitted += 1
+            return True, 0.0
+    
+    def release(self):
+        """Mark an admitted request as finished."""
+        with self._lock:
+            self._in_flight -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Limits, in-flight requests and throttle counters."""
+        with self._lock:
+            return {
+                "rate_per_second": self.rate_per_second,
+                "burst": self.burst,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "admitted": self.admitted,
+                "throttled": self.throttled_rate + self.throttled_in_flight,
+                "throttled_rate": self.throttled_rate,
+                "throttled_in_flight": self.throttled_in_flight,
+                "throttled_by_device": dict(self._throttled_by_device)
+            }
+
+
+# Singleton instance
+_ingest_rate_limiter = None
+
+def get_ingest_rate_limiter() -> IngestRateLimiter:
+    """Get or create IngestRateLimiter instance."""
+    global _ingest_rate_limiter
+    if _ingest_rate_limiter is None:
+        _ingest_rate_limiter = IngestRateLimiter()
+    return _ingest_rate_limiter
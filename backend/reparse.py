@@ -0,0 +1,257 @@
+"""
+Bulk re-parsing of stored raw events (e.g. after a parser fix).
+
+Events are streamed from the database in id order, one chunk at a time.
+Parsing is pure CPU work, so chunks are parsed in a process pool while this
+process, the only writer, applies each parsed chunk with the batch pipeline
+(bulk dedupe and inserts) and commits once per chunk. The write lock is
+released between chunks, and Google Sheets sync is skipped for the run.
+
+Every raw event records the parser that handled it and that parser's
+version, so by default only events a parser change can affect are
+re-parsed: events whose parser version changed (or was never recorded), and
+FAILED events the router would now send to a different parser. Events too
+long to parse are recorded under LENGTH_LIMIT_NAME, versioned by the limit,
+so they are left alone until it changes.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import and_, or_, not_
+from sqlalchemy.orm import Session
+from parser import (
+    EventText, ParseOutcome, LENGTH_LIMIT_NAME, current_parser_versions, parse_event_texts, process_raw_events
+)
+from sender_router import SenderRouter, get_sender_router
+import models
+
+
+def get_reparse_config() -> Dict[str, int]:
+    """
+    Reparse settings from environment variables: REPARSE_WORKERS (default:
+    CPU count, 0 parses in this process) and REPARSE_CHUNK_SIZE.
+    """
+    from dotenv import load_dotenv
+    
+    # Load .env from the backend directory
+    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+    load_dotenv(env_path)
+    
+    return {
+        'workers': int(os.getenv('REPARSE_WORKERS') or os.cpu_count() or 1),
+        'chunk_size': int(os.getenv('REPARSE_CHUNK_SIZE', '500'))
+    }
+
+
+def _filtered_query(db: Session, status: Optional[str], date_from: Optional[str], date_to: Optional[str]):
+    """Raw events matching the reparse filters."""
+    query = db.query(models.RawEvent)
+    
+    if status:
+        query = query.filter(models.RawEvent.parsed_status == status)
+    
+    if date_from:
+        query = query.filter(models.RawEvent.inserted_at >= date_from)
+    
+    if date_to:
+        query = query.filter(models.RawEvent.inserted_at <= date_to)
+    
+    return query
+
+
+def _stale_filter(parser_versions: Dict[str, str]):
+    """Events whose recorded parser version is missing or no longer current."""
+    current = [
+        and_(models.RawEvent.parser_name == name, models.RawEvent.parser_version == version)
+        for name, version in parser_versions.items()
+    ]
+    return or_(
+        models.RawEvent.parser_name.is_(None),
+        models.RawEvent.parser_version.is_(None),
+        not_(or_(*current))
+    )
+
+
+def _needs_reparse(row, router: SenderRouter, parser_versions: Dict[str, str]) -> bool:
+    """Whether a candidate event (stale or FAILED) would parse differently now."""
+    version = parser_versions.get(row.parser_name)
+    if version is None or row.parser_version != version:
+        return True
+    # Current version: only worth retrying if it would go to another parser
+    # (events over the length limit go to none)
+    return row.parsed_status == "FAILED" and row.parser_name != LENGTH_LIMIT_NAME and \
+        router.preview(row.source_sender, (row.raw_text or '').lower()) != row.parser_name
+
+
+def _iter_id_chunks(db: Session, query, chunk_size: int):
+    """Yield lists of matching raw event ids, in id order, chunk_size at a time."""
+    last_id = 0
+    while True:
+        ids = [
+            row.id for row in query.with_entities(models.RawEvent.id).filter(
+                models.RawEvent.id > last_id
+            ).order_by(models.RawEvent.id.asc()).limit(chunk_size)
+        ]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _load_chunk(db: Session, ids: List[int], router: Optional[SenderRouter],
+                parser_versions: Dict[str, str]) -> Tuple[List[int], List[EventText]]:
+    """
+    Ids and texts of the events in a chunk to re-parse, in id order. With a
+    router (incremental reparse), events that would parse the same way are dropped.
+    """
+    rows = {
+        row.id: row
+        for row in db.query(
+            models.RawEvent.id, models.RawEvent.source_sender, models.RawEvent.raw_text,
+            models.RawEvent.parser_name, models.RawEvent.parser_version, models.RawEvent.parsed_status
+        ).filter(models.RawEvent.id.in_(ids))
+    }
+    
+    kept = [
+        raw_event_id for raw_event_id in ids
+        if raw_event_id in rows and (router is None or _needs_reparse(rows[raw_event_id], router, parser_versions))
+    ]
+    return kept, [EventText(rows[raw_event_id].source_sender, rows[raw_event_id].raw_text) for raw_event_id in kept]
+
+
+def _init_worker(learned_routes: Dict[str, str]):
+    """Route in worker processes with the same learned senders as this process."""
+    get_sender_router().seed(learned_routes)
+
+
+def _count_outcomes(raw_events: List[models.RawEvent], transactions) -> Dict[str, int]:
+    """Reparse counters for processed events: linked to a transaction, SKIPPED, or left unparsed."""
+    counts = {"successful": 0, "skipped": 0, "unparsed": 0, "failed": 0}
+    for raw_event, transaction in zip(raw_events, transactions):
+        if transaction:
+            counts["successful"] += 1
+        elif raw_event.parsed_status == "SKIPPED":
+            counts["skipped"] += 1
+        else:
+            counts["unparsed"] += 1
+    return counts
+
+
+def _apply_chunk(db: Session, ids: List[int], outcomes: List[ParseOutcome]) -> Dict[str, int]:
+    """
+    Apply parsed outcomes for one chunk and commit. If the chunk fails, its
+    events are retried one by one (without Sheets sync) so one bad event
+    does not sink the rest. Returns the chunk's counters (see
+    _count_outcomes); failed counts events whose write raised an error.
+    """
+    raw_events = db.query(models.RawEvent).filter(models.RawEvent.id.in_(ids)).all()
+    by_id = {raw_event.id: raw_event for raw_event in raw_events}
+    ordered = [(by_id[raw_event_id], outcome) for raw_event_id, outcome in zip(ids, outcomes) if raw_event_id in by_id]
+    
+    try:
+        transactions, _ = process_raw_events(
+            db, [raw_event for raw_event, _ in ordered], [outcome for _, outcome in ordered]
+        )
+        # Counted before the commit expires the raw events
+        counts = _count_outcomes([raw_event for raw_event, _ in ordered], transactions)
+        db.commit()
+    except Exception as e:
+        print(f"Reparse chunk error, retrying events one by one: {e}")
+        db.rollback()
+        
+        counts = {"successful": 0, "skipped": 0, "unparsed": 0, "failed": 0}
+        for raw_event_id, outcome in zip(ids, outcomes):
+            raw_event = db.query(models.RawEvent).filter(models.RawEvent.id == raw_event_id).first()
+            if raw_event is None:
+                continue
+            try:
+                transactions, _ = process_raw_events(db, [raw_event], [outcome])
+                event_counts = _count_outcomes([raw_event], transactions)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Reparse error for event {raw_event_id}: {e}")
+                counts["failed"] += 1
+                continue
+            for name, value in event_counts.items():
+                counts[name] += value
+    
+    return counts
+
+
+def _parsed_chunks(db: Session, chunks, workers: int):
+    """Yield (ids, parse outcomes) per loaded chunk, in order, parsing ahead in worker processes."""
+    if workers <= 0:
+        for ids, texts in chunks:
+            yield ids, parse_event_texts(texts)
+        return
+    
+    # Workers only parse; "spawn" keeps them clear of this process's threads
+    # and database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(get_sender_router().learned_routes(),)) as executor:
+        # Keep a few chunks in flight ahead of the writer
+        in_flight = deque()
+        for ids, texts in chunks:
+            in_flight.append((ids, executor.submit(parse_event_texts, texts)))
+            if len(in_flight) >= workers * 2:
+                ids, future = in_flight.popleft()
+                yield ids, future.result()
+        
+        while in_flight:
+            ids, future = in_flight.popleft()
+            yield ids, future.result()
+
+
+def reparse_events(db: Session, status: Optional[str] = None, date_from: Optional[str] = None,
+                   date_to: Optional[str] = None, workers: Optional[int] = None,
+                   chunk_size: Optional[int] = None, full: bool = False) -> Dict[str, Any]:
+    """
+    Re-parse raw events matching the filters: only those a parser change can
+    affect, or all of them with full=True. Unset workers/chunk_size come
+    from get_reparse_config(). Returns totals and timing: successful events
+    are linked to a transaction, skipped ones were SKIPPED by the pre-filter,
+    unparsed ones are FAILED parses, and failed ones hit an error on write.
+    """
+    config = get_reparse_config()
+    workers = config['workers'] if workers is None else workers
+    chunk_size = chunk_size or config['chunk_size']
+    
+    started = datetime.now()
+    totals = {"total_events": 0, "successful": 0, "skipped": 0, "unparsed": 0, "failed": 0}
+    
+    # Learned senders route events here and in the worker processes
+    get_sender_router().ensure_loaded(db)
+    
+    query = _filtered_query(db, status, date_from, date_to)
+    parser_versions = current_parser_versions()
+    router = None
+    if not full:
+        query = query.filter(or_(
+            _stale_filter(parser_versions),
+            and_(models.RawEvent.parsed_status == "FAILED", models.RawEvent.parser_name != LENGTH_LIMIT_NAME)
+        ))
+        router = get_sender_router()
+    
+    loaded = (_load_chunk(db, ids, router, parser_versions) for ids in _iter_id_chunks(db, query, chunk_size))
+    chunks = (chunk for chunk in loaded if chunk[0])
+    
+    for ids, outcomes in _parsed_chunks(db, chunks, workers):
+        counts = _apply_chunk(db, ids, outcomes)
+        totals["total_events"] += len(ids)
+        for name, value in counts.items():
+            totals[name] += value
+    
+    elapsed = (datetime.now() - started).total_seconds()
+    return {
+        "status": "complete",
+        "incremental": not full,
+        **totals,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "elapsed_seconds": round(elapsed, 3),
+        "events_per_second": round(totals["total_events"] / elapsed, 1) if elapsed else None
+    }
@@ -0,0 +1,465 @@
+"""
+Compiled per-user rule index for the rules engine.
+
+A user's active rules are compiled once into lookup structures, one per
+kind of match, so a transaction is matched against all of them at once
+instead of one rule at a time:
+
+- MERCHANT_KEY, CHANNEL, DIRECTION and ACCOUNT_ID: dicts of value -> rules
+- TEXT_CONTAINS and MERCHANT_KEY_CONTAINS: one multi-pattern scan over the
+  lowered texts for every (lowered) value
+- UPI_ID_PREFIX and UPI_ID_SUFFIX: a trie of prefixes and one of reversed
+  suffixes, walked along the lowered UPI id
+- AMOUNT_RANGE and AMOUNT_EQUALS: a sorted index of amount intervals
+
+Values are lowered and parsed at compile time. Rules whose value cannot be
+parsed (e.g. an AMOUNT_RANGE that is not "min-max") never match, as before.
+Matches come back in rule order: priority, then id.
+
+Rules change rarely, so compiled indexes are cached per user and checked
+against a generation counter in rule_set_generations, which every rule
+write bumps. The counter lives in the database, so processes that did not
+make the change see it too.
+
+Action targets (the merchant or category a rule sets) are looked up when
+the rules are compiled; rules whose target does not exist are reported in
+RuleIndex.invalid and never apply. Creating, renaming or deleting a
+merchant or category bumps the generation of only the users with a rule
+naming it.
+"""
+import os
+import threading
+from bisect import bisect_left
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple, Sequence
+from sqlalchemy.orm import Session
+from upsert import insert_ignore_returning
+from parser_engine import KeywordScanner
+import models
+
+# How the rules engine applies a transaction's matches: "all" runs every
+# matching rule's action in priority order (later rules overwrite earlier
+# ones); "first_match" fills each action slot from the first matching rule
+EVALUATION_MODES = ("all", "first_match")
+
+# AMOUNT_EQUALS matches amounts within this distance of the value
+AMOUNT_TOLERANCE = 0.01
+
+# Trie key holding the rules that end at a node
+_RULES = None
+
+# Action type -> kind of target its value names
+ACTION_TARGETS = {
+    "SET_MERCHANT": "merchant_id",
+    "SET_MERCHANT_BY_KEY": "merchant_key",
+    "SET_CATEGORY": "category_id",
+    "SET_CATEGORY_BY_NAME": "category_name",
+}
+
+# Actions that need no target
+_PLAIN_ACTIONS = ("MARK_INTERNAL", "SET_DESCRIPTION")
+
+
+class CompiledRule(NamedTuple):
+    """Snapshot of a Rule row, safe to keep across sessions."""
+    id: int
+    priority: int
+    match_type: str
+    match_value: Optional[str]
+    action_type: str
+    action_value: Optional[str]
+    # Merchant or category id the action sets, resolved at compile time
+    target: Optional[int] = None
+    
+    @classmethod
+    def from_rule(cls, rule: models.Rule, target: Optional[int] = None) -> 'CompiledRule':
+        return cls(rule.id, rule.priority, rule.match_type, rule.match_value, rule.action_type, rule.action_value, target)
+
+
+class _Trie:
+    """Character trie of words -> rule positions."""
+    
+    def __init__(self):
+        self._root: Dict[Any, Any] = {}
+    
+    def add(self, word: str, position: int):
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault(_RULES, []).append(position)
+    
+    def walk(self, text: str) -> List[int]:
+        """Positions of every word that text starts with."""
+        positions = []
+        node = self._root
+        for char in text:
+            positions.extend(node.get(_RULES, ()))
+            node = node.get(char)
+            if node is None:
+                return positions
+        positions.extend(node.get(_RULES, ()))
+        return positions
+
+
+class _IntervalIndex:
+    """
+    Closed amount intervals -> rule positions. The sorted interval endpoints
+    split the number line into points and the open gaps between them, and
+    each of those regions lists the intervals covering it, so a lookup is one
+    bisect.
+    """
+    
+    def __init__(self, intervals: Sequence[Tuple[float, float, int]]):
+        self._points = sorted({point for low, high, _ in intervals for point in (low, high)})
+        # Region 2i + 1 is the point _points[i]; region 2i the gap below it
+        regions: List[List[int]] = [[] for _ in range(2 * len(self._points) + 1)]
+        for low, high, position in intervals:
+            first = 2 * bisect_left(self._points, low) + 1
+            last = 2 * bisect_left(self._points, high) + 1
+            for region in range(first, last + 1):
+                regions[region].append(position)
+        self._regions = [tuple(positions) for positions in regions]
+    
+    def find(self, value: float) -> Tuple[int, ...]:
+        index = bisect_left(self._points, value)
+        if index < len(self._points) and self._points[index] == value:
+            return self._regions[2 * index + 1]
+        return self._regions[2 * index]
+
+
+def _parse_amount_range(match_value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(min, max) of an AMOUNT_RANGE value such as "100-500", or None if invalid."""
+    try:
+        min_amt, max_amt = match_value.split("-")
+        return float(min_amt), float(max_amt)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _parse_float(match_value: Optional[str]) -> Optional[float]:
+    try:
+        return float(match_value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_int(match_value: Optional[str]) -> Optional[int]:
+    try:
+        return int(match_value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _target_key(action_type: str, action_value: Optional[str]) -> Optional[Tuple[str, Any]]:
+    """(target kind, lookup key) named by an action, or None if it names none."""
+    kind = ACTION_TARGETS.get(action_type)
+    if kind is None or action_value is None:
+        return None
+    key = _parse_int(action_value) if kind.endswith("_id") else action_value
+    return (kind, key) if key is not None else None
+
+
+def _target_columns(kind: str):
+    """(lookup column, id column) for a target kind."""
+    return {
+        "merchant_id": (models.Merchant.id, models.Merchant.id),
+        "merchant_key": (models.Merchant.merchant_key, models.Merchant.id),
+        "category_id": (models.Category.id, models.Category.id),
+        "category_name": (models.Category.name, models.Category.id),
+    }[kind]
+
+
+def resolve_targets(db: Session, target_keys) -> Dict[Tuple[str, Any], int]:
+    """Merchant and category ids for (kind, key) targets; missing ones are left out."""
+    keys_by_kind: Dict[str, set] = {}
+    for kind, key in target_keys:
+        keys_by_kind.setdefault(kind, set()).add(key)
+    
+    resolved = {}
+    for kind, keys in keys_by_kind.items():
+        lookup_column, id_column = _target_columns(kind)
+        for key, target_id in db.query(lookup_column, id_column).filter(lookup_column.in_(keys)):
+            resolved[(kind, key)] = target_id
+    return resolved
+
+
+class RuleIndex:
+    """A user's active rules compiled for matching, in priority order."""
+    
+    def __init__(self, rules: Sequence[CompiledRule], order: Optional[Dict[int, int]] = None):
+        """order maps rule ids to their place among all the user's rules (for subsets)."""
+        self.rules = tuple(rules)
+        self._order = order if order is not None else {rule.id: position for position, rule in enumerate(self.rules)}
+        self._subsets: Dict[Tuple[str, ...], 'RuleIndex'] = {}
+        
+        self._exact: Dict[str, Dict[Any, List[int]]] = {
+            "MERCHANT_KEY": {}, "CHANNEL": {}, "DIRECTION": {}, "ACCOUNT_ID": {}
+        }
+        self._text_contains: Dict[str, List[int]] = {}
+        self._merchant_key_contains: Dict[str, List[int]] = {}
+        self._upi_prefixes = _Trie()
+        self._upi_suffixes = _Trie()
+        self._amount_equals: Dict[int, float] = {}
+        # Rule id -> why the rule can never apply
+        self.invalid: Dict[int, str] = {}
+        
+        intervals = []
+        for position, rule in enumerate(self.rules):
+            match_type = rule.match_type
+            match_value = rule.match_value
+            
+            if match_type in ("MERCHANT_KEY", "CHANNEL", "DIRECTION"):
+                # Exact, case-sensitive match on the transaction field
+                self._exact[match_type].setdefault(match_value, []).append(position)
+            
+            elif match_type == "ACCOUNT_ID":
+                account_id = _parse_int(match_value)
+                if account_id is None:
+                    self.invalid[rule.id] = "invalid match value"
+                else:
+                    self._exact[match_type].setdefault(account_id, []).append(position)
+            
+            elif match_type in ("TEXT_CONTAINS", "MERCHANT_KEY_CONTAINS") and match_value is not None:
+                # TEXT_CONTAINS: description or raw merchant identifier;
+                # MERCHANT_KEY_CONTAINS: partial match on merchant key
+                words = self._text_contains if match_type == "TEXT_CONTAINS" else self._merchant_key_contains
+                words.setdefault(match_value.lower(), []).append(position)
+            
+            elif match_type == "UPI_ID_PREFIX" and match_value is not None:
+                # e.g. "amitabh" matches "amitabh10b26.hts21@okicici"
+                self._upi_prefixes.add(match_value.lower(), position)
+            
+            elif match_type == "UPI_ID_SUFFIX" and match_value is not None:
+                # e.g. "@okicici" matches "amitabh10b26.hts21@okicici"
+                self._upi_suffixes.add(match_value.lower()[::-1], position)
+            
+            elif match_type == "AMOUNT_EQUALS":
+                target = _parse_float(match_value)
+                if target is None or target != target:
+                    self.invalid[rule.id] = "invalid match value"
+                else:
+                    # Indexed with some slack; the exact test runs on lookup
+                    self._amount_equals[position] = target
+                    intervals.append((target - 2 * AMOUNT_TOLERANCE, target + 2 * AMOUNT_TOLERANCE, position))
+            
+            elif match_type == "AMOUNT_RANGE":
+                # Format: "min-max", e.g. "100-500"
+                bounds = _parse_amount_range(match_value)
+                if bounds is None or not bounds[0] <= bounds[1]:
+                    self.invalid[rule.id] = "invalid match value"
+                else:
+                    intervals.append((bounds[0], bounds[1], position))
+            
+            else:
+                self.invalid[rule.id] = "invalid match type or value"
+            
+            if rule.target is None and rule.action_type not in _PLAIN_ACTIONS:
+                if rule.action_type not in ACTION_TARGETS:
+                    reason = "unknown action type"
+                elif _target_key(rule.action_type, rule.action_value) is None:
+                    reason = "invalid action value"
+                else:
+                    reason = f"{'merchant' if rule.action_type.startswith('SET_MERCHANT') else 'category'} not found"
+                self.invalid.setdefault(rule.id, reason)
+        
+        self._amounts = _IntervalIndex(intervals) if intervals else None
+        
+        # Empty values are in every text; the scanner only gets the rest
+        vocabulary = [word for word in (*self._text_contains, *self._merchant_key_contains) if word]
+        self._scanner = KeywordScanner(vocabulary) if vocabulary else None
+        
+        # Whether matches depend on the description (changed by SET_DESCRIPTION)
+        self.reads_description = bool(self._text_contains)
+    
+    def _contained(self, words: Dict[str, List[int]], text_lower: str) -> List[int]:
+        """Positions of the rules whose word occurs in text_lower."""
+        positions = list(words.get('', ()))
+        if self._scanner is not None:
+            for word in {word for _, word in self._scanner.find_all(text_lower)}:
+                positions.extend(words.get(word, ()))
+        return positions
+    
+    def matches(self, transaction: models.Transaction, after: Optional[CompiledRule] = None) -> List[CompiledRule]:
+        """Rules matching the transaction, in priority order (only those after a given rule)."""
+        positions: List[int] = []
+        
+        for field, values in self._exact.items():
+            if values:
+                positions.extend(values.get(getattr(transaction, field.lower()), ()))
+        
+        if self._text_contains:
+            text = f"{transaction.description or ''} {transaction.raw_merchant_identifier or ''}".lower()
+            positions.extend(self._contained(self._text_contains, text))
+        
+        if self._merchant_key_contains:
+            positions.extend(self._contained(self._merchant_key_contains, (transaction.merchant_key or "").lower()))
+        
+        upi_id = transaction.raw_merchant_identifier
+        if upi_id:
+            upi_id = upi_id.lower()
+            positions.extend(self._upi_prefixes.walk(upi_id))
+            positions.extend(self._upi_suffixes.walk(upi_id[::-1]))
+        
+        amount = transaction.amount
+        if self._amounts is not None and amount is not None and amount == amount:
+            for position in self._amounts.find(amount):
+                target = self._amount_equals.get(position)
+                if target is None or abs(amount - target) < AMOUNT_TOLERANCE:
+                    positions.append(position)
+        
+        positions.sort()
+        matched = [self.rules[position] for position in positions]
+        if after is not None:
+            after_order = self._order[after.id]
+            matched = [rule for rule in matched if self._order[rule.id] > after_order]
+        return matched
+    
+    def order(self, rule: CompiledRule) -> int:
+        """Place of a rule among all the user's rules (sort key for merging subset matches)."""
+        return self._order[rule.id]
+    
+    def subset(self, action_types: Tuple[str, ...]) -> 'RuleIndex':
+        """Index of only the rules with one of action_types (compiled on first use)."""
+        subset = self._subsets.get(action_types)
+        if subset is None:
+            subset = RuleIndex([rule for rule in self.rules if rule.action_type in action_types], self._order)
+            self._subsets[action_types] = subset
+        return subset
+
+
+def bump_rules_generation(db: Session, user_id: int):
+    """
+    Mark a user's rules as changed, in the caller's transaction. Every
+    process's RuleIndexCache recompiles the user's rules on its next lookup
+    once this commits. Call it from anything that writes rules.
+    """
+    insert_ignore_returning(
+        db, models.RuleSetGeneration, [{"user_id": user_id, "generation": 0}],
+        conflict_columns=["user_id"], returning=["user_id"]
+    )
+    db.query(models.RuleSetGeneration).filter(
+        models.RuleSetGeneration.user_id == user_id
+    ).update({models.RuleSetGeneration.generation: models.RuleSetGeneration.generation + 1},
+             synchronize_session=False)
+
+
+def get_rules_generation(db: Session, user_id: int) -> int:
+    """Current generation of a user's rules (0 if they were never changed)."""
+    generation = db.query(models.RuleSetGeneration.generation).filter(
+        models.RuleSetGeneration.user_id == user_id
+    ).scalar()
+    return generation or 0
+
+
+def load_rules(db: Session, user_id: int) -> List[CompiledRule]:
+    """A user's active rules in priority order, with their action targets resolved."""
+    rules = db.query(models.Rule).filter(
+        models.Rule.user_id == user_id,
+        models.Rule.is_active == True
+    ).order_by(models.Rule.priority.asc(), models.Rule.id.asc()).all()
+    
+    target_keys = {rule.id: _target_key(rule.action_type, rule.action_value) for rule in rules}
+    resolved = resolve_targets(db, {key for key in target_keys.values() if key is not None})
+    return [CompiledRule.from_rule(rule, resolved.get(target_keys[rule.id])) for rule in rules]
+
+
+def bump_target_generations(db: Session, kind: str, keys) -> int:
+    """
+    Bump the generation of every user with an active rule whose action names
+    one of keys (e.g. kind "category_name" and the old and new name of a
+    renamed category), in the caller's transaction. Only those users' rules
+    are recompiled. Returns the number of users affected.
+    """
+    wanted = {(kind, key) for key in keys}
+    action_types = [action_type for action_type, target_kind in ACTION_TARGETS.items() if target_kind == kind]
+    rows = db.query(models.Rule.user_id, models.Rule.action_type, models.Rule.action_value).filter(
+        models.Rule.action_type.in_(action_types),
+        models.Rule.is_active == True
+    )
+    users = {user_id for user_id, action_type, action_value in rows if _target_key(action_type, action_value) in wanted}
+    for user_id in sorted(users):
+        bump_rules_generation(db, user_id)
+    return len(users)
+
+
+class RuleIndexCache:
+    """
+    Compiled rule index per user, tagged with the generation of the user's
+    rules it was compiled from. A lookup reads the generation row (one
+    primary key lookup) and only loads and compiles the rules when it
+    changed, so other processes' rule changes are picked up too.
+    """
+    
+    def __init__(self, evaluation_mode: Optional[str] = None):
+        """
+        Initialize the cache. evaluation_mode (how the rules engine applies
+        matches, see EVALUATION_MODES) is read from the RULES_EVALUATION_MODE
+        environment variable when unset.
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.evaluation_mode = evaluation_mode or os.getenv('RULES_EVALUATION_MODE', 'all')
+        if self.evaluation_mode not in EVALUATION_MODES:
+            raise ValueError(f"Unknown rules evaluation mode {self.evaluation_mode!r}, expected one of {EVALUATION_MODES}")
+        
+        self._indexes: Dict[int, Tuple[int, RuleIndex]] = {}
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.hits = 0
+        self.compiles = 0
+        self.transactions = 0
+        self.rules_evaluated = 0
+    
+    def get(self, db: Session, user_id: int) -> RuleIndex:
+        """Index of a user's current active rules."""
+        # Read before the rules: a change committed in between is seen as a
+        # new generation on the next lookup
+        generation = get_rules_generation(db, user_id)
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is not None and cached[0] == generation:
+                self.hits += 1
+                return cached[1]
+        
+        index = RuleIndex(load_rules(db, user_id))
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is None or cached[0] <= generation:
+                self._indexes[user_id] = (generation, index)
+            self.compiles += 1
+        return index
+    
+    def record_evaluation(self, rules_evaluated: int):
+        """Count one transaction run through the rules and the rules it was matched against."""
+        with self._lock:
+            self.transactions += 1
+            self.rules_evaluated += rules_evaluated
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache and evaluation counters."""
+        with self._lock:
+            return {
+                "evaluation_mode": self.evaluation_mode,
+                "users": len(self._indexes),
+                "rules": sum(len(index.rules) for _, index in self._indexes.values()),
+                "invalid_rules": sum(len(index.invalid) for _, index in self._indexes.values()),
+                "hits": self.hits,
+                "compiles": self.compiles,
+                "transactions": self.transactions,
+                "avg_rules_evaluated": round(self.rules_evaluated / self.transactions, 2) if self.transactions else None
+            }
+
+
+# Singleton instance
+_rule_index_cache = None
+
+def get_rule_index_cache() -> RuleIndexCache:
+    """Get or create RuleIndexCache instance."""
+    global _rule_index_cache
+    if _rule_index_cache is None:
+        _rule_index_cache = RuleIndexCache()
+    return _rule_index_cache
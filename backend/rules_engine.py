@@ -1,105 +1,128 @@
 """
 Rules Engine for auto-categorization and merchant mapping.
 """
-from typing import List, Optional
+from typing import Optional, Tuple
 from sqlalchemy.orm import Session
+from rule_index import CompiledRule, RuleIndex, get_rule_index_cache, bump_rules_generation
 import models
-import re
+
+# Action slot -> (action types that fill it, manual_override_flags bit
+# protecting it); first_match evaluation fills each slot at most once
+ACTION_SLOTS = {
+    "merchant": (("SET_MERCHANT", "SET_MERCHANT_BY_KEY"), 1),
+    "category": (("SET_CATEGORY", "SET_CATEGORY_BY_NAME"), 2),
+    "internal": (("MARK_INTERNAL",), 4),
+    "description": (("SET_DESCRIPTION",), 0),
+}
+SLOT_OF_ACTION = {action_type: slot for slot, (action_types, _) in ACTION_SLOTS.items() for action_type in action_types}
 
 
 class RulesEngine:
     """Apply rules to transactions for auto-categorization."""
     
     @staticmethod
-    def apply_rules(db: Session, transaction: models.Transaction) -> bool:
+    def apply_rules(db: Session, transaction: models.Transaction, mode: Optional[str] = None) -> bool:
         """
         Apply all active rules to a transaction.
         Returns True if any rules were applied.
+        
+        mode is one of EVALUATION_MODES (default: RULES_EVALUATION_MODE).
+        Changes are left in the session; the caller owns the unit of work
+        and commits.
         """
-        # Get all active rules for this user, ordered by priority
-        rules = db.query(models.Rule).filter(
-            models.Rule.user_id == transaction.user_id,
-            models.Rule.is_active == True
-        ).order_by(models.Rule.priority.asc()).all()
+        # This user's active rules, compiled and ordered by priority (cached
+        # until the rules change)
+        index = get_rule_index_cache().get(db, transaction.user_id)
+        return RulesEngine.apply_index(db, transaction, index, mode)
+    
+    @staticmethod
+    def apply_index(db: Session, transaction: models.Transaction, index: RuleIndex,
+                    mode: Optional[str] = None) -> bool:
+        """
+        apply_rules with the user's compiled rules already at hand (for bulk
+        callers). transaction only needs the matched and set attributes.
+        """
+        cache = get_rule_index_cache()
+        if (mode or cache.evaluation_mode) == "first_match":
+            applied_count, evaluated = RulesEngine._apply_first_matches(db, transaction, index)
+        else:
+            applied_count, evaluated = RulesEngine._apply_all_matches(db, transaction, index)
         
+        cache.record_evaluation(evaluated)
+        return applied_count > 0
+    
+    @staticmethod
+    def _apply_all_matches(db: Session, transaction: models.Transaction, index: RuleIndex) -> Tuple[int, int]:
+        """
+        Run every matching rule's action in priority order, so later rules
+        overwrite earlier ones. Returns (rules applied, rules evaluated).
+        """
         applied_count = 0
+        evaluated = len(index.rules)
         
-        for rule in rules:
-            if RulesEngine._rule_matches(transaction, rule):
-                if RulesEngine._apply_rule_action(db, transaction, rule):
-                    applied_count += 1
-        
-        if applied_count > 0:
-            db.commit()
-            db.refresh(transaction)
-            return True
+        matched = index.matches(transaction)
+        while matched:
+            rule = matched.pop(0)
+            description = transaction.description
+            if RulesEngine._apply_rule_action(db, transaction, rule):
+                applied_count += 1
+            
+            # Later rules match against the new description
+            if index.reads_description and transaction.description != description:
+                matched = index.matches(transaction, after=rule)
+                evaluated += len(index.rules)
         
-        return False
+        return applied_count, evaluated
     
     @staticmethod
-    def _rule_matches(transaction: models.Transaction, rule: models.Rule) -> bool:
-        """Check if a rule matches a transaction."""
-        match_type = rule.match_type
-        match_value = rule.match_value
-        
-        if match_type == "MERCHANT_KEY":
-            # Exact match on merchant key
-            return transaction.merchant_key == match_value
-        
-        elif match_type == "MERCHANT_KEY_CONTAINS":
-            # Partial match on merchant key
-            return match_value.lower() in (transaction.merchant_key or "").lower()
-        
-        elif match_type == "TEXT_CONTAINS":
-            # Match in description or raw merchant identifier
-            text = f"{transaction.description or ''} {transaction.raw_merchant_identifier or ''}".lower()
-            return match_value.lower() in text
-        
-        elif match_type == "UPI_ID_PREFIX":
-            # Match UPI ID prefix (e.g., "amitabh" matches "amitabh10b26.hts21@okicici")
-            if transaction.raw_merchant_identifier:
-                return transaction.raw_merchant_identifier.lower().startswith(match_value.lower())
-        
-        elif match_type == "UPI_ID_SUFFIX":
-            # Match UPI ID suffix (e.g., "@okicici" matches "amitabh10b26.hts21@okicici")
-            if transaction.raw_merchant_identifier:
-                return transaction.raw_merchant_identifier.lower().endswith(match_value.lower())
-        
-        elif match_type == "AMOUNT_EQUALS":
-            # Exact amount match
-            try:
-                target_amount = float(match_value)
-                return abs(transaction.amount - target_amount) < 0.01
-            except ValueError:
-                return False
-        
-        elif match_type == "AMOUNT_RANGE":
-            # Amount in range (format: "min-max", e.g., "100-500")
-            try:
-                min_amt, max_amt = match_value.split("-")
-                return float(min_amt) <= transaction.amount <= float(max_amt)
-            except (ValueError, AttributeError):
-                return False
-        
-        elif match_type == "CHANNEL":
-            # Match payment channel
-            return transaction.channel == match_value
-        
-        elif match_type == "DIRECTION":
-            # Match transaction direction
-            return transaction.direction == match_value
+    def _apply_first_matches(db: Session, transaction: models.Transaction, index: RuleIndex) -> Tuple[int, int]:
+        """
+        Fill each action slot from the first matching rule (in priority
+        order) whose action applies. Slots protected by manual_override_flags
+        are skipped, and only the rules of still-open slots are evaluated.
+        Returns (rules applied, rules evaluated).
+        """
+        open_slots = [
+            slot for slot, (_, flag) in ACTION_SLOTS.items()
+            if not (flag and transaction.manual_override_flags & flag)
+        ]
+        applied_count = 0
+        evaluated = 0
+        after = None
         
-        elif match_type == "ACCOUNT_ID":
-            # Match specific account
-            try:
-                return transaction.account_id == int(match_value)
-            except ValueError:
-                return False
+        while open_slots:
+            subsets = [index.subset(ACTION_SLOTS[slot][0]) for slot in open_slots]
+            evaluated += sum(len(subset.rules) for subset in subsets)
+            matched = sorted(
+                (rule for subset in subsets for rule in subset.matches(transaction, after=after)),
+                key=index.order
+            )
+            
+            after = None
+            for rule in matched:
+                slot = SLOT_OF_ACTION[rule.action_type]
+                if slot not in open_slots:
+                    continue
+                
+                description = transaction.description
+                if RulesEngine._apply_rule_action(db, transaction, rule):
+                    applied_count += 1
+                    open_slots.remove(slot)
+                    if not open_slots:
+                        break
+                
+                # Later rules match against the new description
+                if index.reads_description and transaction.description != description:
+                    after = rule
+                    break
+            
+            if after is None:
+                break
         
-        return False
+        return applied_count, evaluated
     
     @staticmethod
-    def _apply_rule_action(db: Session, transaction: models.Transaction, rule: models.Rule) -> bool:
+    def _apply_rule_action(db: Session, transaction: models.Transaction, rule: CompiledRule) -> bool:
         """Apply rule action to transaction. Returns True if applied."""
         action_type = rule.action_type
         action_value = rule.action_value
@@ -107,58 +130,22 @@ class RulesEngine:
         # Check manual override flags to avoid overwriting user edits
         # Bit flags: 1=merchant, 2=category, 4=internal_transfer
         
-        if action_type == "SET_MERCHANT":
+        if action_type in ("SET_MERCHANT", "SET_MERCHANT_BY_KEY"):
             if transaction.manual_override_flags & 1:  # Merchant manually set
                 return False
             
-            # Find or create merchant
-            merchant = db.query(models.Merchant).filter(
-                models.Merchant.id == int(action_value)
-            ).first()
-            
-            if merchant:
-                transaction.merchant_id = merchant.id
-                return True
-        
-        elif action_type == "SET_MERCHANT_BY_KEY":
-            if transaction.manual_override_flags & 1:
-                return False
-            
-            # Find merchant by key
-            merchant = db.query(models.Merchant).filter(
-                models.Merchant.merchant_key == action_value
-            ).first()
-            
-            if merchant:
-                transaction.merchant_id = merchant.id
+            # Merchant looked up by id or key when the rules were compiled
+            if rule.target is not None:
+                transaction.merchant_id = rule.target
                 return True
         
-        elif action_type == "SET_CATEGORY":
+        elif action_type in ("SET_CATEGORY", "SET_CATEGORY_BY_NAME"):
             if transaction.manual_override_flags & 2:  # Category manually set
                 return False
             
-            try:
-                category_id = int(action_value)
-                category = db.query(models.Category).filter(
-                    models.Category.id == category_id
-                ).first()
-                
-                if category:
-                    transaction.category_id = category_id
-                    return True
-            except ValueError:
-                return False
-        
-        elif action_type == "SET_CATEGORY_BY_NAME":
-            if transaction.manual_override_flags & 2:
-                return False
-            
-            category = db.query(models.Category).filter(
-                models.Category.name == action_value
-            ).first()
-            
-            if category:
-                transaction.category_id = category.id
+            # Category looked up by id or name when the rules were compiled
+            if rule.target is not None:
+                transaction.category_id = rule.target
                 return True
         
         elif action_type == "MARK_INTERNAL":
@@ -265,4 +252,5 @@ def create_default_rules(db: Session, user_id: int):
         )
         db.add(rule)
     
+    bump_rules_generation(db, user_id)
     db.commit()
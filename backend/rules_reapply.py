@@ -0,0 +1,222 @@
+"""
+Bulk re-application of rules to stored transactions (e.g. after adding rules).
+
+Transactions are streamed in id order, one chunk at a time, reading only the
+columns rules match on and set. Rules are evaluated in memory against each
+user's compiled rule set (fetched once per user per chunk), and the values
+that changed are written with one executemany UPDATE per changed column,
+committed once per chunk. manual_override_flags are respected as in ingest,
+and each UPDATE re-checks the column's flag so a manual edit made while the
+chunk was being evaluated is not overwritten.
+
+Jobs run in the background; their progress is kept in a small in-memory
+registry that clients poll.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+from sqlalchemy import update, bindparam, func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from rule_index import get_rule_index_cache
+from rules_engine import RulesEngine
+import models
+
+# Transactions evaluated and written per commit
+REAPPLY_CHUNK_SIZE = 1000
+
+# Finished jobs kept in the registry
+MAX_TRACKED_JOBS = 20
+
+# Columns rules match on, besides the ones they set
+MATCH_COLUMNS = (
+    "id", "user_id", "account_id", "direction", "amount", "channel",
+    "raw_merchant_identifier", "merchant_key", "manual_override_flags"
+)
+
+# Columns rule actions set
+RULE_COLUMNS = ("merchant_id", "category_id", "is_internal_transfer", "description")
+
+# Rule column -> manual_override_flags bit protecting it (description is unprotected)
+OVERRIDE_FLAGS = {"merchant_id": 1, "category_id": 2, "is_internal_transfer": 4}
+
+
+class ReapplyJobRegistry:
+    """In-memory progress of reapply jobs, keyed by job id."""
+    
+    def __init__(self, max_jobs: int = MAX_TRACKED_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def start(self, mode: str) -> Optional[str]:
+        """Register a new job and return its id, or None if one is still running."""
+        with self._lock:
+            if any(job["status"] == "running" for job in self._jobs.values()):
+                return None
+            
+            job_id = str(uuid.uuid4())
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "running",
+                "mode": mode,
+                "total": None,
+                "processed": 0,
+                "rules_applied": 0,
+                "updated": 0,
+                "chunks": 0,
+                "error": None,
+                "started_at": datetime.now().isoformat(),
+                "finished_at": None
+            }
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job_id
+    
+    def set_total(self, job_id: str, total: int):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]["total"] = total
+    
+    def update(self, job_id: str, **counts: int):
+        """Add to the counters of a job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for name, value in counts.items():
+                job[name] += value
+    
+    def finish(self, job_id: str, status: str = "completed", error: Optional[str] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["status"] = status
+                job["error"] = error
+                job["finished_at"] = datetime.now().isoformat()
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job's progress."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+def _iter_chunks(db: Session, transaction_ids: Optional[Sequence[str]], chunk_size: int):
+    """Yield lists of transaction rows (match and rule columns), in id order."""
+    table = models.Transaction.__table__
+    query = db.query(*[table.c[name] for name in MATCH_COLUMNS + RULE_COLUMNS])
+    
+    if transaction_ids:
+        ids = sorted(set(transaction_ids))
+        for start in range(0, len(ids), chunk_size):
+            rows = query.filter(table.c.id.in_(ids[start:start + chunk_size])).order_by(table.c.id.asc()).all()
+            if rows:
+                yield rows
+        return
+    
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(table.c.id > last_id)
+        rows = chunk_query.order_by(table.c.id.asc()).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _evaluate_chunk(db: Session, rows, mode: Optional[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], int, int]:
+    """
+    Run the rules over a chunk in memory. Returns the UPDATE parameters per
+    changed column, the transactions any rule applied to, and the
+    transactions that changed.
+    """
+    cache = get_rule_index_cache()
+    indexes = {}
+    changes: Dict[str, List[Dict[str, Any]]] = {column: [] for column in RULE_COLUMNS}
+    applied = updated = 0
+    
+    for row in rows:
+        index = indexes.get(row.user_id)
+        if index is None:
+            index = indexes[row.user_id] = cache.get(db, row.user_id)
+        
+        transaction = SimpleNamespace(**row._asdict())
+        transaction.manual_override_flags = transaction.manual_override_flags or 0
+        if RulesEngine.apply_index(db, transaction, index, mode):
+            applied += 1
+        
+        changed = False
+        for column in RULE_COLUMNS:
+            value = getattr(transaction, column)
+            if value != getattr(row, column):
+                changes[column].append({"b_id": row.id, "b_value": value})
+                changed = True
+        updated += changed
+    
+    return changes, applied, updated
+
+
+def _update_statement(table, column: str):
+    """executemany UPDATE of one rule column, skipping rows whose column was manually set since."""
+    statement = update(table).where(table.c.id == bindparam('b_id'))
+    flag = OVERRIDE_FLAGS.get(column)
+    if flag:
+        statement = statement.where(func.coalesce(table.c.manual_override_flags, 0).op('&')(flag) == 0)
+    return statement.values({column: bindparam('b_value')})
+
+
+def reapply_rules(db: Session, job_id: str, transaction_ids: Optional[Sequence[str]] = None,
+                  mode: Optional[str] = None, chunk_size: int = REAPPLY_CHUNK_SIZE):
+    """
+    Re-apply rules to all transactions (or the given ones), recording
+    progress under job_id. mode is a rules evaluation mode (default:
+    RULES_EVALUATION_MODE).
+    """
+    registry = get_reapply_registry()
+    table = models.Transaction.__table__
+    statements = {column: _update_statement(table, column) for column in RULE_COLUMNS}
+    
+    # (ids that do not exist are counted but never processed)
+    total = len(set(transaction_ids)) if transaction_ids else db.query(models.Transaction.id).count()
+    registry.set_total(job_id, total)
+    
+    for rows in _iter_chunks(db, transaction_ids, chunk_size):
+        changes, applied, updated = _evaluate_chunk(db, rows, mode)
+        for column, parameters in changes.items():
+            if parameters:
+                db.execute(statements[column], parameters)
+        db.commit()
+        
+        registry.update(job_id, processed=len(rows), rules_applied=applied, updated=updated, chunks=1)
+
+
+def run_reapply_job(job_id: str, transaction_ids: Optional[Sequence[str]] = None, mode: Optional[str] = None):
+    """Background entry point: reapply_rules in its own session, finishing the job either way."""
+    registry = get_reapply_registry()
+    db = SessionLocal()
+    try:
+        reapply_rules(db, job_id, transaction_ids, mode)
+    except Exception as e:
+        db.rollback()
+        print(f"Rules reapply error: {e}")
+        registry.finish(job_id, "failed", str(e))
+        return
+    finally:
+        db.close()
+    
+    registry.finish(job_id)
+
+
+# Singleton instance
+_reapply_registry = None
+
+def get_reapply_registry() -> ReapplyJobRegistry:
+    """Get or create ReapplyJobRegistry instance."""
+    global _reapply_registry
+    if _reapply_registry is None:
+        _reapply_registry = ReapplyJobRegistry()
+    return _reapply_registry
@@ -1,12 +1,19 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Optional, List
+from pydantic import BaseModel, Field
 from datetime import datetime
 
+# Longest raw text stored; texts over parser_engine.MAX_PARSE_LENGTH but
+# within this are stored and marked FAILED without being parsed
+MAX_RAW_TEXT_LENGTH = 16 * 1024
+
 class RawEventCreate(BaseModel):
     source_type: str  # SMS or NOTIFICATION
     source_sender: str
-    raw_text: str
+    raw_text: str = Field(..., max_length=MAX_RAW_TEXT_LENGTH)  # Longer texts are rejected (422)
     device_timestamp: datetime
+
+class RawEventBatchCreate(BaseModel):
+    events: List[RawEventCreate]
     
 class TransactionResponse(BaseModel):
     id: str
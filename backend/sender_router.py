@@ -0,0 +1,300 @@
+"""
+Sender-based routing of raw events to a parser.
+
+Bank SMS arrive from DLT sender headers (e.g. "VM-KOTAKB", "AD-HDFCBK-S")
+and app notifications from an app name or Android package name, so the
+sender alone usually identifies the parser. Senders are normalized and looked
+up in a static dict and prefix index, then in mappings learned from earlier
+successful parses (persisted in sender_routes). Only senders that miss every
+index fall back to scanning the message body for bank keywords.
+"""
+import re
+import threading
+from typing import Optional, Dict, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from upsert import insert_ignore_returning
+import models
+
+# "VM-HDFCBK", "AD-HDFCBK-S": two-letter operator/circle prefix, the header,
+# and an optional message-category suffix
+_DLT_HEADER = re.compile(r'^[A-Z]{2}-([A-Z0-9]{3,9})(?:-[A-Z])?$')
+_BARE_HEADER = re.compile(r'^[A-Z][A-Z0-9]{2,8}$')
+_PACKAGE_NAME = re.compile(r'^[a-z][\w]*(?:\.[\w]+)+$')
+
+# Shortest header prefix the prefix index matches on
+MIN_PREFIX_LENGTH = 3
+
+# Successful parses through the body-keyword fallback, all agreeing on the
+# parser, before a sender -> parser mapping is learned
+LEARN_AFTER_PARSES = 3
+
+# Exact normalized senders -> parser name
+SENDER_ROUTES: Dict[str, str] = {
+    'KOTAKB': 'kotak', 'KOTAKM': 'kotak', 'KOTAK': 'kotak',
+    'UCOBNK': 'uco', 'UCOBANK': 'uco',
+    'HDFCBK': 'hdfc', 'HDFCBN': 'hdfc',
+    'ICICIB': 'icici', 'ICICIT': 'icici',
+    'SBIINB': 'sbi', 'SBIPSG': 'sbi', 'SBIUPI': 'sbi', 'ATMSBI': 'sbi', 'CBSSBI': 'sbi',
+    'AXISBK': 'axis', 'AXISBN': 'axis',
+    # Notification senders (app names sent by the Android app)
+    'GOOGLE PAY': 'gpay', 'GPAY': 'gpay',
+    'PHONEPE': 'phonepe',
+    'PAYTM': 'paytm',
+}
+
+# Header prefixes -> parser name, for headers not listed above
+SENDER_PREFIXES: Dict[str, str] = {
+    'KOTAK': 'kotak',
+    'UCO': 'uco',
+    'HDFC': 'hdfc',
+    'ICICI': 'icici',
+    'SBI': 'sbi',
+    'AXIS': 'axis',
+}
+_MAX_PREFIX_LENGTH = max(map(len, SENDER_PREFIXES))
+
+# Android package names -> parser name
+PACKAGE_ROUTES: Dict[str, str] = {
+    'com.google.android.apps.nbu.paisa.user': 'gpay',
+    'com.phonepe.app': 'phonepe',
+    'net.one97.paytm': 'paytm',
+}
+
+# SMS apps that relay messages from any bank: never indexed or learned
+RELAY_SENDERS = {
+    'GOOGLE MESSAGES', 'SAMSUNG MESSAGES', 'MESSAGES', 'TRUECALLER',
+    'com.google.android.apps.messaging', 'com.samsung.android.messaging', 'com.android.mms', 'com.truecaller',
+}
+
+
+def normalize_sender(sender: Optional[str]) -> Tuple[str, bool]:
+    """
+    Normalize a sender to its routing key.
+    Returns (key, is_header): DLT headers lose their operator prefix and
+    category suffix, package names are lowercased, anything else is
+    uppercased. is_header is True for sender headers and package names, the
+    only senders a mapping is learned for.
+    """
+    sender = (sender or '').strip()
+    
+    if _PACKAGE_NAME.match(sender.lower()) and ' ' not in sender:
+        key = sender.lower()
+        return key, key not in RELAY_SENDERS
+    
+    upper = sender.upper()
+    dlt_match = _DLT_HEADER.match(upper)
+    if dlt_match:
+        return dlt_match.group(1), True
+    
+    return upper, bool(_BARE_HEADER.match(upper)) and upper not in RELAY_SENDERS
+
+
+def route_by_keywords(source_lower: str, text_lower: str) -> str:
+    """Pick a parser from sender and body keywords (the fallback for unindexed senders)."""
+    # Bank-specific parsers
+    if 'kotak' in source_lower or 'kotak' in text_lower:
+        return 'kotak'
+    elif 'uco' in source_lower or 'uco-upi' in text_lower:
+        return 'uco'
+    elif 'hdfc' in source_lower or 'hdfc' in text_lower:
+        return 'hdfc'
+    elif 'icici' in source_lower or 'icici' in text_lower:
+        return 'icici'
+    elif 'sbi' in source_lower or ('sbi' in text_lower and 'possible' not in text_lower):
+        return 'sbi'
+    elif 'axis' in source_lower or 'axis' in text_lower:
+        return 'axis'
+    
+    # UPI app parsers
+    elif 'gpay' in source_lower or 'google' in source_lower:
+        return 'gpay'
+    elif 'phonepe' in source_lower:
+        return 'phonepe'
+    elif 'paytm' in source_lower:
+        return 'paytm'
+    
+    # Fallback to generic parser
+    return 'generic'
+
+
+class SenderRouter:
+    """Static sender index plus sender -> parser mappings learned from successful parses."""
+    
+    def __init__(self):
+        # normalized sender -> parser name
+        self._learned: Dict[str, str] = {}
+        # normalized sender -> (parser name, agreeing successful parses) not learned yet
+        self._candidates: Dict[str, Tuple[str, int]] = {}
+        # learned mappings not yet written to sender_routes
+        self._unsaved: Dict[str, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.index_hits = 0
+        self.learned_hits = 0
+        self.fallbacks = 0
+    
+    def route(self, sender: Optional[str], text_lower: str) -> Tuple[str, bool]:
+        """
+        Return (parser name, from_index) for a message. from_index is False
+        when the parser came from the body-keyword fallback.
+        """
+        parser_name, source = self._resolve(sender, text_lower)
+        
+        with self._lock:
+            if source == 'index':
+                self.index_hits += 1
+            elif source == 'learned':
+                self.learned_hits += 1
+            else:
+                self.fallbacks += 1
+        return parser_name, source != 'fallback'
+    
+    def preview(self, sender: Optional[str], text_lower: str) -> str:
+        """The parser route() would pick, without counting the lookup."""
+        return self._resolve(sender, text_lower)[0]
+    
+    def _resolve(self, sender: Optional[str], text_lower: str) -> Tuple[str, str]:
+        """(parser name, source): source is 'index', 'learned' or 'fallback'."""
+        key, is_header = normalize_sender(sender)
+        
+        parser_name = self._lookup_static(key, is_header)
+        if parser_name is not None:
+            return parser_name, 'index'
+        
+        parser_name = self._learned.get(key)
+        if parser_name is not None:
+            return parser_name, 'learned'
+        
+        return route_by_keywords((sender or '').lower(), text_lower), 'fallback'
+    
+    def _lookup_static(self, key: str, is_header: bool) -> Optional[str]:
+        """Exact lookup in the static index, then longest-prefix lookup for sender headers."""
+        parser_name = SENDER_ROUTES.get(key) or PACKAGE_ROUTES.get(key)
+        if parser_name is not None or not is_header:
+            return parser_name
+        
+        for length in range(min(len(key), _MAX_PREFIX_LENGTH), MIN_PREFIX_LENGTH - 1, -1):
+            parser_name = SENDER_PREFIXES.get(key[:length])
+            if parser_name is not None:
+                return parser_name
+        return None
+    
+    def observe(self, sender: Optional[str], parser_name: str):
+        """
+        Record a successful fallback parse. After LEARN_AFTER_PARSES agreeing
+        parses the sender is routed straight to that parser.
+        """
+        if parser_name == 'generic':
+            return
+        
+        key, is_header = normalize_sender(sender)
+        if not is_header:
+            return
+        
+        with self._lock:
+            if key in self._learned:
+                return
+            
+            candidate, count = self._candidates.get(key, (parser_name, 0))
+            count = count + 1 if candidate == parser_name else 1
+            
+            if count >= LEARN_AFTER_PARSES:
+                self._candidates.pop(key, None)
+                self._learned[key] = parser_name
+                self._unsaved[key] = parser_name
+            else:
+                self._candidates[key] = (parser_name, count)
+    
+    def ensure_loaded(self, db: Session):
+        """Load persisted mappings on first use."""
+        if not self._loaded:
+            self.load(db)
+    
+    def load(self, db: Session):
+        """Load every persisted sender -> parser mapping."""
+        routes = {row.sender: row.parser_name for row in db.query(models.SenderRoute)}
+        
+        with self._lock:
+            routes.update(self._learned)
+            self._learned = routes
+            self._loaded = True
+    
+    def learned_routes(self) -> Dict[str, str]:
+        """Copy of the learned sender -> parser mappings (to seed reparse workers)."""
+        with self._lock:
+            return dict(self._learned)
+    
+    def seed(self, routes: Dict[str, str]):
+        """Use routes as the learned mappings, without reading sender_routes (reparse workers)."""
+        with self._lock:
+            self._learned = dict(routes)
+            self._loaded = True
+    
+    def save_learned(self, db: Session) -> int:
+        """
+        Write newly learned mappings inside the caller's unit of work (the
+        caller commits). They stay unsaved until that commit succeeds, so a
+        rolled back batch leaves them to be written with the next one.
+        Returns the number of mappings written.
+        """
+        with self._lock:
+            unsaved = dict(self._unsaved)
+        
+        if not unsaved:
+            return 0
+        
+        inserted = insert_ignore_returning(
+            db, models.SenderRoute,
+            [{"sender": sender, "parser_name": parser_name} for sender, parser_name in unsaved.items()],
+            conflict_columns=["sender"], returning=["sender"]
+        )
+        db.info.setdefault(_WRITTEN_ROUTES_KEY, {}).update(unsaved)
+        return len(inserted)
+    
+    def mark_saved(self, routes: Dict[str, str]):
+        """Forget mappings whose write was committed."""
+        with self._lock:
+            for sender, parser_name in routes.items():
+                if self._unsaved.get(sender) == parser_name:
+                    del self._unsaved[sender]
+    
+    def stats(self) -> Dict[str, int]:
+        """Routing counters."""
+        with self._lock:
+            return {
+                "learned_senders": len(self._learned),
+                "index_hits": self.index_hits,
+                "learned_hits": self.learned_hits,
+                "fallbacks": self.fallbacks
+            }
+
+
+# Session.info key of the mappings written in the session's current transaction
+_WRITTEN_ROUTES_KEY = 'sender_routes_written'
+
+
+@event.listens_for(Session, "after_commit")
+def _routes_committed(session: Session):
+    written = session.info.pop(_WRITTEN_ROUTES_KEY, None)
+    if written:
+        get_sender_router().mark_saved(written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _routes_rolled_back(session: Session):
+    # Still in _unsaved; written again with the next batch
+    session.info.pop(_WRITTEN_ROUTES_KEY, None)
+
+
+# Singleton instance
+_sender_router = None
+
+def get_sender_router() -> SenderRouter:
+    """Get or create SenderRouter instance."""
+    global _sender_router
+    if _sender_router is None:
+        _sender_router = SenderRouter()
+    return _sender_router
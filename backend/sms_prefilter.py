@@ -0,0 +1,225 @@
+"""
+Cheap pre-filter that rejects obvious non-transactions before parsing.
+
+Most messages on a phone are OTPs, promotions, balance alerts and bill
+reminders. Two checks are derived from the parser specs and can never reject
+a message a parser would accept: a message with no amount any parser
+recognizes, or with none of their direction keywords, cannot parse. The
+remaining checks are heuristics for messages that look like transactions
+but are not: OTPs and reminders that only mention an amount and a verb, and
+promotions without an account mask, reference number, UPI id or wording
+of a completed payment ("payment successful", "paid ₹500"). Rejected
+events are stored as SKIPPED; evaluate() reports how the filter would have
+classified the stored PARSED and FAILED events.
+"""
+import os
+import re
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple
+from sqlalchemy.orm import Session
+from parser_engine import PARSER_SPECS
+import models
+
+# Recorded as the parser_name of skipped events
+PREFILTER_NAME = 'prefilter'
+
+# Stored events classified per query by evaluate()
+EVALUATE_CHUNK_SIZE = 1000
+
+# Parsed events evaluate() would have skipped, listed for review
+EVALUATE_SAMPLE_SIZE = 20
+
+# Every amount pattern and direction keyword of the keyword-based parsers
+_AMOUNT = re.compile('|'.join(dict.fromkeys(
+    f'(?:{pattern})' for spec in PARSER_SPECS for pattern in spec.amount_patterns
+)), re.IGNORECASE)
+_DIRECTION_KEYWORDS = tuple(sorted(
+    {word for spec in PARSER_SPECS for word in spec.debit_keywords + spec.credit_keywords}
+))
+# Fully structured formats are transactions whenever they match
+_RECORDS = [re.compile(spec.record_pattern) for spec in PARSER_SPECS if spec.record_pattern]
+
+# A completed debit or credit (not "will be debited")
+_PAST_MOVEMENT = re.compile(
+    r'(?<!will be )(?<!to be )\b(?:debited|credited|withdrawn|spent|deposited|transferred)\b'
+)
+
+
+class _Cue(NamedTuple):
+    """
+    A lowered-text regex behind substring triggers: the regex only runs if a
+    trigger occurs, so every alternative must contain one of them.
+    """
+    triggers: Tuple[str, ...]
+    pattern: str
+    
+    def search(self, text_lower: str) -> bool:
+        return any(trigger in text_lower for trigger in self.triggers) and \
+            _CUE_REGEXES[self.pattern].search(text_lower) is not None
+
+
+_OTP = _Cue(
+    ('otp', 'password', 'code'),
+    r'\botp\b|one[ -]time password|verification code|security code|\bis your code\b'
+)
+_REMINDER = _Cue(
+    ('due', 'reminder', 'will be', 'pay ', 'generated'),
+    r'\bis due\b|\bdue on\b|due date|amount due|\boverdue\b|\breminder\b|will be debited|'
+    r'\bpay (?:now|before|by)\b|bill (?:is )?generated'
+)
+_PROMO = _Cue(
+    ('offer', 'cashback', 'off', 'discount', 'approved', 'loan', 'apply', 'click', 'http', 'www.',
+     't&c', 'hurry', 'win', 'congrat', 'eligible'),
+    r'\boffers?\b|cashback (?:of )?up ?to|\bup ?to\b.{0,20}\boff\b|discount|pre-?approved|\bloan\b|'
+    r'apply now|click|https?://|www\.|\bt&c|\bhurry\b|\bwin\b|congratulations|\beligible\b'
+)
+# Account or card mask, reference number or UPI id
+_TRANSACTION_EVIDENCE = _Cue(
+    ('a/c', 'acct', 'account', 'card', 'xx', 'ref', 'rrn', 'utr', 'txn', '@'),
+    r'(?:a/c|acct|account|card)\s*(?:no\.?)?\s*[x*]+\d|\bx{2,}\d{3,}|\bref\b|\brrn\b|utr|txn\s*id|(?<![\w.])[\w.]+@[a-z]+'
+)
+# A completed payment, as wallet apps word it (their cashback lines look promotional)
+_COMPLETION = _Cue(
+    ('success', 'paid', 'sent', 'received'),
+    r'\bsuccessful(?:ly)?\b|\b(?:paid|sent|received)\s*(?:₹|rs\.?|inr)\s*\d|\b(?:paid|sent)\s+to\b|\breceived\s+from\b'
+)
+_CUES = (_OTP, _REMINDER, _PROMO, _TRANSACTION_EVIDENCE, _COMPLETION)
+_CUE_REGEXES = {cue.pattern: re.compile(cue.pattern) for cue in _CUES}
+
+
+class SmsPrefilter:
+    """Keyword and feature checks that reject non-transaction messages."""
+    
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        Initialize the filter. enabled is read from the PARSE_PREFILTER
+        environment variable when unset.
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.enabled = enabled if enabled is not None \
+            else os.getenv('PARSE_PREFILTER', 'true').lower() == 'true'
+        
+        # Changes with the checks or the parser vocabulary they are built from;
+        # stored on skipped events like a parser version
+        self.version = hashlib.sha1(repr((
+            _AMOUNT.pattern, _DIRECTION_KEYWORDS, [record.pattern for record in _RECORDS],
+            _PAST_MOVEMENT.pattern, _CUES
+        )).encode('utf-8')).hexdigest()[:12]
+        
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.checked = 0
+        self.skipped: Dict[str, int] = {}
+    
+    @staticmethod
+    def classify(raw_text: str) -> Optional[str]:
+        """Reason a message is not a transaction, or None if it may be one."""
+        if any(record.search(raw_text) for record in _RECORDS):
+            return None
+        
+        if not _AMOUNT.search(raw_text):
+            return 'no_amount'
+        
+        text_lower = raw_text.lower()
+        if not any(word in text_lower for word in _DIRECTION_KEYWORDS):
+            return 'no_direction'
+        
+        if _OTP.search(text_lower) and not _PAST_MOVEMENT.search(text_lower):
+            return 'otp'
+        
+        if _REMINDER.search(text_lower) and not _PAST_MOVEMENT.search(text_lower):
+            return 'reminder'
+        
+        if _PROMO.search(text_lower) and not _TRANSACTION_EVIDENCE.search(text_lower) \
+                and not _COMPLETION.search(text_lower):
+            return 'promotion'
+        
+        return None
+    
+    def check(self, raw_text: Optional[str]) -> Optional[str]:
+        """classify() for the ingest pipeline: counted, and None when disabled."""
+        if not self.enabled or not raw_text:
+            return None
+        
+        reason = self.classify(raw_text)
+        with self._lock:
+            self.checked += 1
+            if reason is not None:
+                self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return reason
+    
+    def evaluate(self, db: Session) -> Dict[str, Any]:
+        """
+        Classify every stored PARSED and FAILED event (however they were
+        parsed) and compare with the outcome. Skipping is scored as
+        predicting FAILED: precision is the share of would-be-skipped events
+        that failed, recall the share of failed events that would be
+        skipped. Parsed events the filter would skip are sampled for review
+        (some are bogus transactions parsed from promotions).
+        """
+        counts = {"parsed_kept": 0, "parsed_skipped": 0, "failed_kept": 0, "failed_skipped": 0}
+        reasons: Dict[str, int] = {}
+        parsed_skipped_sample: List[Dict[str, Any]] = []
+        
+        last_id = 0
+        while True:
+            rows = db.query(
+                models.RawEvent.id, models.RawEvent.raw_text, models.RawEvent.parsed_status
+            ).filter(
+                models.RawEvent.id > last_id,
+                models.RawEvent.parsed_status.in_(["PARSED", "FAILED"])
+            ).order_by(models.RawEvent.id.asc()).limit(EVALUATE_CHUNK_SIZE).all()
+            
+            if not rows:
+                break
+            
+            for row in rows:
+                reason = self.classify(row.raw_text) if row.raw_text else None
+                outcome = "parsed" if row.parsed_status == "PARSED" else "failed"
+                counts[f"{outcome}_{'skipped' if reason else 'kept'}"] += 1
+                
+                if reason:
+                    reasons[reason] = reasons.get(reason, 0) + 1
+                    if outcome == "parsed" and len(parsed_skipped_sample) < EVALUATE_SAMPLE_SIZE:
+                        parsed_skipped_sample.append({"raw_event_id": row.id, "reason": reason, "raw_text": row.raw_text})
+            
+            last_id = rows[-1].id
+        
+        skipped = counts["parsed_skipped"] + counts["failed_skipped"]
+        failed = counts["failed_kept"] + counts["failed_skipped"]
+        return {
+            "version": self.version,
+            **counts,
+            "skip_precision": round(counts["failed_skipped"] / skipped, 4) if skipped else None,
+            "skip_recall": round(counts["failed_skipped"] / failed, 4) if failed else None,
+            "reasons": reasons,
+            "parsed_skipped_sample": parsed_skipped_sample
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Filter counters."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "checked": self.checked,
+                "skipped": sum(self.skipped.values()),
+                "skipped_by_reason": dict(self.skipped)
+            }
+
+
+# Singleton instance
+_sms_prefilter = None
+
+def get_sms_prefilter() -> SmsPrefilter:
+    """Get or create SmsPrefilter instance."""
+    global _sms_prefilter
+    if _sms_prefilter is None:
+        _sms_prefilter = SmsPrefilter()
+    return _sms_prefilter
@@ -0,0 +1,174 @@
+"""
+Streaming NDJSON ingest for historical SMS backfills.
+
+The request body is read incrementally (optionally gzip-compressed), split
+into lines and decoded one event at a time, so memory stays flat no matter
+how large the upload is. Progress of each import is kept in a small
+in-memory registry that clients can poll while the upload runs.
+"""
+import json
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Optional, Dict, Any, Tuple
+
+# Events stored and parsed per unit of work
+STREAM_CHUNK_SIZE = 500
+
+# Longest accepted NDJSON line (bytes); longer lines are skipped as invalid
+MAX_LINE_BYTES = 64 * 1024
+
+# Decompressed bytes produced per step, bounding memory for gzip input
+DECOMPRESS_STEP_BYTES = 256 * 1024
+
+# Errors kept per import (the rest are only counted)
+MAX_REPORTED_ERRORS = 100
+
+# Finished imports kept in the registry
+MAX_TRACKED_IMPORTS = 100
+
+
+async def iter_ndjson_lines(body: AsyncIterator[bytes], gzipped: bool = False) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Yield (line_number, line) for each non-blank line of an NDJSON body as it
+    arrives. Lines longer than MAX_LINE_BYTES are yielded as None.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    buffer = b""
+    line_number = 0
+    skipping = False
+    
+    def split_lines(data: bytes):
+        nonlocal buffer, line_number, skipping
+        buffer += data
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline], buffer[newline + 1:]
+            line_number += 1
+            if skipping or len(line) > MAX_LINE_BYTES:
+                skipping = False
+                yield line_number, None
+            elif line.strip():
+                yield line_number, line
+        
+        # Drop an overlong partial line instead of buffering it
+        if len(buffer) > MAX_LINE_BYTES:
+            buffer = b""
+            skipping = True
+    
+    async for chunk in body:
+        if decompressor is None:
+            for item in split_lines(chunk):
+                yield item
+            continue
+        
+        data = decompressor.decompress(chunk, DECOMPRESS_STEP_BYTES)
+        while True:
+            for item in split_lines(data):
+                yield item
+            if not decompressor.unconsumed_tail:
+                break
+            data = decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_STEP_BYTES)
+    
+    if decompressor is not None:
+        for item in split_lines(decompressor.flush()):
+            yield item
+    
+    line_number += 1
+    if skipping:
+        yield line_number, None
+    elif buffer.strip():
+        yield line_number, buffer
+
+
+def decode_event_line(line: bytes) -> Dict[str, Any]:
+    """Decode one NDJSON line into an event dict."""
+    event = json.loads(line)
+    if not isinstance(event, dict):
+        raise ValueError("Each line must be a JSON object")
+    return event
+
+
+class ImportProgressRegistry:
+    """In-memory progress of streaming imports, keyed by import id."""
+    
+    def __init__(self, max_imports: int = MAX_TRACKED_IMPORTS):
+        self.max_imports = max_imports
+        self._imports: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def start(self, device_id: int, import_id: Optional[str] = None) -> str:
+        """Register a new import and return its id."""
+        import_id = import_id or str(uuid.uuid4())
+        with self._lock:
+            self._imports[import_id] = {
+                "import_id": import_id,
+                "device_id": device_id,
+                "status": "running",
+                "lines": 0,
+                "events": 0,
+                "parsed": 0,
+                "failed": 0,
+                "duplicates": 0,
+                "queued": 0,
+                "invalid": 0,
+                "chunks": 0,
+                "errors": [],
+                "started_at": datetime.now().isoformat(),
+                "finished_at": None
+            }
+            self._imports.move_to_end(import_id)
+            while len(self._imports) > self.max_imports:
+                self._imports.popitem(last=False)
+        return import_id
+    
+    def is_running(self, import_id: str) -> bool:
+        with self._lock:
+            progress = self._imports.get(import_id)
+            return progress is not None and progress["status"] == "running"
+    
+    def update(self, import_id: str, **counts: int):
+        """Add to the counters of an import."""
+        with self._lock:
+            progress = self._imports.get(import_id)
+            if progress is None:
+                return
+            for name, value in counts.items():
+                progress[name] += value
+    
+    def add_error(self, import_id: str, line_number: Optional[int], error: str):
+        """Record a line that could not be ingested."""
+        with self._lock:
+            progress = self._imports.get(import_id)
+            if progress is not None and len(progress["errors"]) < MAX_REPORTED_ERRORS:
+                progress["errors"].append({"line": line_number, "error": error})
+    
+    def finish(self, import_id: str, status: str = "completed"):
+        with self._lock:
+            progress = self._imports.get(import_id)
+            if progress is not None:
+                progress["status"] = status
+                progress["finished_at"] = datetime.now().isoformat()
+    
+    def get(self, import_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of an import's progress."""
+        with self._lock:
+            progress = self._imports.get(import_id)
+            if progress is None:
+                return None
+            return dict(progress, errors=list(progress["errors"]))
+
+
+# Singleton instance
+_import_registry = None
+
+def get_import_registry() -> ImportProgressRegistry:
+    """Get or create ImportProgressRegistry instance."""
+    global _import_registry
+    if _import_registry is None:
+        _import_registry = ImportProgressRegistry()
+    return _import_registry
@@ -0,0 +1,209 @@
+"""
+Parse cache keyed by message template.
+
+Bank SMS are generated from a handful of templates, so messages that differ
+only in their digits (amounts, account masks, dates, reference numbers) are
+common. The parsers treat every digit alike, so such messages parse the same
+way: the same fields, captured at the same offsets. The fingerprint of a
+message is its text with every ASCII digit replaced by '#', and the cache
+keeps, per parser and fingerprint, the constant fields and where each
+captured field sits. A hit rebuilds the result by slicing the new message
+instead of running the parser.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, List, Sequence, Callable
+from parser_engine import CompiledParser, FieldSpans
+
+_DIGITS_TO_HASH = bytes.maketrans(b'0123456789', b'##########')
+
+# (field, constant value, (start, end, convert) or None) in result order;
+# None for a template the parser found nothing in
+TemplatePlan = Optional[Tuple[Tuple[str, Any, Optional[Tuple[int, int, Callable[[str], Any]]]], ...]]
+
+
+def template_fingerprint(raw_text: str) -> bytes:
+    """Message text with every digit replaced by '#' (same length, same offsets)."""
+    return raw_text.encode('utf-8').translate(_DIGITS_TO_HASH)
+
+
+def _make_plan(result: Optional[Dict[str, Any]], spans: FieldSpans) -> TemplatePlan:
+    """Plan that rebuilds result from another message with the same template."""
+    if result is None:
+        return None
+    return tuple(
+        (field, None, spans[field]) if field in spans else (field, value, None)
+        for field, value in result.items()
+    )
+
+
+def _replay(plan: TemplatePlan, raw_text: str) -> Optional[Dict[str, Any]]:
+    """Rebuild a parse result from a cached plan."""
+    if plan is None:
+        return None
+    
+    result = {}
+    for field, value, span in plan:
+        if span is None:
+            result[field] = value
+        else:
+            start, end, convert = span
+            result[field] = convert(raw_text[start:end])
+    return result
+
+
+class TemplateCache:
+    """LRU of parse plans by (parser name, template fingerprint)."""
+    
+    def __init__(self, max_templates: Optional[int] = None):
+        """
+        Initialize the cache. max_templates is read from the
+        PARSE_TEMPLATE_CACHE_SIZE environment variable when unset (0 disables).
+        """
+        from dotenv import load_dotenv
+        
+        # Load .env from the backend directory
+        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+        load_dotenv(env_path)
+        
+        self.max_templates = max_templates if max_templates is not None \
+            else int(os.getenv('PARSE_TEMPLATE_CACHE_SIZE', '10000'))
+        
+        self._plans: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+    
+    def parse(self, parser: CompiledParser, raw_text: str, text_lower: str) -> Optional[Dict[str, Any]]:
+        """Parse a message with parser, reusing the plan of an earlier message with the same template."""
+        if self.max_templates <= 0:
+            return parser.parse(raw_text, text_lower)
+        
+        key = (parser.name, template_fingerprint(raw_text))
+        
+        with self._lock:
+            cached = key in self._plans
+            if cached:
+                plan = self._plans[key]
+                self._plans.move_to_end(key)
+        
+        if cached:
+            try:
+                result = _replay(plan, raw_text)
+            except ValueError:
+                # Not expected for parsers that treat digits alike; parse from scratch
+                with self._lock:
+                    self.fallbacks += 1
+                    self._plans.pop(key, None)
+            else:
+                with self._lock:
+                    self.hits += 1
+                return result
+        
+        spans: FieldSpans = {}
+        result = parser.parse(raw_text, text_lower, spans)
+        plan = _make_plan(result, spans)
+        
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = plan
+            if len(self._plans) > self.max_templates:
+                self._plans.popitem(last=False)
+        
+        return result
+    
+    def parse_many(self, parser: CompiledParser,
+                   texts: Sequence[Tuple[str, str]]) -> List[Tuple[Optional[Dict[str, Any]], Optional[Exception]]]:
+        """
+        parse() over (raw_text, text_lower) pairs with one lock round trip
+        for the lookups and one for the updates. A template first seen in the
+        batch is parsed once and replayed for the rest. Returns (result,
+        exception) per message, in order: a parser error only fails its own message.
+        """
+        if self.max_templates <= 0:
+            results = []
+            for raw_text, text_lower in texts:
+                try:
+                    results.append((parser.parse(raw_text, text_lower), None))
+                except Exception as e:
+                    results.append((None, e))
+            return results
+        
+        keys = [(parser.name, template_fingerprint(raw_text)) for raw_text, _ in texts]
+        
+        with self._lock:
+            plans = {key: self._plans[key] for key in set(keys) if key in self._plans}
+            for key in plans:
+                self._plans.move_to_end(key)
+        
+        results: List[Tuple[Optional[Dict[str, Any]], Optional[Exception]]] = [(None, None)] * len(texts)
+        new_plans: Dict[Tuple[str, bytes], TemplatePlan] = {}
+        dropped = set()
+        hits = misses = fallbacks = 0
+        
+        for index, ((raw_text, text_lower), key) in enumerate(zip(texts, keys)):
+            if key in plans:
+                try:
+                    results[index] = (_replay(plans[key], raw_text), None)
+                    hits += 1
+                    continue
+                except ValueError:
+                    # Not expected for parsers that treat digits alike; parse from scratch
+                    fallbacks += 1
+                    del plans[key]
+                    new_plans.pop(key, None)
+                    dropped.add(key)
+            
+            spans: FieldSpans = {}
+            try:
+                result = parser.parse(raw_text, text_lower, spans)
+            except Exception as e:
+                results[index] = (None, e)
+                continue
+            
+            misses += 1
+            plans[key] = new_plans[key] = _make_plan(result, spans)
+            results[index] = (result, None)
+        
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.fallbacks += fallbacks
+            for key in dropped:
+                self._plans.pop(key, None)
+            self._plans.update(new_plans)
+            while len(self._plans) > self.max_templates:
+                self._plans.popitem(last=False)
+        
+        return results
+    
+    def clear(self):
+        """Drop every cached template (e.g. after changing parser specs)."""
+        with self._lock:
+            self._plans.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "templates": len(self._plans),
+                "max_templates": self.max_templates,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fallbacks": self.fallbacks
+            }
+
+
+# Singleton instance
+_template_cache = None
+
+def get_template_cache() -> TemplateCache:
+    """Get or create TemplateCache instance."""
+    global _template_cache
+    if _template_cache is None:
+        _template_cache = TemplateCache()
+    return _template_cache
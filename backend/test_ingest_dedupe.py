@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Ingest deduplication against a throwaway in-memory database: cross-source
+merges of a bank SMS and a wallet notification (in both arrival orders),
+full reparses of merged events, content-hash replays, overlong texts
+failing alone within a batch, and reparse counters. Run with pytest or
+directly:
+
+    cd backend
+    python test_ingest_dedupe.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database
+
+# Point the app at an in-memory database before main is imported (main
+# creates and migrates the tables of database.engine on import)
+database.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+
+from database import Base
+from device_auth import AuthenticatedDevice
+from parser import LENGTH_LIMIT_NAME, process_raw_events
+from parser_engine import MAX_PARSE_LENGTH
+import dedupe_filter
+import rule_index
+import sender_router
+import models
+import reparse
+import schemas
+import main
+
+SMS_SENDER = "VM-HDFCBK"
+SMS_TEXT = "Rs.500.00 debited from HDFC Bank A/c XX1234 on 01-12-25. Info: UPI/john@okaxis. Avl bal: Rs.5000.00"
+NOTIFICATION_SENDER = "Google Pay"
+NOTIFICATION_TEXT = "Paid ₹500 to john@okaxis"
+
+RECEIVED_AT = datetime(2025, 12, 1, 10, 30)
+
+
+def new_session():
+    """Session on an empty in-memory database with one user and device, and fresh caches."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    
+    # Process-wide caches hold ids of the previous test's database
+    dedupe_filter._dedupe_filter = None
+    sender_router._sender_router = None
+    rule_index._rule_index_cache = None
+    
+    db.add(models.User(id=1, email="test@example.com"))
+    db.add(models.Device(id=1, user_id=1, device_name="test", api_key="test-key"))
+    db.commit()
+    return db
+
+
+def ingest(db, source_type, sender, text, received_at=RECEIVED_AT):
+    """Store and parse one raw event, committed."""
+    raw_event = models.RawEvent(
+        user_id=1, device_id=1, source_type=source_type, source_sender=sender,
+        raw_text=text, received_at=received_at, parsed_status="PENDING"
+    )
+    db.add(raw_event)
+    db.flush()
+    transactions, _ = process_raw_events(db, [raw_event])
+    db.commit()
+    return raw_event, transactions[0]
+
+
+def assert_merged(db):
+    """Both events are linked to one transaction on the bank account."""
+    transactions = db.query(models.Transaction).all()
+    assert len(transactions) == 1, f"expected one transaction, got {len(transactions)}"
+    
+    transaction = transactions[0]
+    account = db.get(models.Account, transaction.account_id)
+    assert (account.bank_name, account.account_mask) == ("HDFC", "XX1234")
+    
+    linked = {raw_event.related_transaction_id for raw_event in db.query(models.RawEvent)}
+    assert linked == {transaction.id}
+    return transaction
+
+
+def test_cross_source_merge_sms_first():
+    db = new_session()
+    _, sms_transaction = ingest(db, "SMS", SMS_SENDER, SMS_TEXT)
+    _, notification_transaction = ingest(
+        db, "NOTIFICATION", NOTIFICATION_SENDER, NOTIFICATION_TEXT, RECEIVED_AT + timedelta(minutes=1)
+    )
+    
+    assert notification_transaction.id == sms_transaction.id
+    assert_merged(db)
+
+
+def test_cross_source_merge_notification_first():
+    db = new_session()
+    _, notification_transaction = ingest(db, "NOTIFICATION", NOTIFICATION_SENDER, NOTIFICATION_TEXT)
+    _, sms_transaction = ingest(db, "SMS", SMS_SENDER, SMS_TEXT, RECEIVED_AT + timedelta(minutes=1))
+    
+    # The notification's transaction moves to the bank account
+    assert sms_transaction.id == notification_transaction.id
+    transaction = assert_merged(db)
+    assert transaction.raw_merchant_identifier == "john@okaxis"
+
+
+def test_cross_source_merge_needs_distinct_sources():
+    db = new_session()
+    ingest(db, "NOTIFICATION", NOTIFICATION_SENDER, NOTIFICATION_TEXT)
+    ingest(db, "NOTIFICATION", NOTIFICATION_SENDER, "Paid ₹500 to jane@okaxis", RECEIVED_AT + timedelta(minutes=1))
+    
+    assert db.query(models.Transaction).count() == 2
+
+
+def test_cross_source_merge_needs_same_payee():
+    db = new_session()
+    ingest(db, "NOTIFICATION", NOTIFICATION_SENDER, "Paid ₹500 to alice@ybl")
+    ingest(db, "SMS", SMS_SENDER, SMS_TEXT.replace("john@okaxis", "bob@okaxis"), RECEIVED_AT + timedelta(minutes=2))
+    
+    assert db.query(models.Transaction).count() == 2
+
+
+def test_full_reparse_keeps_merged_transaction():
+    for notification_first in (False, True):
+        db = new_session()
+        events = [("SMS", SMS_SENDER, SMS_TEXT), ("NOTIFICATION", NOTIFICATION_SENDER, NOTIFICATION_TEXT)]
+        if notification_first:
+            events.reverse()
+        for offset, (source_type, sender, text) in enumerate(events):
+            ingest(db, source_type, sender, text, RECEIVED_AT + timedelta(minutes=offset))
+        merged_id = assert_merged(db).id
+        
+        # One chunk with both events, then one chunk per event
+        for chunk_size in (500, 1):
+            # As after a restart: the notification's own hash is not in the
+            # recent-hash map, so only the cross-source match can find it
+            dedupe_filter._dedupe_filter = None
+            result = reparse.reparse_events(db, full=True, workers=0, chunk_size=chunk_size)
+            assert result["successful"] == 2, result
+            assert assert_merged(db).id == merged_id
+
+
+def test_content_hash_replay_is_duplicate():
+    db = new_session()
+    device = AuthenticatedDevice(id=1, user_id=1, device_name="test")
+    events = [
+        schemas.RawEventCreate(source_type="SMS", source_sender=SMS_SENDER, raw_text=SMS_TEXT,
+                               device_timestamp=RECEIVED_AT)
+    ]
+    
+    status, first = main._ingest_batch(db, device, events)
+    assert status == "success"
+    assert first[0]["parsed"] is True and "duplicate" not in first[0]
+    
+    # The same event again, and twice within one request
+    status, replayed = main._ingest_batch(db, device, events * 2)
+    assert status == "success"
+    for result in replayed:
+        assert result["duplicate"] is True
+        assert result["raw_event_id"] == first[0]["raw_event_id"]
+        assert result["transaction_id"] == first[0]["transaction_id"]
+        assert result["parsed"] is True
+    
+    assert db.query(models.RawEvent).count() == 1
+    assert db.query(models.Transaction).count() == 1
+
+
+def test_overlong_text_fails_alone():
+    db = new_session()
+    device = AuthenticatedDevice(id=1, user_id=1, device_name="test")
+    events = [
+        schemas.RawEventCreate(source_type="SMS", source_sender=SMS_SENDER, raw_text=text,
+                               device_timestamp=RECEIVED_AT)
+        for text in (SMS_TEXT + " " + "a" * MAX_PARSE_LENGTH, SMS_TEXT)
+    ]
+    
+    status, results = main._ingest_batch(db, device, events)
+    assert status == "success"
+    assert results[0]["parsed"] is False and "too long" in results[0]["error"]
+    assert results[1]["parsed"] is True
+    assert db.query(models.RawEvent).count() == 2
+    
+    # Storage is still bounded
+    try:
+        schemas.RawEventCreate(source_type="SMS", source_sender=SMS_SENDER, device_timestamp=RECEIVED_AT,
+                               raw_text="a" * (schemas.MAX_RAW_TEXT_LENGTH + 1))
+    except ValidationError:
+        pass
+    else:
+        raise AssertionError("text over MAX_RAW_TEXT_LENGTH accepted")
+
+
+def test_reparse_counts_skipped_and_unparsed_apart():
+    db = new_session()
+    ingest(db, "SMS", SMS_SENDER, SMS_TEXT)
+    ingest(db, "SMS", SMS_SENDER, "123456 is your OTP for login. Do not share it.")
+    ingest(db, "SMS", SMS_SENDER, SMS_TEXT + " " + "a" * MAX_PARSE_LENGTH)
+    
+    result = reparse.reparse_events(db, full=True, workers=0)
+    assert result["total_events"] == 3
+    assert (result["successful"], result["skipped"], result["unparsed"], result["failed"]) == (1, 1, 1, 0), result
+
+
+def test_incremental_reparse_leaves_overlong_texts():
+    db = new_session()
+    raw_event, _ = ingest(db, "SMS", SMS_SENDER, SMS_TEXT + " " + "a" * MAX_PARSE_LENGTH)
+    assert (raw_event.parsed_status, raw_event.parser_name) == ("FAILED", LENGTH_LIMIT_NAME)
+    
+    # Nothing a parser change can affect: not even loaded
+    result = reparse.reparse_events(db, workers=0)
+    assert result["total_events"] == 0, result
+
+
+if __name__ == "__main__":
+    print("🧪 Ingest dedupe\n" + "=" * 50)
+    for test in (test_cross_source_merge_sms_first, test_cross_source_merge_notification_first,
+                 test_cross_source_merge_needs_distinct_sources, test_cross_source_merge_needs_same_payee,
+                 test_full_reparse_keeps_merged_transaction,
+                 test_content_hash_replay_is_duplicate, test_overlong_text_fails_alone,
+                 test_reparse_counts_skipped_and_unparsed_apart, test_incremental_reparse_leaves_overlong_texts):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Fuzz every parser and pre-filter pattern with pathological inputs and check
+worst-case run time (ReDoS audit).
+
+Inputs are long repetitions of fragments that make backtracking patterns
+retry (runs of id characters with no '@', "at at at ..." with no
+terminator, long masks with no digits, whitespace runs) at the longest
+length the parsers accept (MAX_PARSE_LENGTH). Run with pytest or directly:
+
+    cd backend
+    python test_regex_budget.py
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from parser_engine import PARSER_SPECS, PARSERS, MAX_PARSE_LENGTH, ParseBudgetExceeded
+import sms_prefilter
+
+# Worst time any single pattern may take on a MAX_PARSE_LENGTH input
+PATTERN_TIME_LIMIT_SECONDS = 0.05
+
+# Worst time a whole parse may take (the budget check runs between patterns)
+PARSE_TIME_LIMIT_SECONDS = 0.1
+
+FRAGMENTS = [
+    'a', 'a ', 'a.', 'a@', '.', '1', '1,', '1.', ' ', ' \t', 'x', 'X', 'XX', 'x1', 'X 1',
+    'at ', 'at a ', 'at a1 ', 'to ', 'to a ', 'from a ', ' on', ' to', ' from', 'up to ',
+    'rs', 'Rs.', 'Rs.1 ', 'INR1,', 'for 1', '₹', 'a/c ', 'A/c x', 'AC ', 'ac ', 'acct ',
+    'UCO-UPI/DR/1/', '/', 'info:', 'upi/', 'vpa ', 'debited ', 'otp ', 'due ', 'offer ',
+]
+
+
+def pathological_inputs(length: int = MAX_PARSE_LENGTH):
+    """Each fragment repeated to length, alone and followed by a near-miss tail."""
+    for fragment in FRAGMENTS:
+        text = (fragment * (length // len(fragment) + 1))[:length]
+        yield fragment, text
+        yield fragment + ' + tail', text[:length - 12] + ' Rs 5 XX1234'
+
+
+def all_patterns():
+    """(name, compiled regex) for every pattern the parsers and pre-filter run."""
+    for spec in PARSER_SPECS:
+        for index, pattern in enumerate(spec.amount_patterns):
+            yield f"{spec.name}.amount[{index}]", re.compile(pattern, re.IGNORECASE)
+        if spec.account_pattern:
+            yield f"{spec.name}.account", re.compile(
+                spec.account_pattern, re.IGNORECASE if spec.account_ignore_case else 0
+            )
+        for index, rule in enumerate(spec.counterparty):
+            yield f"{spec.name}.counterparty[{index}]", re.compile(
+                rule.pattern, re.IGNORECASE if rule.ignore_case else 0
+            )
+        if spec.record_pattern:
+            yield f"{spec.name}.record", re.compile(spec.record_pattern)
+    
+    yield "prefilter.amount", sms_prefilter._AMOUNT
+    yield "prefilter.past_movement", sms_prefilter._PAST_MOVEMENT
+    for name, regex in sms_prefilter._CUE_REGEXES.items():
+        yield f"prefilter.cue[{name[:20]}]", regex
+
+
+def _timed(function, *args):
+    """CPU seconds taken by function(*args)."""
+    started = time.thread_time()
+    try:
+        function(*args)
+    except ParseBudgetExceeded:
+        pass
+    return time.thread_time() - started
+
+
+def test_pattern_worst_case():
+    """No single pattern takes longer than PATTERN_TIME_LIMIT_SECONDS on any input."""
+    inputs = list(pathological_inputs())
+    worst = []
+    for name, regex in all_patterns():
+        slowest, fragment = max((_timed(regex.search, text), fragment) for fragment, text in inputs)
+        worst.append((slowest, name, fragment))
+    
+    worst.sort(reverse=True)
+    for seconds, name, fragment in worst[:5]:
+        print(f"   {name}: {seconds * 1000:.2f} ms on {fragment!r}")
+    
+    too_slow = [(name, fragment, seconds) for seconds, name, fragment in worst if seconds > PATTERN_TIME_LIMIT_SECONDS]
+    assert not too_slow, f"Patterns over {PATTERN_TIME_LIMIT_SECONDS * 1000:.0f} ms: {too_slow}"
+
+
+def test_parse_worst_case():
+    """Every parser and the pre-filter finish (or give up) within PARSE_TIME_LIMIT_SECONDS."""
+    too_slow = []
+    for fragment, text in pathological_inputs():
+        for name, parser in PARSERS.items():
+            seconds = _timed(parser.parse, text)
+            if seconds > PARSE_TIME_LIMIT_SECONDS:
+                too_slow.append((name, fragment, seconds))
+        
+        seconds = _timed(sms_prefilter.SmsPrefilter.classify, text)
+        if seconds > PARSE_TIME_LIMIT_SECONDS:
+            too_slow.append(("prefilter", fragment, seconds))
+    
+    assert not too_slow, f"Parses over {PARSE_TIME_LIMIT_SECONDS * 1000:.0f} ms: {too_slow}"
+
+
+def test_length_limit():
+    """Messages over MAX_PARSE_LENGTH fail with ParseBudgetExceeded instead of being parsed."""
+    text = "Rs.500.00 debited from A/c XX1234 " + "a" * MAX_PARSE_LENGTH
+    for name, parser in PARSERS.items():
+        try:
+            parser.parse(text)
+        except ParseBudgetExceeded:
+            continue
+        raise AssertionError(f"{name} parsed a message over MAX_PARSE_LENGTH")
+
+
+if __name__ == "__main__":
+    print("🧪 Regex worst-case audit\n" + "=" * 50)
+    for test in (test_pattern_worst_case, test_parse_worst_case, test_length_limit):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Compiled rule index and rule evaluation, without a running server: index
+matches against a one-rule-at-a-time scan, cache invalidation by rule set
+generation, first_match slot filling, and bulk reapply respecting manual
+edits. Run with pytest or directly:
+
+    cd backend
+    python test_rule_index.py
+"""
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from rule_index import CompiledRule, RuleIndex, RuleIndexCache, bump_rules_generation, bump_target_generations
+from rules_engine import RulesEngine
+import rule_index
+import rules_reapply
+import models
+
+WORDS = ["zomato", "swiggy", "uber", "amazon", "pay", "@okicici", "@paytm", "AMZ", "Zo", "tm", "transfer"]
+
+MATCH_VALUES = {
+    "MERCHANT_KEY": ["zomato", "swiggy", "Zomato"],
+    "CHANNEL": ["UPI", "CARD", "upi"],
+    "DIRECTION": ["DEBIT", "CREDIT"],
+    "ACCOUNT_ID": ["1", "2", " 3 "],
+    "AMOUNT_EQUALS": ["100", "99.99", "250", "0"],
+    "AMOUNT_RANGE": ["100-500", "250-250", "0-99.99", "300-600"],
+}
+
+
+def linear_matches(transaction, rule) -> bool:
+    """One rule checked on its own, as the engine did before the index."""
+    match_type = rule.match_type
+    match_value = rule.match_value
+    
+    if match_type == "MERCHANT_KEY":
+        return transaction.merchant_key == match_value
+    elif match_type == "MERCHANT_KEY_CONTAINS":
+        return match_value.lower() in (transaction.merchant_key or "").lower()
+    elif match_type == "TEXT_CONTAINS":
+        text = f"{transaction.description or ''} {transaction.raw_merchant_identifier or ''}".lower()
+        return match_value.lower() in text
+    elif match_type == "UPI_ID_PREFIX":
+        return bool(transaction.raw_merchant_identifier) and \
+            transaction.raw_merchant_identifier.lower().startswith(match_value.lower())
+    elif match_type == "UPI_ID_SUFFIX":
+        return bool(transaction.raw_merchant_identifier) and \
+            transaction.raw_merchant_identifier.lower().endswith(match_value.lower())
+    elif match_type == "AMOUNT_EQUALS":
+        return abs(transaction.amount - float(match_value)) < 0.01
+    elif match_type == "AMOUNT_RANGE":
+        low, high = match_value.split("-")
+        return float(low) <= transaction.amount <= float(high)
+    elif match_type == "CHANNEL":
+        return transaction.channel == match_value
+    elif match_type == "DIRECTION":
+        return transaction.direction == match_value
+    elif match_type == "ACCOUNT_ID":
+        return transaction.account_id == int(match_value)
+    return False
+
+
+def random_rule(rng: random.Random, rule_id: int) -> CompiledRule:
+    match_type = rng.choice([
+        "MERCHANT_KEY", "MERCHANT_KEY_CONTAINS", "TEXT_CONTAINS", "UPI_ID_PREFIX", "UPI_ID_SUFFIX",
+        "AMOUNT_EQUALS", "AMOUNT_RANGE", "CHANNEL", "DIRECTION", "ACCOUNT_ID"
+    ])
+    if match_type in MATCH_VALUES:
+        match_value = rng.choice(MATCH_VALUES[match_type])
+    else:
+        match_value = "".join(rng.choice(WORDS) for _ in range(rng.randint(1, 2)))
+    return CompiledRule(rule_id, rng.choice([10, 20, 30]), match_type, match_value, "SET_DESCRIPTION", "x")
+
+
+def random_transaction(rng: random.Random) -> SimpleNamespace:
+    return SimpleNamespace(
+        merchant_key=rng.choice([None, "zomato", "swiggy", "Zomato", "amazonpay", "uber india"]),
+        description=rng.choice([None, "", "Zomato order", "pay to SWIGGY", "transfer"]),
+        raw_merchant_identifier=rng.choice([None, "", "zomato@okicici", "Uber.India@paytm", "AMZ@ybl"]),
+        amount=rng.choice([100.0, 100.004, 99.99, 0.0, 250.0, 500.0, round(rng.uniform(0, 600), 2)]),
+        channel=rng.choice(["UPI", "CARD", None]),
+        direction=rng.choice(["DEBIT", "CREDIT"]),
+        account_id=rng.choice([1, 2, 3, None])
+    )
+
+
+def new_transaction(**fields) -> SimpleNamespace:
+    """Transaction with the attributes rules match on and set."""
+    transaction = SimpleNamespace(
+        merchant_key=None, description=None, raw_merchant_identifier=None, amount=100.0,
+        channel="UPI", direction="DEBIT", account_id=1, merchant_id=None, category_id=None,
+        is_internal_transfer=False, manual_override_flags=0
+    )
+    vars(transaction).update(fields)
+    return transaction
+
+
+def new_session():
+    """Session on an empty in-memory database with one user, and a fresh rule index cache."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    rule_index._rule_index_cache = None
+    
+    db.add(models.User(id=1, email="test@example.com"))
+    db.commit()
+    return db
+
+
+def test_index_matches_linear_scan():
+    rng = random.Random(1)
+    for _ in range(300):
+        rules = sorted((random_rule(rng, rule_id) for rule_id in range(1, rng.randint(1, 40))),
+                       key=lambda rule: (rule.priority, rule.id))
+        index = RuleIndex(rules)
+        for _ in range(20):
+            transaction = random_transaction(rng)
+            expected = [rule for rule in rules if linear_matches(transaction, rule)]
+            assert index.matches(transaction) == expected, (vars(transaction), rules)
+
+
+def test_generation_bump_invalidates_cache():
+    db = new_session()
+    cache = RuleIndexCache("all")
+    
+    assert cache.get(db, 1).rules == ()
+    db.add(models.Rule(user_id=1, match_type="TEXT_CONTAINS", match_value="zomato",
+                       action_type="SET_DESCRIPTION", action_value="Food", priority=10, is_active=True))
+    db.commit()
+    
+    # Rule written without a bump: still the cached index
+    assert cache.get(db, 1).rules == ()
+    assert (cache.hits, cache.compiles) == (1, 1)
+    
+    bump_rules_generation(db, 1)
+    db.commit()
+    assert [rule.match_value for rule in cache.get(db, 1).rules] == ["zomato"]
+    assert cache.compiles == 2
+
+
+def test_target_change_bumps_only_rules_naming_it():
+    db = new_session()
+    cache = RuleIndexCache("all")
+    db.add(models.Rule(user_id=1, match_type="TEXT_CONTAINS", match_value="zomato",
+                       action_type="SET_CATEGORY_BY_NAME", action_value="Food", priority=10, is_active=True))
+    db.commit()
+    
+    index = cache.get(db, 1)
+    assert index.rules[0].target is None and index.invalid == {index.rules[0].id: "category not found"}
+    
+    db.add(models.Category(id=7, name="Food"))
+    assert bump_target_generations(db, "category_name", ["Other"]) == 0
+    assert bump_target_generations(db, "category_name", ["Food"]) == 1
+    db.commit()
+    
+    index = cache.get(db, 1)
+    assert index.rules[0].target == 7 and index.invalid == {}
+
+
+def test_first_match_fills_each_slot_once():
+    rules = [
+        CompiledRule(1, 10, "TEXT_CONTAINS", "zomato", "SET_CATEGORY", "7", 7),
+        CompiledRule(2, 20, "TEXT_CONTAINS", "zomato", "SET_CATEGORY", "8", 8),
+        CompiledRule(3, 30, "AMOUNT_RANGE", "0-500", "SET_MERCHANT", "3", 3),
+        CompiledRule(4, 40, "TEXT_CONTAINS", "zomato", "SET_MERCHANT", "4", 4),
+        CompiledRule(5, 50, "DIRECTION", "CREDIT", "MARK_INTERNAL", None),
+    ]
+    index = RuleIndex(rules)
+    
+    # all: every match runs, later rules overwrite earlier ones
+    transaction = new_transaction(description="Zomato order")
+    assert RulesEngine.apply_index(None, transaction, index, "all")
+    assert (transaction.category_id, transaction.merchant_id) == (8, 4)
+    
+    # first_match: the first matching rule of each slot wins
+    transaction = new_transaction(description="Zomato order")
+    assert RulesEngine.apply_index(None, transaction, index, "first_match")
+    assert (transaction.category_id, transaction.merchant_id) == (7, 3)
+    assert transaction.is_internal_transfer is False
+    
+    # A manually set slot is left alone; the others still fill
+    transaction = new_transaction(description="Zomato order", category_id=1, manual_override_flags=2)
+    assert RulesEngine.apply_index(None, transaction, index, "first_match")
+    assert (transaction.category_id, transaction.merchant_id) == (1, 3)
+
+
+def test_first_match_rematches_changed_description():
+    rules = [
+        CompiledRule(1, 10, "TEXT_CONTAINS", "zomato", "SET_DESCRIPTION", "Food order"),
+        CompiledRule(2, 20, "TEXT_CONTAINS", "zomato", "SET_CATEGORY", "7", 7),
+        CompiledRule(3, 30, "TEXT_CONTAINS", "food", "SET_CATEGORY", "8", 8),
+    ]
+    index = RuleIndex(rules)
+    
+    # The description no longer mentions zomato by the time rule 2 is reached
+    transaction = new_transaction(description="Zomato")
+    assert RulesEngine.apply_index(None, transaction, index, "first_match")
+    assert (transaction.description, transaction.category_id) == ("Food order", 8)
+
+
+def test_reapply_keeps_manual_edits_made_during_evaluation():
+    db = new_session()
+    db.add(models.Account(id=1, user_id=1, bank_name="HDFC", account_mask="XX1234"))
+    db.add(models.Category(id=7, name="Food"))
+    db.add(models.Category(id=8, name="Other"))
+    db.add(models.Rule(user_id=1, match_type="TEXT_CONTAINS", match_value="zomato",
+                       action_type="SET_CATEGORY", action_value="7", priority=10, is_active=True))
+    db.add(models.Rule(user_id=1, match_type="TEXT_CONTAINS", match_value="zomato",
+                       action_type="SET_DESCRIPTION", action_value="Food order", priority=20, is_active=True))
+    for transaction_id in ("a", "b"):
+        db.add(models.Transaction(id=transaction_id, user_id=1, account_id=1, direction="DEBIT", amount=100.0,
+                                  amount_paise=10000, channel="UPI", raw_merchant_identifier="zomato@okicici",
+                                  manual_override_flags=0))
+    db.commit()
+    
+    # The user recategorizes "a" after the chunk was evaluated, before it is written
+    evaluate_chunk = rules_reapply._evaluate_chunk
+    def evaluate_then_edit(db, rows, mode):
+        result = evaluate_chunk(db, rows, mode)
+        db.query(models.Transaction).filter(models.Transaction.id == "a").update(
+            {"category_id": 8, "manual_override_flags": 2}
+        )
+        return result
+    
+    rules_reapply._evaluate_chunk = evaluate_then_edit
+    try:
+        registry = rules_reapply.get_reapply_registry()
+        job_id = registry.start("all")
+        rules_reapply.reapply_rules(db, job_id)
+        registry.finish(job_id)
+    finally:
+        rules_reapply._evaluate_chunk = evaluate_chunk
+    
+    db.expire_all()
+    edited, untouched = db.get(models.Transaction, "a"), db.get(models.Transaction, "b")
+    assert (edited.category_id, edited.description) == (8, "Food order")
+    assert (untouched.category_id, untouched.description) == (7, "Food order")
+
+
+if __name__ == "__main__":
+    print("🧪 Rule index\n" + "=" * 50)
+    for test in (test_index_matches_linear_scan, test_generation_bump_invalidates_cache,
+                 test_target_change_bumps_only_rules_naming_it, test_first_match_fills_each_slot_once,
+                 test_first_match_rematches_changed_description,
+                 test_reapply_keeps_manual_edits_made_during_evaluation):
+        test()
+        print(f"✅ {test.__name__}")
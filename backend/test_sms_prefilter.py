@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Pre-filter classification of typical messages: non-transactions are
+skipped for the right reason, and transactions - including wallet messages
+with promotional lines - are kept. Run with pytest or directly:
+
+    cd backend
+    python test_sms_prefilter.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sms_prefilter import SmsPrefilter
+
+SKIPPED = {
+    "123456 is your OTP for a debit of Rs 500 at AMAZON. Do not share it.": "otp",
+    "Your credit card bill of Rs 5,000 is due on 05-12-25. Pay now to avoid charges.": "reminder",
+    "Get cashback up to Rs 100 on bills paid through the app. T&C apply": "promotion",
+    "Congratulations! A pre-approved loan of Rs 50,000 is credited on approval. Apply now": "promotion",
+    "Hello, how are you?": "no_amount",
+}
+
+KEPT = [
+    "Rs.500.00 debited from HDFC Bank A/c XX1234 on 01-12-25. Info: UPI/john@okaxis. Avl bal: Rs.5000.00",
+    "Paid ₹500 to john@okaxis",
+    # Completed payments with a cashback line and no account mask or UPI id
+    "Payment of ₹500 to AMAZON successful. Get cashback up to ₹50 on your next order",
+    "Paid ₹500 to AMAZON. You won cashback up to ₹50!",
+    "Received ₹1500 from Rahul. Check out offers on the app",
+]
+
+
+def test_non_transactions_skipped():
+    for text, reason in SKIPPED.items():
+        assert SmsPrefilter.classify(text) == reason, text
+
+
+def test_transactions_kept():
+    for text in KEPT:
+        assert SmsPrefilter.classify(text) is None, text
+
+
+if __name__ == "__main__":
+    print("🧪 SMS pre-filter\n" + "=" * 50)
+    for test in (test_non_transactions_skipped, test_transactions_kept):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,51 @@
+"""
+INSERT ... ON CONFLICT DO NOTHING RETURNING helpers for SQLite and PostgreSQL.
+
+Used by the ingest pipeline so new rows are written in a single statement and
+concurrent duplicate writes resolve without an IntegrityError: rows that hit
+a unique constraint are simply not returned, and the caller looks them up.
+"""
+from typing import List, Dict, Any, Sequence
+from sqlalchemy.orm import Session
+
+# Stay well below SQLite's bound-parameter limit in multi-row VALUES
+MAX_PARAMETERS_PER_STATEMENT = 900
+
+
+def dialect_insert(db: Session, table):
+    """Return an insert() construct that supports on_conflict_do_nothing for the session's database."""
+    dialect_name = db.get_bind().dialect.name
+    
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect_name}")
+    
+    return insert(table)
+
+
+def insert_ignore_returning(db: Session, model, rows: List[Dict[str, Any]],
+                            conflict_columns: Sequence[str], returning: Sequence[str]) -> List[Any]:
+    """
+    Insert rows, skipping any that conflict on conflict_columns.
+    Returns the requested columns for the rows that were actually inserted;
+    conflicting rows are left out. All rows must have the same keys.
+    """
+    if not rows:
+        return []
+    
+    table = model.__table__
+    rows_per_statement = max(1, MAX_PARAMETERS_PER_STATEMENT // len(rows[0]))
+    returning_columns = [table.c[name] for name in returning]
+    
+    inserted = []
+    for start in range(0, len(rows), rows_per_statement):
+        statement = dialect_insert(db, table).values(rows[start:start + rows_per_statement])
+        statement = statement.on_conflict_do_nothing(
+            index_elements=list(conflict_columns)
+        ).returning(*returning_columns)
+        inserted.extend(db.execute(statement).all())
+    
+    return inserted